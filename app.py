@@ -2,10 +2,8 @@ import streamlit.components.v1 as components
 import streamlit as st
 from utils.auth import verify_user
 from utils.db import users_col
-from utils.db_init import init_database
 
-# Initialize the database when the app starts
-client = init_database()
+# Indexes are synced out of band (python -m utils.indexes sync), not on every rerun
 
 # Redirect to the login page
 
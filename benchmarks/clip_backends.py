@@ -0,0 +1,139 @@
+"""
+Compare the photo classification backends on CPU.
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. Reports top-1 agreement and probability drift against the
+PyTorch path, images/sec and peak RSS.
+
+    python benchmarks/clip_backends.py --images path/to/photos
+    python benchmarks/clip_backends.py --backends torch onnx onnx-int8 --batch 8
+
+Without --images a fixed set of synthetic photos is generated, which is
+enough for parity and speed but not a measure of real-world accuracy.
+The ONNX backends need an export first (python -m utils.clip_onnx export --quantize).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def fixture_images(count=24, seed=7):
+    """Deterministic stand-in photos (textured shapes at phone-camera size)"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        base = rng.integers(40, 220, size=3)
+        img = Image.new("RGB", (1280, 960), tuple(int(c) for c in base))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x0, y0 = rng.integers(0, 1100), rng.integers(0, 800)
+            x1, y1 = x0 + rng.integers(40, 400), y0 + rng.integers(40, 300)
+            color = tuple(int(c) for c in rng.integers(0, 255, size=3))
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        images.append(img.filter(ImageFilter.GaussianBlur(2)))
+    return images
+
+
+def load_images(path):
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+    return [Image.open(os.path.join(path, n)).convert("RGB") for n in names]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_backend(name, images, batch, rounds):
+    """Measure one backend in this process and return a JSON-able result"""
+    from utils.image_processing import create_backend
+
+    backend = create_backend(name)
+    started = time.perf_counter()
+    backend.warm_up()
+    index = backend.default_index()
+    load_seconds = time.perf_counter() - started
+
+    probs = np.concatenate([index.probabilities(backend.image_embeddings(images[i:i + batch]))
+                            for i in range(0, len(images), batch)])
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(0, len(images), batch):
+            index.probabilities(backend.image_embeddings(images[i:i + batch]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "backend": name,
+        "load_seconds": round(load_seconds, 2),
+        "images_per_second": round(len(images) * rounds / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "probabilities": probs.tolist(),
+    }
+
+
+def compare(reference, result):
+    ref = np.array(reference["probabilities"])
+    probs = np.array(result["probabilities"])
+    return {
+        "top1_agreement": round(float((ref.argmax(-1) == probs.argmax(-1)).mean()), 4),
+        "max_prob_diff": round(float(np.abs(ref - probs).max()), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--images", help="Directory of photos (default: synthetic fixtures)")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images) if args.images else fixture_images()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, images, args.batch, args.rounds)))
+        return 0
+
+    results = []
+    for name in args.backends:
+        command = [sys.executable, os.path.abspath(__file__), "--child", name,
+                   "--batch", str(args.batch), "--rounds", str(args.rounds)]
+        if args.images:
+            command += ["--images", args.images]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{name}: failed\n{proc.stderr.strip()}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        return 1
+
+    reference = next((r for r in results if r["backend"] == "torch"), results[0])
+    print(f"{len(images)} images, batch {args.batch}, reference: {reference['backend']}")
+    print(f"{'backend':<12}{'img/s':>10}{'load s':>10}{'RSS MB':>10}{'top-1 agree':>14}{'max Δp':>10}")
+    for result in results:
+        parity = compare(reference, result)
+        print(f"{result['backend']:<12}{result['images_per_second']:>10}"
+              f"{result['load_seconds']:>10}{result['peak_rss_mb']:>10}"
+              f"{parity['top1_agreement']:>14}{parity['max_prob_diff']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
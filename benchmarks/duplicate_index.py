@@ -0,0 +1,83 @@
+"""
+Query latency of the duplicate index at scale.
+
+Fills a DuplicateIndex with synthetic requests (random unit embeddings
+spread over many locations and a few days) and times search() for new
+requests, against a brute-force scan of every embedding with the same
+location/window filter applied afterwards.
+
+    python benchmarks/duplicate_index.py --requests 100000 --locations 2000
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.duplicates import DuplicateIndex
+
+HOUR = 3600
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--days", type=float, default=3)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.requests, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    locations = rng.integers(0, args.locations, args.requests)
+    span = args.days * 24 * HOUR
+    times = np.sort(rng.uniform(0, span, args.requests))
+
+    index = DuplicateIndex(dim=args.dim)
+    started = time.perf_counter()
+    for i in range(args.requests):
+        index.add(i, f"block {locations[i]}", times[i], vectors[i])
+    print(f"Indexed {len(index)} requests over {args.locations} locations "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    # New requests: half near-copies of an existing photo, half unrelated
+    picks = rng.integers(0, args.requests, args.queries)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    copies = np.arange(args.queries) % 2 == 0
+    queries[copies] = vectors[picks[copies]] + 0.01 * queries[copies]
+
+    partitioned, found = [], 0
+    for q, i in zip(queries, picks):
+        started = time.perf_counter()
+        matches = index.search(f"block {locations[i]}", times[i] + HOUR, q)
+        partitioned.append(time.perf_counter() - started)
+        found += bool(matches)
+
+    flat = []
+    for q, i in zip(queries[:200], picks[:200]):
+        started = time.perf_counter()
+        scores = vectors @ q
+        mask = (locations == locations[i]) & (np.abs(times - times[i] - HOUR) <= index.window)
+        np.flatnonzero(mask & (scores >= index.threshold))
+        flat.append(time.perf_counter() - started)
+
+    print(f"Flagged {found}/{args.queries} queries ({int(copies.sum())} were near-copies)")
+    print(f"{'search':<14}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'partitioned':<14}{percentile_ms(partitioned, 50):>10}{percentile_ms(partitioned, 99):>10}")
+    print(f"{'flat scan':<14}{percentile_ms(flat, 50):>10}{percentile_ms(flat, 99):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Routing accuracy and latency of the serviceman intent router.
+
+Scores the grammar + TF-IDF router and the old substring checks on a
+held-out set of phrasings (none of them are training examples), and
+reports how many messages would still go to the LLM.
+
+    python benchmarks/intent_router.py
+    python benchmarks/intent_router.py --log logs/agent_messages.jsonl   # add labelled log lines
+"""
+import os
+import sys
+import json
+import argparse
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_agents.intent_router import (
+    IntentRouter, SEED_EXAMPLES, evaluate, extract_job_id,
+    LIST_JOBS, COMPLETE_JOB, JOB_STATUS, NEXT_APPOINTMENT, DIRECTIONS, OPEN
+)
+
+HELD_OUT = [
+    (LIST_JOBS, "My jobs please"),
+    (LIST_JOBS, "list jobs"),
+    (LIST_JOBS, "what have i got today"),
+    (LIST_JOBS, "show pending jobs"),
+    (LIST_JOBS, "any work for me?"),
+    (LIST_JOBS, "wat jobs do i hav"),
+    (LIST_JOBS, "which tasks are assigned to me"),
+    (LIST_JOBS, "jobs"),
+    (COMPLETE_JOB, "Complete job job1"),
+    (COMPLETE_JOB, "done 65f1c2ab9d3e4f0012a7b8c9"),
+    (COMPLETE_JOB, "finished #a7b8c9"),
+    (COMPLETE_JOB, "job 42 is done"),
+    (COMPLETE_JOB, "mark job 17 complete"),
+    (COMPLETE_JOB, "i have completed the job 88"),
+    (COMPLETE_JOB, "work on job 5 finished, closing it"),
+    (JOB_STATUS, "status of job job2"),
+    (JOB_STATUS, "whats the status of 99"),
+    (JOB_STATUS, "is job 12 still open?"),
+    (JOB_STATUS, "any update on #c0ffee1"),
+    (JOB_STATUS, "check job 31"),
+    (JOB_STATUS, "what's going on with job 8"),
+    (NEXT_APPOINTMENT, "next appointment?"),
+    (NEXT_APPOINTMENT, "when is my next visit"),
+    (NEXT_APPOINTMENT, "where do i need to be next"),
+    (NEXT_APPOINTMENT, "whats on my schedule"),
+    (NEXT_APPOINTMENT, "what time is my next booking tomorrow"),
+    (NEXT_APPOINTMENT, "upcoming visits"),
+    (DIRECTIONS, "directions to job 7"),
+    (DIRECTIONS, "how do i get to job 14"),
+    (DIRECTIONS, "where is job 3"),
+    (DIRECTIONS, "address for 65f1c2ab9d3e4f0012a7b8c9"),
+    (DIRECTIONS, "send location of job 21"),
+    (DIRECTIONS, "navigate to next job"),
+    (OPEN, "How do I fix a pipe?"),
+    (OPEN, "what gauge wire for a 20 amp circuit"),
+    (OPEN, "customer wants to pay in cash is that ok"),
+    (OPEN, "how do i bleed a radiator"),
+    (OPEN, "which sealant works best on bathroom tiles"),
+    (OPEN, "good morning"),
+    (OPEN, "can you explain how a trap works under a sink"),
+    (OPEN, "the ladder broke, who do i report it to"),
+]
+
+
+def legacy_intent(text):
+    """The substring checks run_agent used before the router"""
+    lowered = text.lower()
+    if "my jobs" in lowered or "list jobs" in lowered:
+        return LIST_JOBS
+    if "complete" in lowered:
+        return COMPLETE_JOB
+    if "status of job" in lowered:
+        return JOB_STATUS
+    return OPEN
+
+
+class LegacyRouter:
+    def route(self, text):
+        return {"intent": legacy_intent(text), "job_id": extract_job_id(text)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--log", help="Also score labelled lines from a message log")
+    parser.add_argument("--show-misses", action="store_true")
+    args = parser.parse_args(argv)
+
+    labelled = list(HELD_OUT)
+    if args.log:
+        with open(args.log, encoding="utf-8") as f:
+            labelled += [(e["label"], e["text"]) for e in map(json.loads, f) if e.get("label")]
+
+    router = IntentRouter(SEED_EXAMPLES)
+    print(f"{len(labelled)} messages, {sum(i == OPEN for i, _ in labelled)} open questions")
+    print(f"{'router':<10}{'accuracy':>10}{'to LLM':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, candidate in (("local", router), ("legacy", LegacyRouter())):
+        result = evaluate(candidate, labelled)
+        print(f"{name:<10}{result['accuracy']:>10}{result['to_llm']:>8}{result['p50_ms']:>9}{result['p99_ms']:>9}")
+        if args.show_misses:
+            for text, expected, routed in result["misses"]:
+                print(f"    {expected:>16} -> {routed:<16} {text}")
+    print(f"by source: {router.stats()['by_source']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Hit rate, wrong-answer rate and saved LLM time of the serviceman answer cache.
+
+Replays a synthetic day of questions: general topics asked repeatedly in
+different words (popular topics more often) mixed with job-specific
+questions that must bypass the cache. Each LLM call is assumed to take
+--llm-seconds. A hit is wrong if the cached answer belongs to another topic.
+
+    python benchmarks/response_cache.py --messages 2000 --similarity 0.85
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_agents.response_cache import ResponseCache
+
+TOPICS = [
+    ["how do I reset an MCB", "How to reset a MCB?", "mcb tripped how do i reset it"],
+    ["how do i reset an RCCB", "RCCB keeps tripping how to reset"],
+    ["what's the SOP for a gas leak", "sop for gas leak", "gas leak SOP?"],
+    ["how do I fix a leaking pipe", "how to fix leaking pipe", "fixing a leaking pipe"],
+    ["how do I fix a leaking tap", "how to fix a dripping tap", "leaking tap fix"],
+    ["can I use teflon tape on a gas fitting", "teflon tape on gas fittings ok?"],
+    ["how long does wall putty take to dry", "wall putty drying time"],
+    ["what gauge wire for a 20 amp circuit", "wire gauge for 20 amp circuit"],
+    ["how do i bleed a radiator", "bleeding a radiator steps"],
+    ["how do I unclog a kitchen sink", "kitchen sink clogged how to unclog"],
+    ["what tools for a ceiling fan install", "tools needed ceiling fan installation"],
+    ["how do I replace a fuse", "replacing a fuse how to"],
+]
+PERSONAL = [
+    "what did the customer in job {n} say",
+    "is job {n} urgent",
+    "what should I bring for today's appointment",
+    "which customer is waiting for me tomorrow",
+]
+
+
+def workload(count, seed=3):
+    """(topic index or None, question) pairs with Zipf-like topic popularity"""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(TOPICS) + 1)
+    weights /= weights.sum()
+    for _ in range(count):
+        if rng.random() < 0.2:
+            yield None, PERSONAL[rng.integers(len(PERSONAL))].format(n=rng.integers(100, 999))
+        else:
+            topic = int(rng.choice(len(TOPICS), p=weights))
+            yield topic, TOPICS[topic][rng.integers(len(TOPICS[topic]))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--similarity", type=float, default=0.85)
+    parser.add_argument("--llm-seconds", type=float, default=2.5)
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache(similarity=args.similarity)
+    wrong, lookups = 0, []
+    for topic, question in workload(args.messages):
+        started = time.perf_counter()
+        answer = cache.get(question)
+        lookups.append(time.perf_counter() - started)
+        if answer is None:
+            cache.put(question, f"answer for topic {topic}", args.llm_seconds)
+        elif answer != f"answer for topic {topic}":
+            wrong += 1
+
+    stats = cache.stats()
+    hits = stats["exact_hits"] + stats["semantic_hits"]
+    llm_calls = stats["misses"] + stats["bypassed"]
+    print(f"{args.messages} messages, similarity {args.similarity}, {args.llm_seconds}s per LLM call")
+    print(f"hit rate {stats['hit_rate']} ({stats['exact_hits']} exact, {stats['semantic_hits']} near-duplicate), "
+          f"{stats['bypassed']} bypassed, {wrong} wrong answers")
+    print(f"LLM calls {llm_calls} instead of {args.messages}, "
+          f"saved {stats['saved_seconds']:.0f}s ({stats['saved_seconds'] / max(hits, 1):.2f}s per hit)")
+    print(f"lookup p50 {np.percentile(lookups, 50) * 1000:.3f} ms, p99 {np.percentile(lookups, 99) * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
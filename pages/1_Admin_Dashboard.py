@@ -1,9 +1,10 @@
+import math
 import streamlit as st
-from utils.db import requests_col, users_col
-from bson import ObjectId
+from utils.db import users_col
 from datetime import datetime, time
 from pages.Layout import layout
 from utils.notifications import notify_assignment, notify_completion
+from utils.service_requests import get_requests_repo, format_time, request_label, PAGE_SIZES
 from utils.calendar_utils import (
     get_available_slots,
     book_slot,
@@ -27,10 +28,15 @@ if "username" not in st.session_state or st.session_state.get("role") != "admin"
 st.title("🛠️ Admin Dashboard")
 
 # Filters
-status_filter = st.selectbox(
-    "Filter by Status", ["All", "Pending", "In Progress", "Completed"])
-urgency_filter = st.selectbox(
-    "Filter by Urgency", ["All", "Low", "Medium", "High"])
+filter_col1, filter_col2 = st.columns(2)
+with filter_col1:
+    status_filter = st.selectbox(
+        "Filter by Status", ["All", "Pending", "In Progress", "Completed"])
+    sort_order = st.selectbox("Sort by", ["Newest first", "Oldest first"])
+with filter_col2:
+    urgency_filter = st.selectbox(
+        "Filter by Urgency", ["All", "Low", "Medium", "High"])
+    page_size = st.selectbox("Requests per page", PAGE_SIZES)
 
 # Build query
 query = {}
@@ -39,32 +45,61 @@ if status_filter != "All":
 if urgency_filter != "All":
     query["urgency"] = urgency_filter
 
-# Fetch jobs
-requests = list(requests_col.find(query))
+# Keyset pagination: the (timestamp, _id) each page starts after, for every
+# page visited so far; going back pops one. New filters start over.
+view = (status_filter, urgency_filter, sort_order, page_size)
+if st.session_state.get("admin_requests_view") != view:
+    st.session_state["admin_requests_view"] = view
+    st.session_state["admin_requests_keysets"] = [None]
+keysets = st.session_state["admin_requests_keysets"]
+
+# Fetch one page of jobs
+repo = get_requests_repo()
+requests, next_keyset = repo.page(query, after=keysets[-1], page_size=page_size,
+                                  descending=sort_order == "Newest first")
+total = repo.total(query)
+pages = max(1, math.ceil(total / page_size))
+
+unordered = repo.unordered_count()
+if unordered:
+    st.warning(f"{unordered} older requests have no sortable timestamp and only appear on the "
+               "first page. Run `python -m utils.service_requests migrate` to fix them.")
+
+nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+nav_prev.button("◀ Previous", disabled=len(keysets) == 1, on_click=keysets.pop)
+nav_info.caption(f"Page {len(keysets)} of {pages} · about {total} requests")
+nav_next.button("Next ▶", disabled=next_keyset is None,
+                on_click=keysets.append, args=(next_keyset,))
 
 if not requests:
     st.info("No matching service requests found.")
 else:
     # Get all servicemen
     servicemen = [user["username"]
-                  for user in users_col.find({"role": "serviceman"})]
+                  for user in users_col.find({"role": "serviceman"}, {"username": 1})]
 
     for req in requests:
-        with st.expander(f"{req.get('category', 'Unknown')} - {req.get('name', 'Unnamed')} @ {req.get('location', 'Unknown')}"):
-            st.write(f"**Description:** {req['description']}")
-            st.write(f"**Urgency:** {req.get('urgency', 'Not specified')}")
-            st.write(f"**Status:** `{req.get('status', 'Pending')}`")
+        with st.expander(f"{req.category or 'Unknown'} - {req.name or 'Unnamed'} @ {req.location or 'Unknown'}"):
+            st.write(f"**Description:** {req.description}")
+            st.write(f"**Urgency:** {req.urgency or 'Not specified'}")
+            st.write(f"**Status:** `{req.status or 'Pending'}`")
             st.write(
-                f"**Assigned To:** {req.get('assigned_to', 'Not Assigned')}")
-            st.write(f"**Timestamp:** {req.get('timestamp', 'N/A')}")
+                f"**Assigned To:** {req.assigned_to or 'Not Assigned'}")
+            st.write(f"**Submitted:** {format_time(req.created_at)}")
+
+            if req.possible_duplicates:
+                similar = ", ".join(
+                    f"#{str(d['request_id'])[-6:]} ({d['similarity']:.0%})"
+                    for d in req.possible_duplicates)
+                st.warning(f"🔁 Possible duplicate of {similar}")
 
             # Show scheduled time if exists
-            if req.get("scheduled_time"):
+            if req.scheduled_time:
                 st.write(
-                    f"**Scheduled For:** {req['scheduled_time']['date']} {req['scheduled_time']['start']}-{req['scheduled_time']['end']}")
+                    f"**Scheduled For:** {req.scheduled_time['date']} {req.scheduled_time['start']}-{req.scheduled_time['end']}")
 
             # Update Fields
-            current_status = req.get("status", "Pending")
+            current_status = req.status or "Pending"
             valid_statuses = ["Pending", "In Progress", "Completed"]
             if current_status not in valid_statuses:
                 current_status = "Pending"
@@ -73,10 +108,10 @@ else:
                 "Update Status",
                 valid_statuses,
                 index=valid_statuses.index(current_status),
-                key=f"status_{req['_id']}"
+                key=f"status_{req.id}"
             )
 
-            assigned_to = req.get("assigned_to", "Not Assigned")
+            assigned_to = req.assigned_to or "Not Assigned"
             assigned_to_list = ["Not Assigned"] + servicemen
 
             # Ensure the assigned_to value exists in the list, otherwise default to "Not Assigned"
@@ -87,13 +122,13 @@ else:
                 "Assign to Serviceman",
                 assigned_to_list,
                 index=assigned_to_list.index(assigned_to),
-                key=f"assign_{req['_id']}"
+                key=f"assign_{req.id}"
             )
 
             admin_notes = st.text_area(
                 "Admin Notes",
-                value=req.get("admin_notes", ""),
-                key=f"notes_{req['_id']}"
+                value=req.admin_notes or "",
+                key=f"notes_{req.id}"
             )
 
             # Scheduling Section
@@ -102,7 +137,7 @@ else:
                 schedule_date = st.date_input(
                     "Select Date",
                     datetime.now().date(),
-                    key=f"date_{req['_id']}"
+                    key=f"date_{req.id}"
                 )
 
                 serviceman_schedule = get_available_slots(
@@ -121,23 +156,21 @@ else:
                     selected_slot = st.selectbox(
                         "Available Time Slots",
                         slot_options,
-                        key=f"slot_{req['_id']}"
+                        key=f"slot_{req.id}"
                     )
                 else:
                     st.warning("No available time slots for this serviceman")
 
-            if st.button("✅ Update", key=f"update_{req['_id']}"):
+            if st.button("✅ Update", key=f"update_{req.id}"):
                 # Determine what changed
-                status_changed = new_status != req.get("status")
-                assignment_changed = assigned_to != req.get(
-                    "assigned_to", "Not Assigned")
+                status_changed = new_status != req.status
+                assignment_changed = assigned_to != (req.assigned_to or "Not Assigned")
 
                 # Update database
                 update_data = {
                     "status": new_status,
                     "assigned_to": assigned_to if assigned_to != "Not Assigned" else None,
-                    "admin_notes": admin_notes,
-                    "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+                    "admin_notes": admin_notes
                 }
 
                 # Handle scheduling if applicable
@@ -150,24 +183,21 @@ else:
                         "end": end
                     }
                     book_slot(
-                        str(req["_id"]),
+                        str(req.id),
                         assigned_to,
                         datetime.combine(schedule_date, datetime.min.time()),
                         {"start": start, "end": end}
                     )
 
-                requests_col.update_one(
-                    {"_id": ObjectId(req["_id"])},
-                    {"$set": update_data}
-                )
+                repo.update(req.id, **update_data)
 
                 # Send notifications
                 if assignment_changed and assigned_to != "Not Assigned":
-                    notify_assignment(str(req["_id"]), assigned_to)
+                    notify_assignment(str(req.id), assigned_to)
 
                 if status_changed and new_status == "Completed":
                     notify_completion(
-                        str(req["_id"]), st.session_state["username"])
+                        str(req.id), st.session_state["username"])
 
                 st.success("✅ Updated successfully!")
 
@@ -176,8 +206,14 @@ else:
 # ---------------------------
 
 
+# The sidebar pickers list the oldest pending requests, not all of them
+PICKER_LIMIT = 50
+
+
 def get_pending_jobs():
-    return list(requests_col.find({"status": "Pending"}))
+    jobs, more = get_requests_repo().page(
+        {"status": "Pending"}, page_size=PICKER_LIMIT, descending=False)
+    return jobs, more is not None
 
 
 def get_servicemen():
@@ -185,26 +221,17 @@ def get_servicemen():
 
 
 def assign_job(job_id, serviceman_username):
-    requests_col.update_one(
-        {"_id": ObjectId(job_id)},
-        {"$set": {
-            "assigned_to": serviceman_username,
-            "status": "In Progress",
-            "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        }}
-    )
+    get_requests_repo().update(job_id, assigned_to=serviceman_username, status="In Progress")
     notify_assignment(job_id, serviceman_username)
 
 
 def force_complete_job(job_id, reason):
-    requests_col.update_one(
-        {"_id": ObjectId(job_id)},
-        {"$set": {
-            "status": "Completed",
-            "admin_notes": f"[OVERRIDE] {reason}",
-            "completed_by": st.session_state["username"],
-            "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        }}
+    get_requests_repo().update(
+        job_id,
+        status="Completed",
+        admin_notes=f"[OVERRIDE] {reason}",
+        completed_by=st.session_state["username"],
+        completed_at=datetime.utcnow()
     )
     notify_completion(job_id, st.session_state["username"])
 
@@ -213,12 +240,14 @@ if st.session_state.get("role") == "admin":
     st.sidebar.header("🧰 Admin Tools")
 
     # Job Assignment Section
-    pending_jobs = get_pending_jobs()
+    pending_jobs, more_pending = get_pending_jobs()
     servicemen_list = get_servicemen()
+    if more_pending:
+        st.sidebar.caption(f"Showing the {PICKER_LIMIT} oldest pending requests")
 
     if pending_jobs and servicemen_list:
         st.sidebar.subheader("Quick Assign")
-        job_options = [f"{job['category']}" for job in pending_jobs]
+        job_options = [request_label(job) for job in pending_jobs]
         selected_index = st.sidebar.selectbox(
             "Select Job",
             list(range(len(job_options))),
@@ -238,7 +267,7 @@ if st.session_state.get("role") == "admin":
         selected_serviceman = servicemen_list[selected_serviceman_index]
 
         if st.sidebar.button("✅ Assign"):
-            assign_job(str(selected_job["_id"]),
+            assign_job(str(selected_job.id),
                        selected_serviceman["username"])
             st.success(f"Job assigned to {selected_serviceman['name']}")
             st.experimental_rerun()
@@ -284,7 +313,7 @@ if st.session_state.get("role") == "admin":
     if pending_jobs:
         st.sidebar.subheader("Emergency Tools")
         if st.sidebar.checkbox("🚨 Force Complete"):
-            job_options = [f"{job['category']}" for job in pending_jobs]
+            job_options = [request_label(job) for job in pending_jobs]
             selected_index = st.sidebar.selectbox(
                 "Select Job to Complete",
                 list(range(len(job_options))),
@@ -297,6 +326,6 @@ if st.session_state.get("role") == "admin":
                 key="override_reason"
             )
             if st.sidebar.button("⚠️ Force Completion"):
-                force_complete_job(str(selected_job["_id"]), override_reason)
+                force_complete_job(str(selected_job.id), override_reason)
                 st.success("Job forcefully marked as completed.")
                 st.experimental_rerun()
@@ -1,11 +1,10 @@
 import streamlit as st
 st.set_page_config(page_title="My Jobs", page_icon="🧰")
 
-from utils.db import requests_col
 from pages.Layout import layout
 from datetime import datetime
 from utils.notifications import notify_assignment, notify_completion
-from utils.job_utils import log_job_action
+from utils.service_requests import get_requests_repo, format_time
 
 # Check role and login
 if "username" not in st.session_state or st.session_state.get("role") != "serviceman":
@@ -17,7 +16,8 @@ layout()
 st.title("🧰 My Assigned Jobs")
 serviceman = st.session_state.get("username")
 
-assigned_jobs = list(requests_col.find({"assigned_to": serviceman}))
+repo = get_requests_repo()
+assigned_jobs = list(repo.find({"assigned_to": serviceman}, view="list"))
 
 if not assigned_jobs:
     st.info("You don't have any assigned jobs yet.")
@@ -26,17 +26,15 @@ if not assigned_jobs:
 def complete_job(job_id: str, serviceman_username: str) -> str:
     """Enhanced with logging and notifications"""
     try:
-        result = requests_col.update_one(
-            {"_id": job_id, "assigned_to": serviceman_username},
-            {"$set": {
-                "status": "Completed",
-                "completed_at": datetime.utcnow(),
-                "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            }}
+        completed = repo.update(
+            job_id,
+            query={"assigned_to": serviceman_username},
+            status="Completed",
+            completed_at=datetime.utcnow()
         )
 
-        if result.modified_count:
-            log_job_action(job_id, "COMPLETED", serviceman_username)
+        if completed:
+            repo.log_action(job_id, "COMPLETED", serviceman_username)
             notify_completion(job_id, serviceman_username)
             return f"✅ Job {job_id} completed!"
         return "⚠️ Job not found or already completed"
@@ -44,38 +42,32 @@ def complete_job(job_id: str, serviceman_username: str) -> str:
         return f"🚨 Error: {str(e)}"
 
 for job in assigned_jobs:
-    with st.expander(f"{job['category']} - {job['location']}"):
-        st.write("**Client Name:**", job["name"])
-        st.write("**Description:**", job["description"])
-        st.write("**Urgency:**", job["urgency"])
-        st.write("**Status:**", job.get("status", "Pending"))
-        st.write("**Admin Notes:**", job.get("admin_notes", "None"))
-        st.write("**Last Updated:**", job.get("timestamp", "N/A"))
+    with st.expander(f"{job.category} - {job.location}"):
+        st.write("**Client Name:**", job.name)
+        st.write("**Description:**", job.description)
+        st.write("**Urgency:**", job.urgency)
+        st.write("**Status:**", job.status or "Pending")
+        st.write("**Admin Notes:**", job.admin_notes or "None")
+        st.write("**Last Updated:**", format_time(job.updated_at or job.created_at))
 
+        statuses = ["Pending", "In Progress", "Completed"]
         update_status = st.selectbox(
             "Update Status",
-            ["Pending", "In Progress", "Completed"],
-            index=["Pending", "In Progress", "Completed"].index(job.get("status", "Pending")),
-            key=f"status_{job['_id']}"
+            statuses,
+            index=statuses.index(job.status) if job.status in statuses else 0,
+            key=f"status_{job.id}"
         )
 
         serviceman_notes = st.text_area(
             "Add Notes",
-            value=job.get("serviceman_notes", ""),
-            key=f"notes_{job['_id']}"
+            value=job.serviceman_notes or "",
+            key=f"notes_{job.id}"
         )
 
-        if st.button("Submit Update", key=f"btn_{job['_id']}"):
+        if st.button("Submit Update", key=f"btn_{job.id}"):
             if update_status == "Completed":
-                msg = complete_job(job["_id"], serviceman)
+                msg = complete_job(job.id, serviceman)
                 st.success(msg)
             else:
-                requests_col.update_one(
-                    {"_id": job["_id"]},
-                    {"$set": {
-                        "status": update_status,
-                        "serviceman_notes": serviceman_notes,
-                        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                    }}
-                )
+                repo.update(job.id, status=update_status, serviceman_notes=serviceman_notes)
                 st.success("Status updated!")
@@ -1,7 +1,8 @@
 import os
 import streamlit as st
 from openai import OpenAI
-from utils.db import requests_col
+from utils.service_requests import ServiceRequest, get_requests_repo
+from utils.categories import service_labels
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,8 +18,7 @@ st.title("🛠️ Household Service Request")
 
 with st.form("request_form"):
     name = st.text_input("Your Name")
-    category = st.selectbox("Service Category", [
-        "Plumbing", "Electrical", "Carpentry", "Appliance Repair", "Painting", "Other"])
+    category = st.selectbox("Service Category", service_labels())
     description = st.text_area("Describe the issue")
     urgency = st.selectbox("Urgency", ["Low", "Medium", "High"])
     location = st.text_input("Location")
@@ -27,14 +27,14 @@ with st.form("request_form"):
     submitted = st.form_submit_button("Submit Request")
 
 if submitted:
-    request_data = {
-        "name": name,
-        "category": category,
-        "description": description,
-        "urgency": urgency,
-        "location": location,
-    }
-    requests_col.insert_one(request_data)
+    get_requests_repo().create(ServiceRequest(
+        requester=st.session_state.get("username"),
+        name=name,
+        category=category,
+        description=description,
+        urgency=urgency,
+        location=location,
+    ))
     st.success("✅ Request submitted successfully!")
 
     prompt = f"""
@@ -243,19 +243,19 @@
 #     st.info("No posts found based on your filter.")
 
 import streamlit as st
-from pymongo import MongoClient
 from datetime import datetime
-import os
 from dotenv import load_dotenv
+from utils.mongo import community_posts, community_events, users
 
 load_dotenv()
 
-# MongoDB Setup
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client["kommuniti"]
-posts_col = db["community_posts"]
-events_col = db["community_events"]
-users_col = db["users"]
+# MongoDB Setup (shared pooled client, kept across reruns)
+posts_col = community_posts()
+events_col = community_events()
+users_col = users()
+
+# Invitations listed at once
+INVITATION_LIMIT = 20
 
 # Get current logged-in user
 current_user = st.session_state.get("username", "demo_user")
@@ -367,8 +367,12 @@ with tab2:
 with tab3:
     st.subheader("Your Event Invitations")
 
-    # Get events you're invited to but haven't RSVP'd
-    invites = events_col.find({"attendees": {"$ne": current_user}})
+    # Upcoming events you haven't RSVP'd to; the date range uses the date
+    # index, "not attending" alone could not
+    invites = events_col.find(
+        {"date": {"$gte": datetime.now().strftime("%Y-%m-%d")},
+         "attendees": {"$ne": current_user}}
+    ).sort("date", 1).limit(INVITATION_LIMIT)
 
     invite_count = 0
     for invite in invites:
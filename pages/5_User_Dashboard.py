@@ -1,16 +1,13 @@
 import streamlit as st
-from pymongo import MongoClient
 from datetime import datetime
-import os
 from dotenv import load_dotenv
+from utils.mongo import community_posts
+from utils.service_requests import get_requests_repo, format_time
 
 load_dotenv()
 
-# MongoDB setup
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client["your_db_name"]  # replace with your DB name
-requests_col = db["service_requests"]
-posts_col = db["community_posts"]
+# MongoDB setup (shared pooled client, kept across reruns)
+posts_col = community_posts()
 
 # Simulate logged-in user
 current_user = st.session_state.get("username", "demo_user")
@@ -39,15 +36,13 @@ if view_community:
 if st.session_state["dashboard_view"] == "repairs":
     st.subheader("🔧 My Service Requests")
 
-    my_requests = requests_col.find(
-        {"user_id": current_user}).sort("timestamp", -1)
+    my_requests = get_requests_repo().find(
+        {"user_id": current_user}, view="list", sort=[("timestamp", -1)])
     for req in my_requests:
-        st.markdown(f"**Request ID:** `{str(req['_id'])}`")
-        st.write(f"**Status:** {req.get('status', 'N/A')}")
-        st.write(f"**Assigned To:** {req.get('assigned_to', 'Not Assigned')}")
-        st.image(req.get("photo_url", ""), width=300)
-        st.caption(
-            f"Submitted on {req.get('timestamp', '')[:19].replace('T', ' ')}")
+        st.markdown(f"**Request ID:** `{req.id}`")
+        st.write(f"**Status:** {req.status or 'N/A'}")
+        st.write(f"**Assigned To:** {req.assigned_to or 'Not Assigned'}")
+        st.caption(f"Submitted on {format_time(req.created_at, '')}")
         st.markdown("---")
 
 # ------------------------------------------
@@ -1,15 +1,13 @@
 import streamlit as st
-import os
 from datetime import datetime
-from pymongo import MongoClient
 from dotenv import load_dotenv
+from utils.mongo import get_db
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB Setup
-client = MongoClient(os.getenv("MONGODB_URI"))
-db = client["kommuniti"]
+# MongoDB Setup (shared pooled client, kept across reruns)
+db = get_db()
 
 # Get current logged-in user info
 current_user = st.session_state.get("username", None)
@@ -4,9 +4,11 @@ to start the Telegram bot without import errors
 """
 import os
 import sys
-import time
+import atexit
+import argparse
 import logging
 from dotenv import load_dotenv
+from utils.startup import StartupTimer, warm_up_in_background
 
 # Load environment variables
 load_dotenv()
@@ -35,8 +37,50 @@ def check_environment():
     return True
 
 
-def main():
+def run_webhook(process_update, host, port):
+    """Serve the webhook endpoint, registering it with Telegram if WEBHOOK_URL is set"""
+    import uvicorn
+    from utils.dispatcher import UpdateDispatcher
+    from utils.webhook import WebhookApp, WEBHOOK_PATH, set_webhook
+
+    from utils.mongo import health_check
+
+    dispatcher = UpdateDispatcher(process_update).start()
+    app = WebhookApp(dispatcher, health_check=health_check)
+
+    public_url = os.getenv("WEBHOOK_URL")
+    if public_url:
+        set_webhook(public_url.rstrip("/") + WEBHOOK_PATH)
+
+    uvicorn.run(app, host=host, port=port, log_level="info")
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Run the KommunityKonect ServiceBot")
+    parser.add_argument(
+        "--runtime",
+        choices=["threads", "async", "webhook"],
+        default=os.getenv("BOT_RUNTIME", "threads"),
+        help="threads: blocking long polling with a worker pool; "
+             "async: asyncio loop with a pooled HTTP/2 client; "
+             "webhook: HTTP endpoint receiving updates pushed by Telegram"
+    )
+    parser.add_argument("--host", default=os.getenv("WEBHOOK_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int,
+                        default=int(os.getenv("WEBHOOK_PORT", "8080")))
+    parser.add_argument(
+        "--no-warm-up", dest="warm_up", action="store_false",
+        default=os.getenv("BOT_WARM_UP", "1") != "0",
+        help="Skip loading the CLIP model and LLM client in the background; "
+             "they are then loaded on first use"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main function to run the bot"""
+    args = parse_args(argv)
     try:
         print("Starting KommunityKonect ServiceBot...")
 
@@ -44,22 +88,94 @@ def main():
         if not check_environment():
             return 1
 
-        # Ensure database connection works
-        from utils.db import connect_to_db
-        if not connect_to_db():
-            logger.error("Failed to connect to database")
-            return 1
+        timer = StartupTimer()
+
+        # Wait for the database (retrying with backoff) before taking updates
+        with timer.step("import utils.db"):
+            from utils.db import connect_to_db
+        with timer.step("connect_to_db"):
+            if not connect_to_db():
+                logger.error("Failed to connect to database")
+                return 1
+
+        # Build indexes missing from the spec without holding up startup;
+        # rebuilds and drops are left to `python -m utils.indexes sync`
+        if os.getenv("INDEX_SYNC_ON_START", "1") != "0":
+            from utils.indexes import ensure_indexes
+            ensure_indexes()
+
+        # Give legacy requests datetime timestamps so keyset pages reach them
+        if os.getenv("REQUEST_MIGRATE_ON_START", "1") != "0":
+            from utils.service_requests import migrate_in_background
+            migrate_in_background()
 
         # Import the bot module after database is confirmed working
-        from utils.telegram_bot import handle_updates
+        with timer.step("import utils.telegram_bot"):
+            from utils.telegram_bot import process_update, run_polling, prefetch_senders, PHOTO_WORKER
+            from utils.user_cache import get_user_profiles
+
+        # Replies and notifications share one rate-limited sender
+        with timer.step("outbound queue"):
+            from utils.outbound import get_outbound
+            get_outbound()
+
+        # Keep cached roles fresh when users are edited elsewhere
+        with timer.step("user profile watch"):
+            get_user_profiles().watch()
+
+        # Reuse analyses of photos seen before
+        with timer.step("analysis cache"):
+            from utils.analysis_cache import get_analysis_cache
+            PHOTO_WORKER.cache = get_analysis_cache()
+
+        # Flag photo requests that look like duplicates of recent ones nearby
+        with timer.step("load duplicate index"):
+            from utils.db import requests_col
+            from utils.duplicates import load_duplicate_index
+            PHOTO_WORKER.duplicates = load_duplicate_index(requests_col)
+            atexit.register(PHOTO_WORKER.duplicates.save)
+
+        # Pick up photo analyses interrupted by the last shutdown
+        with timer.step("resume pending photo analyses"):
+            PHOTO_WORKER.resume_pending()
+
+        timer.report()
+
+        if args.warm_up:
+            # Models and API clients load on first use; warm them meanwhile
+            from utils.image_processing import warm_up as warm_up_clip
+            from service_agents.serviceman_agent import get_nim_client
+            warm_up_in_background([
+                ("CLIP model", warm_up_clip),
+                ("NIM client", get_nim_client),
+            ])
+
+        # Report how many answers came without an LLM call, CLIP batching and
+        # pool waits on shutdown
+        from service_agents.serviceman_agent import agent_stats
+        from utils.image_processing import inference_stats
+        from utils.mongo import pool_stats
+        atexit.register(lambda: logger.info(f"Serviceman agent: {agent_stats()}"))
+        atexit.register(lambda: logger.info(f"CLIP batcher: {inference_stats()}"))
+        atexit.register(lambda: logger.info(f"MongoDB pool: {pool_stats()}"))
 
         print("KommunityKonect ServiceBot is running...")
-        logger.info("Bot started successfully")
-
-        # Run the bot's update loop
-        while True:
-            handle_updates()
-            time.sleep(0.5)
+        logger.info(f"Bot started successfully ({args.runtime} runtime)")
+
+        if args.runtime == "webhook":
+            run_webhook(process_update, args.host, args.port)
+        elif args.runtime == "async":
+            import asyncio
+            from utils.async_runtime import AsyncBotRuntime
+            asyncio.run(AsyncBotRuntime(process_update, prefetch=prefetch_senders).run())
+        else:
+            from utils.dispatcher import UpdateDispatcher
+
+            # Fan updates out to a worker pool, one serial lane per chat
+            dispatcher = UpdateDispatcher(process_update).start()
+
+            # Run the bot's update loop
+            run_polling(dispatcher)
 
     except KeyboardInterrupt:
         print("\nBot shutdown requested. Exiting gracefully...")
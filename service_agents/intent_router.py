@@ -0,0 +1,378 @@
+"""
+Local intent routing for the serviceman agent.
+
+Most serviceman messages are one of a handful of requests (list my jobs,
+complete a job, job status, next appointment, directions) that the agent
+can answer straight from MongoDB. A message is routed in two steps:
+
+1. A keyword grammar catches the common phrasings with high precision.
+2. A TF-IDF nearest-neighbour model over example messages catches the
+   rest ("anything on my plate today?"). Messages it is unsure about are
+   "open" and go to the LLM.
+
+Reschedules and multi-step messages ("complete 12 and show my next
+visit") are left to the LLM's tool-calling agent.
+
+Routed messages are appended to INTENT_LOG_PATH. Grammar matches and lines
+given an explicit "label" are used as extra training examples on start:
+
+    python -m service_agents.intent_router evaluate --log logs/agent_messages.jsonl
+"""
+import os
+import re
+import json
+import math
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", "logs/agent_messages.jsonl")
+# Cosine similarity to the nearest example needed to trust the model
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.45"))
+
+LIST_JOBS = "list_jobs"
+COMPLETE_JOB = "complete_job"
+JOB_STATUS = "job_status"
+NEXT_APPOINTMENT = "next_appointment"
+DIRECTIONS = "directions"
+RESCHEDULE_JOB = "reschedule_job"
+OPEN = "open"
+
+INTENTS = [LIST_JOBS, COMPLETE_JOB, JOB_STATUS, NEXT_APPOINTMENT, DIRECTIONS, RESCHEDULE_JOB, OPEN]
+
+# Tried in order; the first match wins. COMPLETE_JOB writes to the database,
+# so its patterns are anchored commands and statements ("complete job 12",
+# "i finished job 12"), "close" needs a job reference, and questions never match
+GRAMMAR = [
+    (COMPLETE_JOB, re.compile(r"^/?(complete|completed|finish|finished|done)\b"
+                              r"|^/?closed?\s+(job\b|#)"
+                              r"|^(i|we)\s+(have\s+|just\s+)?(completed|finished|closed)\b.*\bjob\b"
+                              r"|^(mark|set)\b.*\b(complete|completed|done|finished)\W*$"
+                              r"|^job\s+#?\w+\s+(is\s+)?(done|completed|finished)\W*$")),
+    (RESCHEDULE_JOB, re.compile(r"\b(reschedule|postpone|rebook)\b|\b(move|push)\b.*\b(job|visit|appointment)\b")),
+    (JOB_STATUS, re.compile(r"\bstatus\b|\bwhat'?s (happening|going on) with\b")),
+    (DIRECTIONS, re.compile(r"\b(directions?|route|navigate|address)\b|\bhow (do|can) i get to\b"
+                            r"|\bwhere is (job|the job|#)")),
+    (NEXT_APPOINTMENT, re.compile(r"\b(next|upcoming)\b.*\b(appointments?|visits?|bookings?|slots?|job)\b"
+                                  r"|\bwhen('?s| is)\b.*\b(appointment|visit)\b|\bschedule\b")),
+    (LIST_JOBS, re.compile(r"\b(my|list|pending|open|assigned|all)\b.*\bjobs\b|^/?jobs$")),
+]
+
+SEED_EXAMPLES = [
+    (LIST_JOBS, "list my jobs"),
+    (LIST_JOBS, "show me my jobs"),
+    (LIST_JOBS, "what jobs do i have"),
+    (LIST_JOBS, "anything on my plate today"),
+    (LIST_JOBS, "what work is assigned to me"),
+    (LIST_JOBS, "do i have any pending work"),
+    (LIST_JOBS, "what do i need to do today"),
+    (LIST_JOBS, "any new tasks for me"),
+    (COMPLETE_JOB, "complete job 123"),
+    (COMPLETE_JOB, "i finished job 123"),
+    (COMPLETE_JOB, "job 123 is done"),
+    (COMPLETE_JOB, "fixed the leak on job 123, close it"),
+    (COMPLETE_JOB, "work on 123 completed"),
+    (COMPLETE_JOB, "mark 123 as finished"),
+    (JOB_STATUS, "status of job 123"),
+    (JOB_STATUS, "what is the status of 123"),
+    (JOB_STATUS, "is job 123 still open"),
+    (JOB_STATUS, "has 123 been assigned"),
+    (JOB_STATUS, "any update on job 123"),
+    (JOB_STATUS, "check job 123"),
+    (JOB_STATUS, "is job 123 done"),
+    (JOB_STATUS, "has job 123 been completed yet"),
+    (JOB_STATUS, "was 123 finished"),
+    (NEXT_APPOINTMENT, "when is my next appointment"),
+    (NEXT_APPOINTMENT, "what is my next visit"),
+    (NEXT_APPOINTMENT, "where do i have to be next"),
+    (NEXT_APPOINTMENT, "what time is my next booking"),
+    (NEXT_APPOINTMENT, "what's next on my schedule"),
+    (NEXT_APPOINTMENT, "when do i start tomorrow"),
+    (DIRECTIONS, "directions to job 123"),
+    (DIRECTIONS, "how do i get to job 123"),
+    (DIRECTIONS, "where is job 123"),
+    (DIRECTIONS, "send me the location of 123"),
+    (DIRECTIONS, "which flat is job 123 in"),
+    (DIRECTIONS, "navigate to my next job"),
+    (RESCHEDULE_JOB, "reschedule job 123 to friday"),
+    (RESCHEDULE_JOB, "move 123 to tomorrow 10am"),
+    (RESCHEDULE_JOB, "can't make it to 123 today, shift it to monday"),
+    (RESCHEDULE_JOB, "push the visit for 123 by a day"),
+    (OPEN, "how do i fix a leaking pipe"),
+    (OPEN, "what size fuse does a water heater need"),
+    (OPEN, "the customer is asking for a discount what should i say"),
+    (OPEN, "can i use teflon tape on a gas fitting"),
+    (OPEN, "what tools should i carry for a ceiling fan install"),
+    (OPEN, "how long does wall putty take to dry"),
+    (OPEN, "hello"),
+    (OPEN, "thanks"),
+]
+
+_ID_TOKEN = re.compile(r"^#?(?=\w*\d)\w+$")
+_OBJECT_ID = re.compile(r"\b[0-9a-f]{24}\b")
+_JOB_IDS = re.compile(r"\bjob\s+#?(\w*\d\w*)|#(\w*\d\w*)|\b([0-9a-f]{24})\b", re.IGNORECASE)
+QUESTION = re.compile(r"\?|^(is|are|was|were|has|have|had|did|does|can|could|will|would)\b"
+                      r"|\b(whether|check if)\b")
+CLAUSE_SPLIT = re.compile(r"[,;]|\b(?:and then|then|and|also)\b")
+
+
+def normalize(text):
+    """Lowercase words, with anything that looks like a job id replaced by <id>"""
+    words = re.findall(r"[#\w']+", (text or "").lower())
+    return ["<id>" if _ID_TOKEN.match(w) else w.strip("#'") for w in words]
+
+
+def extract_job_id(text):
+    """
+    Job id mentioned in a message, if any.
+
+    Prefers a full ObjectId, then the word after "job"/"#", then the last
+    token containing a digit.
+    """
+    lowered = (text or "").lower()
+    match = _OBJECT_ID.search(lowered)
+    if match:
+        return match.group(0)
+    words = re.findall(r"[#\w]+", text or "")
+    for i, word in enumerate(words):
+        if word.startswith("#") and len(word) > 1:
+            return word[1:]
+        if word.lower() == "job" and i + 1 < len(words) and words[i + 1].lower() not in ("is", "as"):
+            return words[i + 1].lstrip("#")
+    ids = [w.lstrip("#") for w in words if _ID_TOKEN.match(w)]
+    return ids[-1] if ids else None
+
+
+# Question scaffolding shared by every intent ("how do i ...") says nothing about which
+STOP_WORDS = {"a", "an", "the", "i", "do", "does", "how", "can", "could", "to", "of", "is",
+              "it", "in", "on", "at", "and", "or", "be", "should", "would", "please"}
+
+
+def features(text):
+    """Word unigrams and bigrams plus character trigrams (typo tolerant)"""
+    words = [w for w in normalize(text) if w not in STOP_WORDS]
+    feats = Counter(f"w:{w}" for w in words)
+    feats.update(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        if word != "<id>":
+            padded = f" {word} "
+            feats.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return feats
+
+
+class TfidfIntentModel:
+    """
+    Nearest-neighbour intent classifier over TF-IDF vectors.
+
+    Args:
+        examples (list): (intent, text) pairs
+    """
+
+    def __init__(self, examples):
+        self.intents = [intent for intent, _ in examples]
+        counts = [features(text) for _, text in examples]
+        document_freq = Counter(f for c in counts for f in c)
+        self.vocab = {f: i for i, f in enumerate(sorted(document_freq))}
+        n = len(examples)
+        self.idf = np.array([math.log((1 + n) / (1 + document_freq[f])) + 1 for f in self.vocab],
+                            dtype=np.float32)
+        self.matrix = np.stack([self._vector(c) for c in counts]) if counts else \
+            np.empty((0, len(self.vocab)), dtype=np.float32)
+
+    def _vector(self, counts):
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        for feature, count in counts.items():
+            i = self.vocab.get(feature)
+            if i is not None:
+                vector[i] = (1 + math.log(count)) * self.idf[i]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def predict(self, text):
+        """
+        Returns:
+            tuple: (intent, cosine similarity of the nearest example)
+        """
+        if not len(self.intents):
+            return OPEN, 0.0
+        scores = self.matrix @ self._vector(features(text))
+        best = int(scores.argmax())
+        return self.intents[best], float(scores[best])
+
+
+class IntentRouter:
+    """
+    Grammar first, then the TF-IDF model, then the LLM.
+
+    Args:
+        examples (list): Training (intent, text) pairs, SEED_EXAMPLES by default
+        min_confidence (float): Model similarity below which a message is open
+        log_path (str): JSONL file routed messages are appended to (None to disable)
+    """
+
+    def __init__(self, examples=None, min_confidence=INTENT_MIN_CONFIDENCE, log_path=None):
+        self.model = TfidfIntentModel(examples if examples is not None else SEED_EXAMPLES)
+        self.min_confidence = min_confidence
+        self.log_path = log_path
+        self._log_lock = threading.Lock()
+        self.counts = Counter()
+
+    def classify(self, text):
+        """
+        Returns:
+            tuple: (intent, confidence, source) for one request. Only a
+            "grammar" COMPLETE_JOB may be acted on without confirmation.
+        """
+        lowered = (text or "").lower().strip()
+        question = bool(QUESTION.search(lowered))
+        for name, pattern in GRAMMAR:
+            if name == COMPLETE_JOB and question:
+                continue
+            if pattern.search(lowered):
+                return name, 1.0, "grammar"
+        predicted, confidence = self.model.predict(lowered)
+        if predicted == COMPLETE_JOB and question:
+            # "is job 12 done?" asks for the status
+            predicted = JOB_STATUS
+        if predicted != OPEN and confidence >= self.min_confidence:
+            return predicted, confidence, "model"
+        return OPEN, confidence, "fallback"
+
+    def is_multi_step(self, text):
+        """True for messages asking for several things ("complete 12 and show my next visit")"""
+        clauses = [c for c in CLAUSE_SPLIT.split((text or "").lower()) if c.strip()]
+        actions = [c for c in clauses if self.classify(c)[0] != OPEN]
+        return len(actions) > 1 or len(set(_JOB_IDS.findall(text or ""))) > 1
+
+    def route(self, text):
+        """
+        Resolve a message to an intent.
+
+        Returns:
+            dict: intent, job_id, confidence, source ("grammar", "model" or
+            "fallback") and multi_step
+        """
+        intent, confidence, source = self.classify(text)
+        route = {"intent": intent, "job_id": extract_job_id(text),
+                 "confidence": round(confidence, 3), "source": source,
+                 "multi_step": self.is_multi_step(text)}
+        self.counts["multi_step" if route["multi_step"] else source] += 1
+        self._log(text, route)
+        return route
+
+    def _log(self, text, route):
+        if not self.log_path:
+            return
+        line = json.dumps({"text": text, **route, "at": datetime.utcnow().isoformat()})
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not log agent message: {str(e)}")
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            "messages": total,
+            "by_source": dict(self.counts),
+            "llm_share": round((self.counts["fallback"] + self.counts["multi_step"]) / total, 3)
+            if total else None,
+        }
+
+
+def load_logged_examples(path=INTENT_LOG_PATH):
+    """
+    Training pairs from the message log: explicit labels, then grammar routes.
+    """
+    examples = []
+    if not os.path.exists(path):
+        return examples
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            intent = entry.get("label") or (entry.get("intent") if entry.get("source") == "grammar" else None)
+            if intent in INTENTS and entry.get("text"):
+                examples.append((intent, entry["text"]))
+    return examples
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide router trained on the seed examples and the message log"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                started = time.perf_counter()
+                examples = SEED_EXAMPLES + load_logged_examples()
+                _router = IntentRouter(examples, log_path=INTENT_LOG_PATH)
+                logger.info(f"Intent router trained on {len(examples)} examples "
+                            f"in {time.perf_counter() - started:.2f}s")
+    return _router
+
+
+def evaluate(router, labelled):
+    """Routing accuracy and per-message latency over (intent, text) pairs"""
+    correct, to_open, latencies, misses = 0, 0, [], []
+    for intent, text in labelled:
+        started = time.perf_counter()
+        routed = router.route(text)["intent"]
+        latencies.append(time.perf_counter() - started)
+        to_open += routed == OPEN
+        if routed == intent:
+            correct += 1
+        else:
+            misses.append((text, intent, routed))
+    latencies.sort()
+    return {
+        "messages": len(labelled),
+        "accuracy": round(correct / len(labelled), 3) if labelled else None,
+        "to_llm": to_open,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else None,
+        "misses": misses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviceman intent router")
+    commands = parser.add_subparsers(dest="command", required=True)
+    route = commands.add_parser("route", help="Show how a message is routed")
+    route.add_argument("text")
+    check = commands.add_parser("evaluate", help="Accuracy on labelled log lines")
+    check.add_argument("--log", default=INTENT_LOG_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "route":
+        print(json.dumps(IntentRouter(SEED_EXAMPLES + load_logged_examples()).route(args.text)))
+    elif args.command == "evaluate":
+        labelled = []
+        with open(args.log, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("label"):
+                    labelled.append((entry["label"], entry["text"]))
+        result = evaluate(IntentRouter(SEED_EXAMPLES), labelled)
+        for text, expected, routed in result.pop("misses"):
+            print(f"{expected:>16} -> {routed:<16} {text}")
+        print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,199 @@
+"""
+Cache of LLM answers to general serviceman questions.
+
+Servicemen ask the same things over and over ("how do I reset an MCB").
+Answers are stored under the normalized question; a miss on that exact key
+falls back to a cosine-similarity lookup over hashed word/character
+features, so "how to reset a MCB?" finds the same answer. Hashed features
+cannot tell "gas fitting" from "water fitting", so a near-duplicate is only
+reused when it also has the same content words (question scaffolding and
+plurals aside).
+
+Questions about particular jobs, customers or days are never cached, and
+neither are long prompts or long answers.
+"""
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+
+import numpy as np
+
+from utils.cache import TTLCache
+from service_agents.intent_router import features, STOP_WORDS
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "500"))
+# Cosine similarity at or above which another question's answer is reused
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.85"))
+MAX_PROMPT_CHARS = 300
+MAX_ANSWER_CHARS = 4000
+EMBEDDING_DIM = 2048
+
+# Words that tie a question to someone's jobs or the current day
+PERSONAL_WORDS = {"job", "jobs", "customer", "customers", "resident", "today", "tomorrow",
+                  "tonight", "yesterday", "schedule", "appointment", "booking", "assigned"}
+# Also ignored when comparing the content words of two questions
+FILLER_WORDS = STOP_WORDS | {"what", "my", "me", "you", "your", "for", "with"}
+# A request id, or a "#a7b8c9" short reference as shown in bot messages
+JOB_REFERENCE = re.compile(r"\b[0-9a-f]{24}\b|#\w*\d\w*", re.IGNORECASE)
+
+
+def normalize_prompt(text):
+    """Lowercase words only, so punctuation and spacing don't split entries"""
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def embed_text(text, dim=EMBEDDING_DIM):
+    """Hashed, sublinear-tf feature vector (unit length) for similarity lookups"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, count in features(text).items():
+        vector[zlib.crc32(feature.encode()) % dim] += 1 + np.log(count)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def content_words(text):
+    """Words that carry a question's meaning, singularized"""
+    words = set()
+    for word in normalize_prompt(text).split():
+        if word in FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def is_cacheable_question(text):
+    """False for questions whose answer depends on who asks or when"""
+    if not text or len(text) > MAX_PROMPT_CHARS or JOB_REFERENCE.search(text):
+        return False
+    return not PERSONAL_WORDS.intersection(normalize_prompt(text).split())
+
+
+class ResponseCache:
+    """
+    Exact and near-duplicate lookup of LLM answers.
+
+    Args:
+        max_entries (int): Answers kept (least recently used are dropped)
+        ttl (float): Seconds an answer stays valid
+        similarity (float): Threshold for near-duplicate hits, which must
+            also have the same content_words()
+        embed (callable): text -> unit vector, embed_text by default
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, ttl=RESPONSE_CACHE_TTL,
+                 similarity=RESPONSE_CACHE_SIMILARITY, embed=embed_text, clock=time.monotonic):
+        self.similarity = similarity
+        self.embed = embed
+        self._entries = TTLCache(max_entries=max_entries, ttl=ttl, clock=clock)
+        self._vectors = {}
+        self._matrix = None
+        self._keys = []
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(normalize_prompt(text).encode()).hexdigest()
+
+    def get(self, text):
+        """
+        Cached answer for a question, or None.
+
+        Returns None without counting a miss for questions that must not be
+        cached (see is_cacheable_question).
+        """
+        if not is_cacheable_question(text):
+            with self._lock:
+                self.bypassed += 1
+            return None
+
+        entry = self._entries.get(self.key(text))
+        kind = "exact"
+        if entry is None:
+            entry = self._nearest(self.embed(text), content_words(text))
+            kind = "semantic"
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if kind == "exact":
+                self.exact_hits += 1
+            else:
+                self.semantic_hits += 1
+            self.saved_seconds += entry["seconds"]
+        return entry["answer"]
+
+    def _nearest(self, vector, words):
+        with self._lock:
+            if self._matrix is None:
+                # Drop vectors whose answers expired or were evicted, then restack
+                self._vectors = {k: v for k, v in self._vectors.items() if k in self._entries}
+                self._keys = list(self._vectors)
+                self._matrix = np.stack([self._vectors[k] for k in self._keys]) if self._keys else None
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ vector
+            candidates = [self._keys[i] for i in np.argsort(-scores)
+                          if scores[i] >= self.similarity]
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is None:
+                with self._lock:
+                    self._matrix = None
+            elif entry["words"] == words:
+                return entry
+        return None
+
+    def put(self, text, answer, seconds=0.0):
+        """Store an answer that took seconds to generate"""
+        if not answer or len(answer) > MAX_ANSWER_CHARS or not is_cacheable_question(text):
+            return False
+        key = self.key(text)
+        self._entries.set(key, {"answer": answer, "seconds": seconds,
+                                "words": content_words(text)})
+        vector = self.embed(text)
+        with self._lock:
+            self._vectors[key] = vector
+            if len(self._vectors) > 2 * self._entries.max_entries:
+                self._matrix = None  # compacted on the next lookup
+            elif self._matrix is not None and key not in self._keys:
+                self._matrix = np.vstack([self._matrix, vector])
+                self._keys.append(key)
+            else:
+                self._matrix = None
+        return True
+
+    def record_stream(self, text, chunks):
+        """Pass a streamed answer through, caching it once it completes"""
+        started = time.perf_counter()
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(text, "".join(parts), time.perf_counter() - started)
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "saved_seconds": round(self.saved_seconds, 2),
+            }
@@ -1,108 +1,412 @@
 import os
-from openai import OpenAI
-from pymongo import MongoClient
+import json
+import time
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import quote_plus
+
 from dotenv import load_dotenv
 from typing import Optional
 
+from service_agents.intent_router import (
+    get_router, LIST_JOBS, COMPLETE_JOB, JOB_STATUS, NEXT_APPOINTMENT, DIRECTIONS, RESCHEDULE_JOB
+)
+from service_agents.response_cache import ResponseCache, is_cacheable_question
+from bson import ObjectId
+
+from utils.service_requests import get_requests_repo, id_filter
+
 load_dotenv()
 
-# --- Initialize NVIDIA NIM Client ---
-nim_client = OpenAI(
-    base_url="https://integrate.api.nvidia.com/v1",
-    api_key=os.getenv("NVIDIA_API_KEY2")
-)
+logger = logging.getLogger(__name__)
+
+NIM_BASE_URL = os.getenv("NIM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+NIM_MODEL = os.getenv("NIM_MODEL", "mistralai/mistral-7b-instruct-v0.3")
+# Model used for tool calling (must support the OpenAI tools API on NIM)
+NIM_TOOL_MODEL = os.getenv("NIM_TOOL_MODEL", NIM_MODEL)
+
+# Clients are created on first use so importing the agent stays cheap
+_nim_client = None
+
+# Answers to general questions, shared by every serviceman
+RESPONSE_CACHE = ResponseCache()
+# Tool-calling turns and the tools they ran
+TOOL_AGENT_COUNTS = Counter()
+
+
+def get_nim_client():
+    """NVIDIA NIM client (OpenAI-compatible), created on first use"""
+    global _nim_client
+    if _nim_client is None:
+        from openai import OpenAI
+        _nim_client = OpenAI(
+            base_url=NIM_BASE_URL,
+            api_key=os.getenv("NVIDIA_API_KEY2")
+        )
+    return _nim_client
+
+
+def get_requests_col():
+    """Service requests collection, connected on first use"""
+    # Indexes for the job queries are declared in utils.indexes
+    return get_requests_repo().col
 
-# --- MongoDB Setup ---
-mongo_client = MongoClient(os.getenv("MONGODB_URI"))
-db = mongo_client["your_db_name"]  # Replace with your DB name
-requests_col = db["service_requests"]
 
 # --- Tool Functions ---
 
 
-def get_my_jobs(serviceman_username: str) -> str:
-    """Fetch all pending jobs for a serviceman."""
-    jobs = list(requests_col.find({
-        "assigned_to": serviceman_username,
-        "status": {"$ne": "Completed"}
-    }))
+# Fields the tools and the LLM context need; photos, logs and embeddings stay in MongoDB
+JOB_FIELDS = {"description": 1, "category": 1, "status": 1, "location": 1, "scheduled_time": 1}
+JOB_CONTEXT_LIMIT = int(os.getenv("AGENT_JOB_CONTEXT_LIMIT", "20"))
+
+
+def fetch_job_context(serviceman_username: str, limit: int = JOB_CONTEXT_LIMIT) -> list:
+    """A serviceman's open jobs, fetched once per message for the tools and the prompt."""
+    return list(get_requests_col().find(
+        {"assigned_to": serviceman_username, "status": {"$ne": "Completed"}},
+        JOB_FIELDS
+    ).sort([("scheduled_time.date", 1), ("_id", 1)]).limit(limit))
+
+
+def _matches_reference(request_id, job_id: str) -> bool:
+    return str(request_id) == job_id or (len(job_id) >= 4 and str(request_id).endswith(job_id))
+
+
+def _resolve_job_id(job_id: str, jobs: Optional[list], serviceman_username: Optional[str] = None) -> str:
+    """
+    Expand a short reference (e.g. the last 6 characters shown in the bot),
+    from the job context, then from all of the serviceman's own jobs.
+    """
+    job_id = str(job_id).lstrip("#")
+    for job in jobs or ():
+        if _matches_reference(job["_id"], job_id):
+            return str(job["_id"])
+    if serviceman_username and not ObjectId.is_valid(job_id):
+        for job in get_requests_col().find({"assigned_to": serviceman_username}, {"_id": 1}):
+            if _matches_reference(job["_id"], job_id):
+                return str(job["_id"])
+    return job_id
+
+
+def format_job(job: dict) -> str:
+    text = (
+        f"🔧 *Job ID:* `{job['_id']}`\n"
+        f"📝 *Description:* {job.get('description', 'N/A')}\n"
+        f"🔄 *Status:* {job.get('status', 'Unknown')}\n"
+    )
+    slot = job.get("scheduled_time")
+    if slot:
+        text += f"📅 *Scheduled:* {slot.get('date')} {slot.get('start', '')}-{slot.get('end', '')}\n"
+    return text
+
+
+def get_my_jobs(serviceman_username: str, jobs: Optional[list] = None) -> str:
+    """List a serviceman's pending jobs (from the prefetched context when given)."""
+    if jobs is None:
+        jobs = fetch_job_context(serviceman_username)
     if not jobs:
         return "No pending jobs found."
-    return "\n".join([f"Job ID: {job['_id']}, Description: {job.get('description', 'N/A')}" for job in jobs])
+    return "\n".join(format_job(job) for job in jobs)
 
 
-def complete_job(job_id: str, serviceman_username: str) -> str:
+def complete_job(job_id: str, serviceman_username: str, jobs: Optional[list] = None) -> str:
     """Mark a job as completed. Works with string IDs (e.g., 'job1')."""
+    job_id = _resolve_job_id(job_id, jobs, serviceman_username)
     try:
-        result = requests_col.update_one(
-            {"_id": job_id, "assigned_to": serviceman_username},
-            {"$set": {"status": "Completed"}}
+        # Same fields as an admin completion, so the digest and dashboard show when
+        completed = get_requests_repo().update(
+            job_id,
+            query={"assigned_to": serviceman_username, "status": {"$ne": "Completed"}},
+            status="Completed",
+            completed_by=serviceman_username,
+            completed_at=datetime.utcnow()
         )
-        if result.modified_count == 0:
+        if not completed:
             return "Error: Job not found or already completed."
+        if jobs is not None:
+            # Later tool calls in the same message see the job as done
+            jobs[:] = [job for job in jobs if str(job["_id"]) != job_id]
         return f"Job {job_id} marked as completed."
     except Exception as e:
         return f"Error updating job: {str(e)}"
 
 
-def get_job_status(job_id: str) -> str:
+def get_job_status(job_id: str, jobs: Optional[list] = None,
+                   serviceman_username: Optional[str] = None) -> str:
     """Fetch the status of a specific job by ID."""
-    job = requests_col.find_one({"_id": job_id})
+    job_id = _resolve_job_id(job_id, jobs, serviceman_username)
+    job = next((j for j in jobs or () if str(j["_id"]) == job_id), None)
+    if job is None:
+        job = get_requests_col().find_one(id_filter(job_id), {"status": 1})
     if not job:
         return f"No job found with ID: {job_id}"
     return f"Job {job_id} status: {job.get('status', 'Unknown')}"
 
 
-def get_my_jobs(serviceman_username: str) -> str:
-    """List jobs with better formatting."""
-    jobs = list(requests_col.find({
-        "assigned_to": serviceman_username,
-        "status": {"$ne": "Completed"}
-    }))
-    if not jobs:
-        return "No pending jobs found."
+def reschedule_job(job_id: str, serviceman_username: str, date: str, start: str,
+                   end: Optional[str] = None, jobs: Optional[list] = None) -> str:
+    """Move one of the serviceman's jobs to a new date and time (YYYY-MM-DD, HH:MM)."""
+    job_id = _resolve_job_id(job_id, jobs, serviceman_username)
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d")
+        starts = datetime.strptime(start, "%H:%M")
+        ends = datetime.strptime(end, "%H:%M") if end else starts + timedelta(hours=1)
+    except (TypeError, ValueError):
+        return "Error: use a date like 2025-03-14 and times like 14:30."
+    if day.date() < datetime.now().date():
+        return "Error: cannot reschedule a job into the past."
+
+    slot = {"date": date, "start": starts.strftime("%H:%M"), "end": ends.strftime("%H:%M")}
+    result = get_requests_col().update_one(
+        {**id_filter(job_id), "assigned_to": serviceman_username,
+         "status": {"$ne": "Completed"}},
+        {"$set": {"scheduled_time": slot},
+         "$push": {"logs": {"action": "rescheduled", "by": serviceman_username,
+                            "timestamp": datetime.utcnow()}}}
+    )
+    if result.matched_count == 0:
+        return "Error: Job not found, not yours, or already completed."
+    for job in jobs or ():
+        if str(job["_id"]) == job_id:
+            job["scheduled_time"] = slot
+    return f"Job {job_id} rescheduled to {slot['date']} {slot['start']}-{slot['end']}."
+
+
+def _next_scheduled_job(serviceman_username: str):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return get_requests_col().find_one(
+        {"assigned_to": serviceman_username,
+         "status": {"$ne": "Completed"},
+         "scheduled_time.date": {"$gte": today}},
+        JOB_FIELDS,
+        sort=[("scheduled_time.date", 1), ("scheduled_time.start", 1)]
+    )
 
-    response = []
-    for job in jobs:
-        response.append(
-            f"🔧 *Job ID:* `{job['_id']}`\n"
-            f"📝 *Description:* {job.get('description', 'N/A')}\n"
-            f"🔄 *Status:* {job['status']}\n"
-        )
-    return "\n".join(response)
+
+def get_next_appointment(serviceman_username: str) -> str:
+    """Earliest upcoming scheduled visit for a serviceman."""
+    job = _next_scheduled_job(serviceman_username)
+    if not job:
+        return "No upcoming appointments scheduled."
+    slot = job["scheduled_time"]
+    return (
+        f"📅 *Next appointment:* {slot['date']} {slot.get('start', '')}-{slot.get('end', '')}\n"
+        f"🔧 *Job ID:* `{job['_id']}`\n"
+        f"📝 *Description:* {job.get('description', 'N/A')}\n"
+        f"📍 *Location:* {job.get('location', 'Not specified')}"
+    )
+
+
+def get_directions(serviceman_username: str, job_id: Optional[str] = None) -> str:
+    """Location and a maps link for a job (the next appointment if no ID is given)."""
+    if job_id:
+        job = get_requests_col().find_one(id_filter(job_id), {"location": 1})
+    else:
+        job = _next_scheduled_job(serviceman_username)
+    if not job:
+        return f"No job found with ID: {job_id}" if job_id else "No upcoming appointments scheduled."
+    location = job.get("location")
+    if not location:
+        return f"Job {job['_id']} has no location on record."
+    return (
+        f"📍 *Job {job['_id']}:* {location}\n"
+        f"https://www.google.com/maps/search/?api=1&query={quote_plus(location)}"
+    )
+
+
+# --- Tool Schemas (OpenAI tools API) ---
+
+TOOLS = [
+    {"type": "function", "function": {
+        "name": "list_jobs",
+        "description": "List the serviceman's pending jobs.",
+        "parameters": {"type": "object", "properties": {}}}},
+    {"type": "function", "function": {
+        "name": "complete_job",
+        "description": "Mark one of the serviceman's jobs as completed.",
+        "parameters": {"type": "object", "properties": {
+            "job_id": {"type": "string", "description": "Job ID from the job list"}},
+            "required": ["job_id"]}}},
+    {"type": "function", "function": {
+        "name": "job_status",
+        "description": "Get the current status of a job.",
+        "parameters": {"type": "object", "properties": {
+            "job_id": {"type": "string", "description": "Job ID from the job list"}},
+            "required": ["job_id"]}}},
+    {"type": "function", "function": {
+        "name": "reschedule_job",
+        "description": "Move one of the serviceman's jobs to a new date and time.",
+        "parameters": {"type": "object", "properties": {
+            "job_id": {"type": "string", "description": "Job ID from the job list"},
+            "date": {"type": "string", "description": "New date, YYYY-MM-DD"},
+            "start": {"type": "string", "description": "Start time, HH:MM (24h)"},
+            "end": {"type": "string", "description": "End time, HH:MM (24h), optional"}},
+            "required": ["job_id", "date", "start"]}}},
+]
+
+# Tool name -> handler(arguments, username, jobs); results are shown to the serviceman as-is
+TOOL_HANDLERS = {
+    "list_jobs": lambda args, user, jobs: get_my_jobs(user, jobs),
+    "complete_job": lambda args, user, jobs: complete_job(args["job_id"], user, jobs),
+    "job_status": lambda args, user, jobs: get_job_status(args["job_id"], jobs, user),
+    "reschedule_job": lambda args, user, jobs: reschedule_job(
+        args["job_id"], user, args["date"], args["start"], args.get("end"), jobs),
+}
 
 # --- Agent Logic ---
 
 
-def run_agent(user_input: str, serviceman_username: str = "ramu123") -> str:
-    # Lowercase input for case-insensitive matching
-    input_lower = user_input.lower()
+def agent_stats() -> dict:
+    """How messages were answered: routing sources and LLM answer cache"""
+    return {"router": get_router().stats(), "response_cache": RESPONSE_CACHE.stats(),
+            "tool_agent": dict(TOOL_AGENT_COUNTS)}
+
+
+def _llm_messages(user_input: str, serviceman_username: str) -> list:
+    return [
+        {"role": "system", "content": f"You are a serviceman assistant. Current user: {serviceman_username}. Use tools when asked about jobs."},
+        {"role": "user", "content": user_input}
+    ]
+
+
+def ask_llm(user_input: str, serviceman_username: str) -> str:
+    """Answer a general question with the NIM model."""
+    response = get_nim_client().chat.completions.create(
+        model=NIM_MODEL,
+        messages=_llm_messages(user_input, serviceman_username),
+        temperature=0.2,
+        stream=False
+    )
+    return response.choices[0].message.content
+
+
+def stream_llm(user_input: str, serviceman_username: str):
+    """Answer a general question, yielding text as the model produces it."""
+    stream = get_nim_client().chat.completions.create(
+        model=NIM_MODEL,
+        messages=_llm_messages(user_input, serviceman_username),
+        temperature=0.2,
+        stream=True
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+
+def _job_context_prompt(serviceman_username: str, jobs: list) -> str:
+    lines = []
+    for job in jobs:
+        slot = job.get("scheduled_time") or {}
+        when = f"{slot.get('date')} {slot.get('start', '')}" if slot else "not scheduled"
+        lines.append(f"- {job['_id']} | {job.get('status', 'Unknown')} | "
+                     f"{(job.get('description') or '')[:80]} | {job.get('location', '')} | {when}")
+    return (
+        f"You are a serviceman assistant. Current user: {serviceman_username}. "
+        f"Today is {datetime.now().strftime('%A %Y-%m-%d')}.\n"
+        f"Their open jobs (id | status | description | location | scheduled):\n"
+        + ("\n".join(lines) or "- none") +
+        "\nCall a tool for every action the user asks for, all in this one reply. "
+        "Answer questions about these jobs from the list above without tools."
+    )
+
+
+def _call_tool(call, serviceman_username: str, jobs: list) -> str:
+    name = call.function.name
+    handler = TOOL_HANDLERS.get(name)
+    try:
+        if handler is None:
+            raise KeyError(f"unknown tool {name}")
+        arguments = json.loads(call.function.arguments or "{}")
+        TOOL_AGENT_COUNTS[f"tool:{name}"] += 1
+        return handler(arguments, serviceman_username, jobs)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Bad tool call {name}({call.function.arguments}): {str(e)}")
+        return f"⚠️ Could not run {name}: {str(e)}"
+
+
+def run_tool_agent(user_input: str, serviceman_username: str) -> str:
+    """
+    Handle job requests with the OpenAI tools API, in one LLM round trip.
+
+    The serviceman's open jobs are fetched once and put in the prompt, so
+    the model can pick job IDs and answer questions about them directly.
+    It may request several tool calls at once; their results are written
+    for the serviceman, so they are returned without a second LLM call.
+    """
+    jobs = fetch_job_context(serviceman_username)
+    response = get_nim_client().chat.completions.create(
+        model=NIM_TOOL_MODEL,
+        messages=[
+            {"role": "system", "content": _job_context_prompt(serviceman_username, jobs)},
+            {"role": "user", "content": user_input}
+        ],
+        tools=TOOLS,
+        tool_choice="auto",
+        temperature=0.2
+    )
+    TOOL_AGENT_COUNTS["turns"] += 1
+    message = response.choices[0].message
+    if not message.tool_calls:
+        return message.content or "Sorry, I couldn't work that out. Try 'list my jobs'."
+    results = [_call_tool(call, serviceman_username, jobs) for call in message.tool_calls]
+    if message.content:
+        results.insert(0, message.content)
+    return "\n\n".join(results)
+
+
+def run_agent(user_input: str, serviceman_username: str = "ramu123", stream: bool = False):
+    """
+    Answer a serviceman's message.
+
+    Returns a string, except for open questions with stream=True, which
+    return an iterator of text chunks (the LLM request starts on first use).
+    """
+    # Common requests are answered locally; only open questions reach the LLM
+    route = get_router().route(user_input)
+    intent, job_id = route["intent"], route["job_id"]
+
+    if route["multi_step"] or intent == RESCHEDULE_JOB:
+        return run_tool_agent(user_input, serviceman_username)
 
-    if "my jobs" in input_lower or "list jobs" in input_lower:
+    elif intent == LIST_JOBS:
         return get_my_jobs(serviceman_username)
 
-    elif "complete" in input_lower:
-        # Extract job ID from input (e.g., "complete job 123")
-        words = user_input.split()
-        job_id = words[-1] if len(words) > 1 else None
+    elif intent == COMPLETE_JOB:
         if not job_id:
             return "Please specify a Job ID (e.g., 'complete job 123')."
+        # Only an explicit command completes a job; a model guess asks first
+        if route["source"] != "grammar":
+            return f"Do you want to mark job {job_id} as completed? Reply 'complete job {job_id}' to confirm."
         return complete_job(job_id, serviceman_username)
 
-    elif "status of job" in input_lower:
-        # Extract job ID from input
-        job_id = input_lower.split("status of job")[-1].strip()
-        return get_job_status(job_id)
+    elif intent == JOB_STATUS:
+        if not job_id:
+            return "Please specify a Job ID (e.g., 'status of job 123')."
+        return get_job_status(job_id, serviceman_username=serviceman_username)
 
-    else:
-        # General questions
-        response = nim_client.chat.completions.create(
-            model="mistralai/mistral-7b-instruct-v0.3",
-            messages=[
-                {"role": "system", "content": f"You are a serviceman assistant. Current user: {serviceman_username}. Use tools when asked about jobs."},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.2,
-            stream=False
-        )
-        return response.choices[0].message.content
+    elif intent == NEXT_APPOINTMENT:
+        return get_next_appointment(serviceman_username)
+
+    elif intent == DIRECTIONS:
+        return get_directions(serviceman_username, job_id)
+
+    # Questions about their own jobs, customers or day need the job context
+    if not is_cacheable_question(user_input):
+        return run_tool_agent(user_input, serviceman_username)
+
+    # General questions: reuse an earlier answer when someone asked the same thing
+    cached = RESPONSE_CACHE.get(user_input)
+    if cached is not None:
+        return cached
+
+    if stream:
+        return RESPONSE_CACHE.record_stream(user_input, stream_llm(user_input, serviceman_username))
+
+    started = time.perf_counter()
+    answer = ask_llm(user_input, serviceman_username)
+    RESPONSE_CACHE.put(user_input, answer, time.perf_counter() - started)
+    return answer
@@ -1,16 +1,20 @@
 import os
-from serviceman_agent import run_agent
-from pymongo import MongoClient
+import sys
 from dotenv import load_dotenv
 
+# Run from anywhere: the agent imports modules relative to the project root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_agents.serviceman_agent import run_agent
+from utils.mongo import get_db
+
 # Load environment variables
 load_dotenv()
 
 # --- Test Data Setup ---
 def setup_test_data():
     """Insert test jobs into MongoDB before running tests."""
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client["your_db_name"]
+    db = get_db()
     db.service_requests.delete_many({})  # Clear existing test data
     
     # Add test jobs for "ramu123"
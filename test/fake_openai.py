@@ -0,0 +1,116 @@
+"""
+Stand-in OpenAI-compatible chat completions server for tests.
+Replies with a fixed answer, either as one JSON body or as server-sent
+events one token at a time, with configurable time to first token and
+delay between tokens. Requests that offer tools get the scripted
+tool_calls instead, if any are set.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAI:
+    """In-process fake of a /v1/chat/completions endpoint"""
+
+    def __init__(self, answer="Turn off the mains before you start.", first_token_delay=0.0,
+                 token_delay=0.0):
+        self.answer = answer
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tool_calls = []  # (name, arguments dict) pairs
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def tokens(self):
+        """The answer split into word-sized pieces, spaces kept"""
+        words = self.answer.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _chunk(self, model, delta, finish_reason=None):
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _completion(self, model, tools=False):
+        message = {"role": "assistant", "content": self.answer}
+        finish_reason = "stop"
+        if tools and self.tool_calls:
+            message = {"role": "assistant", "content": None, "tool_calls": [
+                {"id": f"call_{i}", "type": "function",
+                 "function": {"name": name, "arguments": json.dumps(arguments)}}
+                for i, (name, arguments) in enumerate(self.tool_calls)]}
+            finish_reason = "tool_calls"
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": len(self.tokens()), "total_tokens": 1},
+        }
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests.append(body)
+                model = body.get("model", "fake")
+
+                if not body.get("stream"):
+                    time.sleep(fake.first_token_delay + fake.token_delay * len(fake.tokens()))
+                    data = json.dumps(fake._completion(model, bool(body.get("tools")))).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def event(payload):
+                    self.wfile.write(f"data: {payload}\n\n".encode())
+                    self.wfile.flush()
+
+                time.sleep(fake.first_token_delay)
+                event(json.dumps(fake._chunk(model, {"role": "assistant", "content": ""})))
+                for i, token in enumerate(fake.tokens()):
+                    if i:
+                        time.sleep(fake.token_delay)
+                    event(json.dumps(fake._chunk(model, {"content": token})))
+                event(json.dumps(fake._chunk(model, {}, "stop")))
+                event("[DONE]")
+                self.close_connection = True
+
+        return Handler
@@ -0,0 +1,137 @@
+"""
+Stand-in Telegram Bot API server for tests.
+Serves getUpdates from a queue, records every method call, and returns canned
+files for /file/ downloads.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegram:
+    """In-process fake of api.telegram.org"""
+
+    def __init__(self, token="TEST"):
+        self.token = token
+        self.calls = []
+        self.updates = []
+        self.files = {}
+        self.responses = {}
+        self._next_message_id = 1
+        self._lock = threading.Condition()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def push_update(self, update):
+        with self._lock:
+            self.updates.append(update)
+            self._lock.notify_all()
+
+    def calls_to(self, method):
+        with self._lock:
+            return [payload for name, payload in self.calls if name == method]
+
+    def wait_for_calls(self, method, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while len([c for c in self.calls if c[0] == method]) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def _dispatch(self, method, payload):
+        with self._lock:
+            self.calls.append((method, payload))
+            self._lock.notify_all()
+
+        if method in self.responses:
+            status, body = self.responses[method]
+            if callable(body):
+                body = body(payload)
+            return status, body
+
+        if method == "getUpdates":
+            offset = payload.get("offset", 0)
+            # Short long-poll so tests stay fast
+            deadline = time.monotonic() + min(payload.get("timeout", 0), 0.2)
+            with self._lock:
+                while True:
+                    pending = [u for u in self.updates if u["update_id"] >= offset]
+                    remaining = deadline - time.monotonic()
+                    if pending or remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+            return 200, {"ok": True, "result": pending}
+
+        if method in ("sendMessage", "editMessageText"):
+            with self._lock:
+                message_id = payload.get("message_id") or self._next_message_id
+                self._next_message_id += 1
+            return 200, {"ok": True, "result": {
+                "message_id": message_id,
+                "chat": {"id": payload.get("chat_id")},
+                "text": payload.get("text")
+            }}
+
+        if method == "getFile":
+            return 200, {"ok": True, "result": {
+                "file_id": payload.get("file_id"),
+                "file_path": f"photos/{payload.get('file_id')}.jpg"
+            }}
+
+        return 200, {"ok": True, "result": True}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, content_type="application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                prefix = f"/file/bot{fake.token}/"
+                if self.path.startswith(prefix):
+                    content = fake.files.get(self.path[len(prefix):])
+                    if content is None:
+                        return self._reply(404, {"ok": False})
+                    return self._reply(200, content, "application/octet-stream")
+                self._reply(404, {"ok": False})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                payload = json.loads(raw) if raw else {}
+                prefix = f"/bot{fake.token}/"
+                if not self.path.startswith(prefix):
+                    return self._reply(404, {"ok": False, "description": "Not Found"})
+                status, body = fake._dispatch(self.path[len(prefix):], payload)
+                self._reply(status, body)
+
+        return Handler
@@ -0,0 +1,156 @@
+import sys
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram
+from utils import telegram_api, image_processing
+from utils.telegram_api import TelegramAPI
+from utils.analysis_cache import AnalysisCache, dhash, fingerprint
+from utils.categories import CategoryIndex
+from utils.image_processing import ClipInferenceService, analyze_telegram_photo
+
+
+class CountingBackend:
+    name = "counting"
+
+    def __init__(self):
+        self.images = 0
+
+    def warm_up(self):
+        pass
+
+    def default_index(self):
+        n = len(image_processing.ISSUE_CATEGORIES)
+        return CategoryIndex(image_processing.ISSUE_CATEGORIES, ["Other"] * n, np.eye(n), 100)
+
+    def image_embeddings(self, images):
+        self.images += len(images)
+        embeds = np.zeros((len(images), len(image_processing.ISSUE_CATEGORIES)))
+        embeds[:, 0] = 1.0
+        return embeds
+
+
+def jpeg(img, quality):
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def sample_photo():
+    pixels = np.zeros((240, 320, 3), dtype=np.uint8)
+    pixels[:, :160] = (200, 40, 40)
+    pixels[60:180, 200:300] = (30, 90, 220)
+    return Image.fromarray(pixels)
+
+
+def test_dhash_survives_reencoding():
+    img = sample_photo()
+    high = Image.open(BytesIO(jpeg(img, 95)))
+    low = Image.open(BytesIO(jpeg(img, 60)))
+    assert dhash(high) == dhash(low)
+    assert dhash(high) != dhash(img.transpose(Image.FLIP_LEFT_RIGHT))
+
+
+def test_repeat_photos_skip_download_and_model():
+    fake = FakeTelegram().start()
+    fake.files["photos/a.jpg"] = jpeg(sample_photo(), 95)
+    fake.files["photos/b.jpg"] = jpeg(sample_photo(), 70)
+    previous = telegram_api.set_api(TelegramAPI(token=fake.token, base_url=fake.base_url))
+
+    backend = CountingBackend()
+    previous_service = image_processing._service
+    image_processing._service = service = ClipInferenceService(backend=backend, max_wait_ms=1)
+    cache = AnalysisCache()
+    api = telegram_api.get_api()
+    try:
+        first = analyze_telegram_photo(api.file_url("photos/a.jpg"), "uniq-a", cache)
+        # Same Telegram file again: served without a download
+        fake.files.pop("photos/a.jpg")
+        again = analyze_telegram_photo(api.file_url("photos/a.jpg"), "uniq-a", cache)
+        # Resent by another client, re-encoded: matched by content hash
+        resent = analyze_telegram_photo(api.file_url("photos/b.jpg"), "uniq-b", cache)
+    finally:
+        image_processing._service = previous_service
+        telegram_api.set_api(previous)
+        fake.stop()
+
+    assert first["success"] and "cached" not in first
+    assert again["cached"] and again["issue_type"] == first["issue_type"]
+    assert resent["cached"]
+    assert backend.images == 1
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2 and stats["misses"] == 3
+    assert cache.get([f"{service.model_tag()}|file:uniq-b"])["issue_type"] == first["issue_type"]
+
+
+def test_rebuilt_category_index_misses_old_results():
+    fake = FakeTelegram().start()
+    fake.files["photos/a.jpg"] = jpeg(sample_photo(), 95)
+    previous = telegram_api.set_api(TelegramAPI(token=fake.token, base_url=fake.base_url))
+
+    backend = CountingBackend()
+    index = backend.default_index()
+    previous_service = image_processing._service
+    cache = AnalysisCache()
+    url = telegram_api.get_api().file_url("photos/a.jpg")
+    try:
+        for version in ("v1", "v1", "v2"):
+            image_processing._service = ClipInferenceService(
+                backend=backend, max_wait_ms=1, index=CategoryIndex(
+                    index.names, index.services, index.matrix, index.logit_scale, version))
+            analyze_telegram_photo(url, "uniq-a", cache)
+    finally:
+        image_processing._service = previous_service
+        telegram_api.set_api(previous)
+        fake.stop()
+
+    # The second call hit; the rebuilt index classified the photo again
+    assert backend.images == 2
+
+
+def test_flat_photos_sharing_a_dhash_are_not_reused():
+    wall = Image.new("RGB", (320, 240), (200, 200, 190))
+    pipe = Image.new("RGB", (320, 240), (30, 30, 35))
+    assert dhash(wall) == dhash(pipe)
+
+    fake = FakeTelegram().start()
+    fake.files["photos/wall.jpg"] = jpeg(wall, 90)
+    fake.files["photos/pipe.jpg"] = jpeg(pipe, 90)
+    previous = telegram_api.set_api(TelegramAPI(token=fake.token, base_url=fake.base_url))
+
+    backend = CountingBackend()
+    previous_service = image_processing._service
+    image_processing._service = ClipInferenceService(backend=backend, max_wait_ms=1)
+    cache = AnalysisCache()
+    api = telegram_api.get_api()
+    try:
+        analyze_telegram_photo(api.file_url("photos/wall.jpg"), "uniq-wall", cache)
+        pipe_result = analyze_telegram_photo(api.file_url("photos/pipe.jpg"), "uniq-pipe", cache)
+    finally:
+        image_processing._service = previous_service
+        telegram_api.set_api(previous)
+        fake.stop()
+
+    # Classified on its own instead of inheriting the wall's label and embedding
+    assert "cached" not in pipe_result and backend.images == 2
+
+
+def test_store_hits_need_a_matching_fingerprint():
+    import mongomock
+    col = mongomock.MongoClient().db.photo_analysis_cache
+    wall = Image.new("RGB", (64, 64), (200, 200, 190))
+    # As put() stores it; mongomock can't run pymongo's bulk UpdateOne
+    col.insert_one({"_id": "m|dhash:0", "result": {"issue_type": "Painting"},
+                    "fingerprint": fingerprint(wall)})
+
+    cache = AnalysisCache(col)
+    assert cache.get(["m|dhash:0"], fingerprint(Image.new("RGB", (64, 64), (30, 30, 35)))) is None
+    assert cache.get(["m|dhash:0"], fingerprint(wall))["issue_type"] == "Painting"
@@ -0,0 +1,108 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram
+from utils import telegram_api
+from utils.telegram_api import TelegramAPI
+from utils.async_runtime import AsyncBotRuntime, AsyncTelegramAPI
+
+
+def make_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": text}
+    }
+
+
+def test_sync_client_reuses_session():
+    fake = FakeTelegram().start()
+    fake.files["photos/a.jpg"] = b"jpegbytes"
+    try:
+        api = TelegramAPI(token=fake.token, base_url=fake.base_url)
+        result = api.call("sendMessage", {"chat_id": 1, "text": "hello"})
+        assert result["ok"]
+        assert api.download(api.file_url("photos/a.jpg")) == b"jpegbytes"
+        assert fake.calls_to("sendMessage") == [{"chat_id": 1, "text": "hello"}]
+    finally:
+        fake.stop()
+
+
+def test_async_runtime_routes_sends_through_shared_client():
+    fake = FakeTelegram().start()
+    replies = {}
+    lock = threading.Lock()
+
+    def handler(update):
+        message = update["message"]
+        # Handlers stay synchronous and use the process-wide client
+        result = telegram_api.get_api().call(
+            "sendMessage", {"chat_id": message["chat"]["id"], "text": message["text"]})
+        assert result["ok"]
+        with lock:
+            replies.setdefault(message["chat"]["id"], []).append(message["text"])
+
+    for i in range(1, 10):
+        fake.push_update(make_update(i, i % 3, f"msg{i}"))
+
+    async def scenario():
+        api = AsyncTelegramAPI(token=fake.token, base_url=fake.base_url)
+        runtime = AsyncBotRuntime(handler, api=api, workers=3, poll_timeout=1)
+        task = asyncio.create_task(runtime.run())
+        await asyncio.get_running_loop().run_in_executor(
+            None, fake.wait_for_calls, "sendMessage", 9)
+        runtime.stop()
+        await task
+        return runtime
+
+    previous = telegram_api.get_api()
+    try:
+        runtime = asyncio.run(scenario())
+    finally:
+        fake.stop()
+
+    assert telegram_api.get_api() is previous
+    assert runtime.offset == 9
+    for chat_id in range(3):
+        expected = [f"msg{i}" for i in range(1, 10) if i % 3 == chat_id]
+        assert replies[chat_id] == expected
+
+
+class RefusingAPI:
+    """getUpdates answered like a revoked token"""
+
+    def __init__(self, runtime_stop, calls):
+        self.stop = runtime_stop
+        self.times = []
+        self.calls = calls
+
+    async def call(self, method, payload=None, timeout=10):
+        self.times.append(time.monotonic())
+        if len(self.times) == self.calls:
+            self.stop()
+        return {"ok": False, "error_code": 401, "description": "Unauthorized"}
+
+    async def aclose(self):
+        pass
+
+
+def test_async_poller_backs_off_when_refused(monkeypatch):
+    monkeypatch.setattr(telegram_api, "POLL_BACKOFF", 0.02)
+    monkeypatch.setattr(telegram_api, "POLL_BACKOFF_MAX", 0.16)
+
+    runtime = AsyncBotRuntime(lambda update: None, workers=1, poll_timeout=0)
+    api = runtime.api = RefusingAPI(runtime.stop, calls=5)
+    previous = telegram_api.get_api()
+    asyncio.run(runtime.run())
+
+    assert telegram_api.get_api() is previous
+    gaps = [b - a for a, b in zip(api.times, api.times[1:])]
+    caps = [0.02, 0.04, 0.08, 0.16]
+    assert len(gaps) == len(caps)
+    assert all(gap >= cap / 2 for gap, cap in zip(gaps, caps))
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cache import TTLCache, DedupCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_keeps_recent_keys():
+    cache = TTLCache(max_entries=3, ttl=60)
+    for key in "abc":
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"  # a becomes most recently used
+    cache.set("d", "D")
+
+    assert "b" not in cache
+    assert [cache.get(k) for k in "acd"] == ["A", "C", "D"]
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size"] == 3
+
+
+def test_entries_expire():
+    clock = Clock()
+    cache = TTLCache(max_entries=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=20)
+    clock.now = 6
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["expirations"] == 1
+
+
+def test_dedup_has_no_burst_after_eviction():
+    dedup = DedupCache(max_entries=100, ttl=60)
+    for i in range(1000):
+        assert dedup.add(i)
+    # The most recent keys are still remembered after many evictions
+    assert all(not dedup.add(i) for i in range(900, 1000))
+    assert len(dedup) == 100
+
+    stats = dedup.stats()
+    assert stats["misses"] == 1000
+    assert stats["hits"] == 100
+    assert stats["evictions"] == 900
+
+    dedup.discard(999)
+    assert dedup.add(999)
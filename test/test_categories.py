@@ -0,0 +1,71 @@
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.categories import (
+    CategoryIndex, IndexSource, DEFAULT_CATEGORIES, registry_version, ensemble
+)
+
+
+def fake_encoder(prompts):
+    """Deterministic unit vectors per prompt"""
+    rows = []
+    for prompt in prompts:
+        rng = np.random.default_rng(sum(map(ord, prompt)))
+        v = rng.normal(size=256)
+        rows.append(v / np.linalg.norm(v))
+    return np.array(rows)
+
+
+def test_index_ensembles_prompts_and_round_trips():
+    index = CategoryIndex.build(DEFAULT_CATEGORIES, fake_encoder, logit_scale=100)
+    assert index.matrix.shape == (len(DEFAULT_CATEGORIES), 256)
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1, atol=1e-5)
+    assert index.version == registry_version(DEFAULT_CATEGORIES)
+
+    # An image matching one prompt of "electrical" scores highest there
+    image = fake_encoder(["a damaged power socket or switch board"])
+    assert index.names[index.probabilities(image).argmax()] == "electrical wiring problem"
+
+    restored = CategoryIndex.from_document(index.to_document())
+    assert restored.names == index.names and restored.services == index.services
+    assert np.abs(restored.matrix - index.matrix).max() < 1e-3  # stored as float16
+
+
+def test_ensemble_is_normalized_mean():
+    embeds = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+    matrix = ensemble(embeds, np.array([0, 0, 1]), 2)
+    assert np.allclose(matrix, [[0.7071, 0.7071], [1.0, 0.0]], atol=1e-4)
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.index = None
+        self.loads = 0
+
+    def index_version(self):
+        return self.index.version if self.index else None
+
+    def load_index(self):
+        self.loads += 1
+        return self.index
+
+
+def test_index_source_picks_up_rebuilds():
+    now = [0.0]
+    registry = FakeRegistry()
+    fallback = CategoryIndex(["a"], ["Other"], np.eye(1), 1, version="builtin")
+    source = IndexSource(registry, lambda: fallback, refresh=60, clock=lambda: now[0])
+
+    assert source() is fallback
+    registry.index = CategoryIndex(["a", "b"], ["Other"] * 2, np.eye(2), 1, version="v1")
+    assert source() is fallback  # not rechecked yet
+
+    now[0] = 61
+    assert source().version == "v1"
+    now[0] = 122
+    assert source().version == "v1" and registry.loads == 1  # unchanged version: no reload
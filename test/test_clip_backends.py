@@ -0,0 +1,119 @@
+import sys
+import os
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.clip_onnx import preprocess, OnnxClipBackend, IMAGE_SIZE, ONNX_DIR, VISION_FILE
+from utils.categories import CategoryIndex
+from utils.image_processing import ClipInferenceService, ISSUE_CATEGORIES
+
+
+def one_hot_index():
+    """Category i matches embedding e_i"""
+    n = len(ISSUE_CATEGORIES)
+    return CategoryIndex(ISSUE_CATEGORIES, ["Other"] * n, np.eye(n), logit_scale=100)
+
+
+class FixedBackend:
+    """Embeds every image as the category given by its red channel"""
+
+    name = "fixed"
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def warm_up(self):
+        pass
+
+    def default_index(self):
+        return one_hot_index()
+
+    def image_embeddings(self, images):
+        self.batch_sizes.append(len(images))
+        embeds = np.zeros((len(images), len(ISSUE_CATEGORIES)))
+        for row, img in zip(embeds, images):
+            row[img.getpixel((0, 0))[0] % len(ISSUE_CATEGORIES)] = 1.0
+        return embeds
+
+
+def test_batcher_groups_requests():
+    backend = FixedBackend()
+    service = ClipInferenceService(backend=backend, max_batch=4, max_wait_ms=200)
+    futures = [service.classify(Image.new("RGB", (8, 8), (i, 0, 0))) for i in range(6)]
+
+    results = [f.result(timeout=5) for f in futures]
+    assert [r[0] for r in results] == [ISSUE_CATEGORIES[i] for i in range(6)]
+    assert results[0][1] > 99
+    assert sum(backend.batch_sizes) == 6 and max(backend.batch_sizes) > 1
+
+    stats = service.stats()
+    assert stats["images"] == 6 and stats["latency"]["count"] == 6
+
+
+def test_full_batch_runs_without_waiting():
+    backend = FixedBackend()
+    service = ClipInferenceService(backend=backend, max_batch=3, max_wait_ms=10000)
+    started = time.monotonic()
+    futures = [service.classify(Image.new("RGB", (8, 8), (i, 0, 0))) for i in range(3)]
+
+    assert [f.result(timeout=5)[0] for f in futures] == ISSUE_CATEGORIES[:3]
+    assert time.monotonic() - started < 5
+    assert backend.batch_sizes == [3]
+
+
+def test_partial_batch_runs_when_window_closes():
+    backend = FixedBackend()
+    service = ClipInferenceService(backend=backend, max_batch=8, max_wait_ms=100)
+    started = time.monotonic()
+    futures = [service.classify(Image.new("RGB", (8, 8), (i, 0, 0))) for i in range(2)]
+
+    assert [f.result(timeout=5)[0] for f in futures] == ISSUE_CATEGORIES[:2]
+    assert time.monotonic() - started >= 0.09
+    assert backend.batch_sizes == [2]
+    stats = service.stats()
+    assert (stats["batches"], stats["mean_batch_size"], stats["queued"]) == (1, 2, 0)
+
+
+def test_onnx_backend_name_tells_int8_apart():
+    # Names key cached analyses, so the two graphs must not share one
+    assert OnnxClipBackend().name == "onnx"
+    assert OnnxClipBackend(quantized=True).name == "onnx-int8"
+
+
+def test_preprocess_matches_clip_processor():
+    img = Image.fromarray(
+        np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8))
+    batch = preprocess([img, img.rotate(90, expand=True)])
+    assert batch.shape == (2, 3, IMAGE_SIZE, IMAGE_SIZE) and batch.dtype == np.float32
+
+    transformers = pytest.importorskip("transformers")
+    processor = transformers.CLIPImageProcessor()
+    expected = processor(images=[img], return_tensors="np")["pixel_values"]
+    # Resampling implementations differ slightly at the edges
+    assert np.abs(batch[:1] - expected).mean() < 0.02
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(ONNX_DIR, VISION_FILE)),
+                    reason="no ONNX export (python -m utils.clip_onnx export)")
+def test_onnx_matches_torch():
+    pytest.importorskip("torch")
+    pytest.importorskip("onnxruntime")
+    from benchmarks.clip_backends import fixture_images
+    from utils.image_processing import create_backend
+
+    images = fixture_images(8)
+    torch_backend = create_backend("torch")
+    index = torch_backend.default_index()
+    reference = index.probabilities(torch_backend.image_embeddings(images))
+    for name in ("onnx", "onnx-int8"):
+        if name == "onnx-int8" and not os.path.exists(os.path.join(ONNX_DIR, "vision.int8.onnx")):
+            continue
+        probs = index.probabilities(create_backend(name).image_embeddings(images))
+        assert (probs.argmax(-1) == reference.argmax(-1)).mean() >= 0.75
+        assert np.abs(probs - reference).max() < (0.05 if name == "onnx" else 0.25)
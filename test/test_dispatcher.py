@@ -0,0 +1,86 @@
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dispatcher import UpdateDispatcher, update_chat_id
+
+
+def make_update(update_id, chat_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": text}
+    }
+
+
+def test_update_chat_id():
+    assert update_chat_id(make_update(1, 42)) == 42
+    callback = {"callback_query": {"id": "x", "message": {"chat": {"id": 7}}}}
+    assert update_chat_id(callback) == 7
+    assert update_chat_id({"update_id": 3}) is None
+
+
+def test_preserves_per_chat_order():
+    seen = {}
+    lock = threading.Lock()
+
+    def handler(update):
+        chat_id = update_chat_id(update)
+        time.sleep(0.001)
+        with lock:
+            seen.setdefault(chat_id, []).append(update["update_id"])
+
+    dispatcher = UpdateDispatcher(handler, workers=4, max_queue=50).start()
+    expected = {}
+    for i in range(200):
+        chat_id = i % 5
+        expected.setdefault(chat_id, []).append(i)
+        dispatcher.submit(make_update(i, chat_id))
+
+    assert dispatcher.join(timeout=10)
+    dispatcher.stop()
+    assert seen == expected
+    assert dispatcher.stats()["processed"] == 200
+
+
+def test_slow_chat_does_not_block_others():
+    release = threading.Event()
+    fast_done = threading.Event()
+
+    def handler(update):
+        if update_chat_id(update) == 1:
+            release.wait(5)
+        else:
+            fast_done.set()
+
+    dispatcher = UpdateDispatcher(handler, workers=2, max_queue=10).start()
+    dispatcher.submit(make_update(1, 1))
+    dispatcher.submit(make_update(2, 2))
+
+    assert fast_done.wait(2)
+    release.set()
+    dispatcher.stop(timeout=5)
+
+
+def test_bounded_queue_and_failures():
+    gate = threading.Event()
+
+    def handler(update):
+        gate.wait(5)
+        if update["update_id"] == 2:
+            raise RuntimeError("boom")
+
+    dispatcher = UpdateDispatcher(handler, workers=1, max_queue=2).start()
+    assert dispatcher.submit(make_update(1, 1))
+    assert dispatcher.submit(make_update(2, 1))
+    assert not dispatcher.submit(make_update(3, 1), block=False)
+
+    gate.set()
+    assert dispatcher.join(timeout=5)
+    dispatcher.stop()
+    stats = dispatcher.stats()
+    assert stats["processed"] == 1
+    assert stats["failed"] == 1
@@ -0,0 +1,58 @@
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.duplicates import (
+    DuplicateIndex, location_key, request_time, encode_embedding, decode_embedding
+)
+
+HOUR = 3600
+
+
+def unit(seed, dim=64):
+    v = np.random.default_rng(seed).normal(size=dim)
+    return v / np.linalg.norm(v)
+
+
+def test_scoped_by_location_and_window():
+    index = DuplicateIndex(dim=64, threshold=0.9, window_hours=2)
+    pipe = unit(1)
+    index.add("r1", "Block B, Flat 4", 0, pipe)
+    index.add("r2", "Block C", 0, pipe)
+    index.add("r3", "block b flat 4", 0, unit(2))
+
+    # Same photo, same place, 30 minutes later
+    noisy = pipe + 0.05 * unit(3)
+    assert [m[0] for m in index.search("BLOCK B flat 4", 0.5 * HOUR, noisy)] == ["r1"]
+    # Too late, or a different place
+    assert index.search("block b flat 4", 3 * HOUR, noisy) == []
+    assert index.search("Block D", 0.5 * HOUR, noisy) == []
+    # A request never matches itself
+    assert index.search("Block C", 0, pipe, exclude="r2") == []
+
+
+def test_prune_and_snapshot(tmp_path):
+    index = DuplicateIndex(dim=64, window_hours=1)
+    for i in range(40):
+        index.add(f"r{i}", f"block {i % 3}", i * 600, unit(i))
+    assert index.prune(now=40 * 600) == 34
+    assert len(index) == 6
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    restored = DuplicateIndex.load(path, window_hours=1)
+    assert len(restored) == 6
+    assert restored.search("block 0", 39 * 600, unit(39))[0][0] == "r39"
+
+
+def test_helpers():
+    assert location_key("  Tower-A / 12B ") == "tower a 12b"
+    assert request_time("1970-01-01 01:00:00") == HOUR
+    # Parsed by the same helper as ServiceRequest times, ISO strings included
+    assert request_time("1970-01-01T01:00:00.250000") == HOUR
+    v = unit(5)
+    assert np.abs(decode_embedding(encode_embedding(v)) - v).max() < 1e-3
@@ -0,0 +1,58 @@
+import sys
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram
+from utils import telegram_api
+from utils.telegram_api import TelegramAPI, DownloadTooLarge
+from utils.image_processing import download_photo, decode_image
+
+
+def camera_jpeg(size=(4000, 3000)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (120, 80, 40)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fake_api():
+    fake = FakeTelegram().start()
+    previous = telegram_api.set_api(TelegramAPI(token=fake.token, base_url=fake.base_url))
+    yield fake
+    telegram_api.set_api(previous)
+    fake.stop()
+
+
+def test_download_reuses_buffer_and_enforces_cap(fake_api):
+    fake_api.files["photos/big.jpg"] = camera_jpeg()
+    fake_api.files["photos/small.jpg"] = camera_jpeg((640, 480))
+    api = telegram_api.get_api()
+
+    first = download_photo(api.file_url("photos/big.jpg"))
+    assert bytes(first) == fake_api.files["photos/big.jpg"]
+    buffer = first.obj
+    first.release()
+
+    second = download_photo(api.file_url("photos/small.jpg"))
+    assert second.obj is buffer
+    assert bytes(second) == fake_api.files["photos/small.jpg"]
+    second.release()
+
+    with pytest.raises(DownloadTooLarge):
+        download_photo(api.file_url("photos/big.jpg"), max_bytes=1024)
+
+
+def test_jpeg_is_decoded_near_model_size():
+    data = camera_jpeg()
+    img = decode_image(memoryview(data))
+    assert img.mode == "RGB"
+    # 4000x3000 / 8: the smallest DCT scale still covering 224x224
+    assert img.size == (500, 375)
+    assert decode_image(memoryview(data), size=None).size == (4000, 3000)
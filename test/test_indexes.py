@@ -0,0 +1,125 @@
+import sys
+import os
+
+import mongomock
+from pymongo import IndexModel
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import indexes
+
+SPECS = {"users": [IndexModel([("username", 1)], unique=True),
+                   IndexModel([("telegram_id", 1)], unique=True, sparse=True)]}
+
+
+def test_sync_creates_rebuilds_drops_and_is_idempotent():
+    db = mongomock.MongoClient().db
+    users = db["users"]
+    # What utils/db.py used to create: telegram_id without sparse, plus a stray index
+    users.create_index("telegram_id", unique=True)
+    users.create_index("status")
+
+    plan = indexes.sync_indexes(db, SPECS)["users"]
+    assert [m.document["name"] for m in plan["create"]] == ["username_1"]
+    assert [m.document["name"] for m in plan["rebuild"]] == ["telegram_id_1"]
+    assert plan["drop"] == ["status_1"]
+
+    info = users.index_information()
+    assert sorted(info) == ["_id_", "telegram_id_1", "username_1"]
+    assert info["telegram_id_1"].get("sparse") is True
+
+    again = indexes.sync_indexes(db, SPECS)["users"]
+    assert again == {"create": [], "rebuild": [], "drop": [],
+                     "unchanged": ["username_1", "telegram_id_1"]}
+
+
+def test_startup_sync_only_adds_missing_indexes():
+    db = mongomock.MongoClient().db
+    db["users"].create_index("telegram_id", unique=True)
+    db["users"].create_index("status")
+
+    plan = indexes.sync_indexes(db, SPECS, prune=False, rebuild=False)["users"]
+    assert [m.document["name"] for m in plan["create"]] == ["username_1"]
+    assert sorted(db["users"].index_information()) == [
+        "_id_", "status_1", "telegram_id_1", "username_1"]
+
+
+def test_plan_stages_reads_winning_plan_only():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "SORT", "inputStage": {
+            "stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1"}}},
+        "rejectedPlans": [{"stage": "COLLSCAN"}],
+    }}
+    assert indexes.plan_stages(explain) == ["SORT", "FETCH", "IXSCAN"]
+
+    # Aggregations nest the find plan under $cursor
+    aggregate = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}}]}
+    assert indexes.plan_stages(aggregate) == ["COLLSCAN"]
+
+
+def test_every_query_shape_collection_has_a_spec():
+    for shape in indexes.QUERY_SHAPES:
+        assert shape["collection"] in indexes.INDEX_SPECS, shape["name"]
+
+
+def test_ttl_of_zero_is_an_index_option():
+    db = mongomock.MongoClient().db
+    db["bot_state"].create_index("expires_at")
+    specs = {"bot_state": [IndexModel([("expires_at", 1)], expireAfterSeconds=0)]}
+
+    plan = indexes.sync_indexes(db, specs)["bot_state"]
+    assert [m.document["name"] for m in plan["rebuild"]] == ["expires_at_1"]
+    assert db["bot_state"].index_information()["expires_at_1"]["expireAfterSeconds"] == 0
+
+
+class CannedExplainDB:
+    """Answers explain() for find shapes from a {collection: explain} table"""
+
+    def __init__(self, plans):
+        self.plans = plans
+
+    def __getitem__(self, name):
+        db = self
+
+        class Cursor:
+            def sort(self, keys):
+                return self
+
+            def explain(self):
+                return db.plans[name]
+
+        class Collection:
+            def find(self, filter):
+                return Cursor()
+        return Collection()
+
+
+def winning(plan):
+    return {"queryPlanner": {"winningPlan": plan, "rejectedPlans": [{"stage": "COLLSCAN"}]}}
+
+
+def test_verify_flags_collection_scans_and_in_memory_sorts():
+    ixscan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "host_1_date_-1"}}
+    db = CannedExplainDB({
+        "indexed": winning({"stage": "LIMIT", "inputStage": ixscan}),
+        "sorted_in_memory": winning({"stage": "SORT", "inputStage": ixscan}),
+        "scanned": winning({"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}),
+        "unexplained": {"ok": 1},
+    })
+    shapes = [{"name": name, "collection": name, "filter": {}, "sort": [("date", -1)]}
+              for name in db.plans]
+
+    assert indexes.verify_query_shapes(db, shapes) == [
+        ("sorted_in_memory", ["SORT"], ["SORT", "FETCH", "IXSCAN"]),
+        ("scanned", ["COLLSCAN", "SORT"], ["SORT", "COLLSCAN"]),
+        ("unexplained", ["COLLSCAN"], []),
+    ]
+
+
+def test_no_shape_relies_on_a_negation_alone():
+    for shape in indexes.QUERY_SHAPES:
+        clauses = shape.get("filter") or {}
+        if clauses and all(isinstance(v, dict) and set(v) <= {"$ne", "$nin", "$exists"}
+                           for v in clauses.values()):
+            raise AssertionError(f"{shape['name']} cannot use an index selectively")
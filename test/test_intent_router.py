@@ -0,0 +1,88 @@
+import sys
+import os
+import json
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_agents import intent_router, serviceman_agent
+from service_agents.intent_router import (
+    IntentRouter, extract_job_id, load_logged_examples,
+    LIST_JOBS, COMPLETE_JOB, JOB_STATUS, NEXT_APPOINTMENT, DIRECTIONS, OPEN
+)
+
+
+def test_grammar_and_model_routes():
+    router = IntentRouter()
+    assert router.route("List my jobs")["source"] == "grammar"
+    assert router.route("Complete job job1")["job_id"] == "job1"
+
+    # Phrasings only the model knows, including a typo
+    routed = router.route("anythng on my plate?")
+    assert (routed["intent"], routed["source"]) == (LIST_JOBS, "model")
+    assert router.route("has 77 been assigned yet")["intent"] == JOB_STATUS
+    assert router.route("How do I fix a pipe?")["intent"] == OPEN
+    assert router.stats()["messages"] == 5
+
+
+def test_extract_job_id():
+    assert extract_job_id("done 65f1c2ab9d3e4f0012a7b8c9") == "65f1c2ab9d3e4f0012a7b8c9"
+    assert extract_job_id("any update on #a7b8c9?") == "a7b8c9"
+    assert extract_job_id("job 42 is done") == "42"
+    assert extract_job_id("Complete job invalid_id") == "invalid_id"
+    assert extract_job_id("next appointment") is None
+
+
+def test_log_feeds_training(tmp_path):
+    path = str(tmp_path / "messages.jsonl")
+    router = IntentRouter(log_path=path)
+    router.route("show my open jobs")
+    router.route("what's cooking")
+    with open(path, "a") as f:
+        f.write(json.dumps({"text": "any gigs", "label": LIST_JOBS}) + "\n")
+
+    # Grammar routes and explicit labels are reused; unlabelled LLM traffic is not
+    assert load_logged_examples(path) == [(LIST_JOBS, "show my open jobs"), (LIST_JOBS, "any gigs")]
+
+
+def test_run_agent_answers_locally(monkeypatch):
+    monkeypatch.setattr(intent_router, "_router", IntentRouter())
+    calls = []
+    monkeypatch.setattr(serviceman_agent, "get_my_jobs", lambda user: calls.append(LIST_JOBS) or "jobs")
+    monkeypatch.setattr(serviceman_agent, "complete_job", lambda job, user: calls.append((COMPLETE_JOB, job)) or "ok")
+    monkeypatch.setattr(serviceman_agent, "get_next_appointment", lambda user: calls.append(NEXT_APPOINTMENT) or "soon")
+    monkeypatch.setattr(serviceman_agent, "get_directions", lambda user, job: calls.append((DIRECTIONS, job)) or "map")
+
+    def no_llm():
+        raise AssertionError("LLM called")
+    monkeypatch.setattr(serviceman_agent, "get_nim_client", no_llm)
+
+    for text in ("what jobs do i have", "finished job 9", "when's my next visit", "directions to job 9"):
+        serviceman_agent.run_agent(text, "ramu123")
+    assert calls == [LIST_JOBS, (COMPLETE_JOB, "9"), NEXT_APPOINTMENT, (DIRECTIONS, "9")]
+    assert "Job ID" in serviceman_agent.run_agent("complete", "ramu123")
+
+
+def test_only_explicit_commands_complete_jobs(monkeypatch):
+    router = IntentRouter()
+    monkeypatch.setattr(intent_router, "_router", router)
+
+    def no_write(job, user):
+        raise AssertionError(f"complete_job called for {job}")
+    monkeypatch.setattr(serviceman_agent, "complete_job", no_write)
+    monkeypatch.setattr(serviceman_agent, "get_job_status", lambda job, **kwargs: "status")
+    monkeypatch.setattr(serviceman_agent, "run_tool_agent", lambda text, user: "llm")
+    monkeypatch.setattr(serviceman_agent, "ask_llm", lambda text, user: "llm")
+
+    questions = ["is job 123 done?", "has job 123 been completed yet?", "was 123 finished",
+                 "can you check whether 123 is finished", "close the gate code for 123 is 4411"]
+    for text in questions:
+        intent, _, source = router.classify(text)
+        assert (intent, source) != (COMPLETE_JOB, "grammar"), text
+        serviceman_agent.run_agent(text, "ramu123")
+    assert router.route("is job 123 done?")["intent"] == JOB_STATUS
+
+    # A paraphrase the model reads as a completion is confirmed first
+    routed = router.route("work on 123 completed")
+    assert (routed["intent"], routed["source"]) == (COMPLETE_JOB, "model")
+    assert "complete job 123" in serviceman_agent.run_agent("work on 123 completed", "ramu123")
@@ -0,0 +1,76 @@
+import sys
+import os
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import mongo
+
+URI = "mongodb://localhost:1/?connectTimeoutMS=100"
+
+
+def test_one_pooled_client_per_process(monkeypatch):
+    monkeypatch.setattr(mongo, "_clients", {})
+    client = mongo.get_client(URI)
+    try:
+        assert mongo.get_client(URI) is client
+        pool = client.options.pool_options
+        assert pool.max_pool_size == mongo.MAX_POOL_SIZE
+        assert pool.max_idle_time_seconds == mongo.MAX_IDLE_MS / 1000
+        assert mongo.get_db(uri=URI).name == mongo.DB_NAME
+
+        # A forked child must not reuse the parent's sockets
+        monkeypatch.setattr(mongo, "_clients_pid", -1)
+        assert mongo.get_client(URI) is not client
+    finally:
+        client.close()
+        mongo.close_clients()
+
+
+def test_pool_metrics_record_checkout_waits():
+    metrics = mongo.PoolMetrics()
+    metrics.connection_created(None)
+    metrics.connection_checked_out(SimpleNamespace(duration=0.004))
+    metrics.connection_checked_out(SimpleNamespace(duration=0.010))
+    metrics.connection_check_out_failed(None)
+    stats = metrics.stats()
+    assert stats["connections_open"] == 1 and stats["checkout_failures"] == 1
+    assert stats["checkout_wait"]["count"] == 2 and stats["checkout_wait"]["p99_ms"] == 10.0
+
+
+def test_connect_retries_with_backoff_then_gives_up(monkeypatch):
+    monkeypatch.setattr(mongo, "_clients", {})
+    monkeypatch.setattr(mongo, "SERVER_SELECTION_TIMEOUT_MS", 50)
+    monkeypatch.setattr(mongo.random, "uniform", lambda low, high: high)
+    delays = []
+    uri = "mongodb://localhost:1/"
+    try:
+        assert not mongo.connect(uri, retries=3, backoff=0.5, max_backoff=1.5,
+                                 sleep=delays.append)
+        assert delays == [0.5, 1.0, 1.5]
+    finally:
+        mongo.close_clients()
+
+
+def test_connect_pings_once_per_uri(monkeypatch):
+    pings = []
+
+    class Admin:
+        def command(self, name):
+            pings.append(name)
+
+    monkeypatch.setattr(mongo, "get_client", lambda uri=None: SimpleNamespace(admin=Admin()))
+    monkeypatch.setattr(mongo, "_connected", set())
+    assert mongo.connect("mongodb://db.example") and mongo.connect("mongodb://db.example")
+    assert pings == ["ping"]
+
+
+def test_health_check_reports_unreachable_server(monkeypatch):
+    monkeypatch.setattr(mongo, "_clients", {})
+    try:
+        health = mongo.health_check(URI, timeout=0.2)
+        assert health["ok"] is False and health["error"]
+        assert health["latency_ms"] < 2000 and "checkout_wait" in health["pool"]
+    finally:
+        mongo.close_clients()
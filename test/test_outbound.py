@@ -0,0 +1,155 @@
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from utils.outbound import (
+    OutboundQueue, OutboundError, TokenBucket,
+    PRIORITY_NOTIFICATION, PRIORITY_CHATTER
+)
+
+
+class ScriptedAPI:
+    """Records calls and replies from a per-text script of responses"""
+
+    def __init__(self, script=None, gate=None):
+        self.script = script or {}
+        self.gate = gate
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def call(self, method, payload=None, timeout=10):
+        with self.lock:
+            self.calls.append(payload["text"])
+        if self.gate:
+            self.gate.wait(5)
+        with self.lock:
+            replies = self.script.get(payload["text"])
+            if replies:
+                reply = replies.pop(0)
+                if isinstance(reply, Exception):
+                    raise reply
+                return reply
+        return {"ok": True, "result": {"message_id": len(self.calls)}}
+
+
+def make_queue(api, **kwargs):
+    options = dict(global_rate=1000, chat_rate=1000, chat_burst=1000,
+                   senders=2, backoff_base=0.01)
+    options.update(kwargs)
+    return OutboundQueue(api_factory=lambda: api, **options).start()
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    assert bucket.consume() and bucket.consume()
+    assert not bucket.consume()
+    assert bucket.delay() == pytest.approx(0.5)
+    now[0] = 0.5
+    assert bucket.consume()
+    bucket.pause(3)
+    assert bucket.delay() == pytest.approx(3)
+
+
+def test_per_chat_order_and_priority():
+    gate = threading.Event()
+    api = ScriptedAPI(gate=gate)
+    queue = make_queue(api, senders=1)
+
+    first = queue.send(1, {"chat_id": 1, "text": "first"})
+    while not api.calls:
+        time.sleep(0.001)
+    futures = [first,
+               queue.send(1, {"chat_id": 1, "text": "keyboard"}, priority=PRIORITY_CHATTER),
+               queue.send(1, {"chat_id": 1, "text": "prompt"}),
+               queue.send(2, {"chat_id": 2, "text": "menu"}, priority=PRIORITY_CHATTER),
+               queue.send(3, {"chat_id": 3, "text": "assigned"}, priority=PRIORITY_NOTIFICATION)]
+    gate.set()
+    for future in futures:
+        assert future.result(timeout=5)["ok"]
+    queue.stop()
+
+    # "first" was already in flight. Chats are served by their most urgent
+    # waiting message, but a chat's own messages never overtake each other
+    assert api.calls[:2] == ["first", "assigned"]
+    assert api.calls.index("keyboard") < api.calls.index("prompt")
+    assert api.calls[-1] == "menu"
+    stats = queue.stats()
+    assert stats["sent"] == 5 and stats["queued"] == 0
+    assert stats["queue_latency"]["count"] == 5
+
+
+def test_honours_retry_after_and_backoff():
+    api = ScriptedAPI(script={
+        "limited": [{"ok": False, "error_code": 429, "description": "Too Many Requests",
+                     "parameters": {"retry_after": 0.05}}],
+        "flaky": [ConnectionError("reset"), {"ok": False, "error_code": 502}],
+    })
+    queue = make_queue(api)
+
+    assert queue.send(1, {"chat_id": 1, "text": "limited"}).result(timeout=5)["ok"]
+    assert queue.send(2, {"chat_id": 2, "text": "flaky"}).result(timeout=5)["ok"]
+    queue.stop()
+
+    stats = queue.stats()
+    assert stats["throttled"] == 1
+    assert stats["retried"] == 3
+    assert api.calls.count("flaky") == 3
+
+
+def test_gives_up_on_client_errors_and_exhausted_retries():
+    api = ScriptedAPI(script={
+        "bad": [{"ok": False, "error_code": 400, "description": "chat not found"}],
+        "down": [{"ok": False, "error_code": 500}] * 3,
+    })
+    queue = make_queue(api, max_retries=2)
+
+    with pytest.raises(OutboundError):
+        queue.send(1, {"chat_id": 1, "text": "bad"}).result(timeout=5)
+    with pytest.raises(OutboundError):
+        queue.send(2, {"chat_id": 2, "text": "down"}).result(timeout=5)
+    queue.stop()
+
+    assert api.calls.count("bad") == 1
+    assert api.calls.count("down") == 3
+    assert queue.stats()["failed"] == 2
+
+
+def test_per_chat_rate_limit():
+    api = ScriptedAPI()
+    queue = make_queue(api, chat_rate=20, chat_burst=1)
+    futures = [queue.send(1, {"chat_id": 1, "text": str(i)}) for i in range(4)]
+    for future in futures:
+        future.result(timeout=5)
+    queue.stop()
+
+    # 4 sends with a burst of 1 at 20/s need at least 3 refill intervals
+    assert queue.stats()["queue_latency"]["p99_ms"] >= 140
+    assert api.calls == ["0", "1", "2", "3"]
+
+
+def test_notifications_never_wait_on_delivery(monkeypatch):
+    from utils import notifications
+
+    # Web process: no running queue, one direct call and no sender threads
+    api = ScriptedAPI()
+    monkeypatch.setattr(notifications, "running_outbound", lambda: None)
+    monkeypatch.setattr(notifications, "get_api", lambda: api)
+    assert notifications.send_telegram_message(1, "assigned")
+    assert api.calls == ["assigned"]
+
+    # Bot process: queued behind a blocked send, returns at once
+    gate = threading.Event()
+    queue = make_queue(ScriptedAPI(gate=gate), senders=1)
+    monkeypatch.setattr(notifications, "running_outbound", lambda: queue)
+    started = time.monotonic()
+    assert notifications.send_telegram_message(1, "completed")
+    assert time.monotonic() - started < 1
+    gate.set()
+    queue.stop()
+    assert queue.stats()["sent"] == 1
@@ -0,0 +1,80 @@
+import sys
+import os
+import threading
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_telegram import FakeTelegram
+from utils import telegram_api
+from utils.telegram_api import TelegramAPI
+from utils.photo_analysis import PhotoAnalysisWorker, PENDING
+
+
+class FakeRequests:
+    """Records update_one calls and serves a fixed find() result"""
+
+    def __init__(self, pending=()):
+        self.pending = list(pending)
+        self.updates = {}
+
+    def update_one(self, query, update):
+        self.updates[query["_id"]] = update["$set"]
+
+    def find(self, query, projection):
+        assert query["photo_analysis.status"] == PENDING
+        return self
+
+    def limit(self, n):
+        return self.pending[:n]
+
+
+def test_worker_saves_result_and_notifies():
+    fake = FakeTelegram().start()
+    fake.files["photos/leak.jpg"] = b"jpeg"
+    previous = telegram_api.set_api(TelegramAPI(token=fake.token, base_url=fake.base_url))
+
+    requests = FakeRequests()
+    sent = []
+    done = threading.Event()
+    analyzed = []
+
+    def analyze(url, file_unique_id=None, cache=None):
+        analyzed.append(telegram_api.get_api().download(url))
+        return {"success": True, "issue_type": "water leak plumbing", "confidence": 91.0}
+
+    def notify(chat_id, text):
+        sent.append((chat_id, text))
+        done.set()
+
+    worker = PhotoAnalysisWorker(requests, notify, workers=1, analyze=analyze)
+    try:
+        assert worker.submit("abc123", 42, "leak")
+        assert done.wait(5)
+    finally:
+        worker.shutdown()
+        telegram_api.set_api(previous)
+        fake.stop()
+
+    assert analyzed == [b"jpeg"]
+    saved = requests.updates["abc123"]
+    assert saved["photo_url"].endswith("/photos/leak.jpg")
+    assert saved["photo_analysis"]["status"] == "done"
+    assert sent[0][0] == 42 and "Water Leak Plumbing" in sent[0][1]
+    assert worker.stats()["completed"] == 1
+
+
+def test_full_queue_leaves_requests_pending():
+    gate = threading.Event()
+    requests = FakeRequests(pending=[
+        {"_id": f"r{i}", "user_id": "7", "photo_file_id": f"f{i}"} for i in range(5)])
+
+    worker = PhotoAnalysisWorker(requests, lambda *a: None, workers=1, max_queue=1)
+    worker._run = lambda *a: gate.wait(5)
+    try:
+        assert worker.resume_pending() == 2
+        assert worker.stats()["rejected"] == 1
+    finally:
+        gate.set()
+        worker.shutdown()
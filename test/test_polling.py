@@ -0,0 +1,56 @@
+import sys
+import os
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import telegram_api, telegram_bot
+
+
+class ScriptedApi:
+    """getUpdates answers (or exceptions) in order"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+
+    def call(self, method, payload=None, timeout=10):
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class Stop(Exception):
+    pass
+
+
+def test_failed_polls_back_off_and_reset(monkeypatch):
+    refused = {"ok": False, "error_code": 409, "description": "Conflict: webhook is active"}
+    api = ScriptedApi([ConnectionError("down"), refused, refused, refused,
+                       {"ok": True, "result": [{"update_id": 5}]}, ConnectionError("down")])
+    monkeypatch.setattr(telegram_bot, "get_api", lambda: api)
+    monkeypatch.setattr(telegram_bot, "prefetch_senders", lambda updates: None)
+    monkeypatch.setattr(telegram_api, "POLL_BACKOFF", 1.0)
+    monkeypatch.setattr(telegram_api, "POLL_BACKOFF_MAX", 4.0)
+    monkeypatch.setattr(telegram_bot, "LAST_UPDATE_ID", 0)
+
+    delays, submitted = [], []
+
+    def sleep(delay):
+        delays.append(delay)
+        if not api.answers:
+            raise Stop()
+
+    class Dispatcher:
+        def submit(self, update):
+            submitted.append(update["update_id"])
+
+    with pytest.raises(Stop):
+        telegram_bot.run_polling(Dispatcher(), timeout=0, sleep=sleep)
+
+    caps = [1, 2, 4, 4, 1]
+    assert len(delays) == len(caps)
+    assert all(cap / 2 <= delay <= cap for delay, cap in zip(delays, caps))
+    assert submitted == [5] and telegram_bot.LAST_UPDATE_ID == 5
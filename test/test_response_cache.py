@@ -0,0 +1,69 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service_agents import intent_router, serviceman_agent
+from service_agents.response_cache import ResponseCache, is_cacheable_question, MAX_ANSWER_CHARS
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = ResponseCache(similarity=0.85)
+    assert cache.get("How do I reset an MCB?") is None
+    assert cache.put("How do I reset an MCB?", "Push the lever down, then up.", seconds=2.5)
+
+    assert cache.get("how do i reset an mcb") == "Push the lever down, then up."
+    assert cache.get("How to reset a MCB please") == "Push the lever down, then up."
+    assert cache.get("How do I reset an RCCB?") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["saved_seconds"] == 5.0
+
+
+def test_ttl_size_limit_and_bypass():
+    now = [0.0]
+    cache = ResponseCache(ttl=60, clock=lambda: now[0])
+    assert not cache.put("what is a p-trap", "x" * (MAX_ANSWER_CHARS + 1))
+    cache.put("what is a p-trap", "A U-shaped pipe bend.")
+    now[0] = 61
+    assert cache.get("what is a p-trap") is None
+
+    assert not is_cacheable_question("what's wrong with job 65f1c2ab9d3e4f0012a7b8c9")
+    assert not is_cacheable_question("which customer is waiting today")
+    assert not cache.put("what did the customer say", "…")
+    assert cache.get("what did the customer say") is None
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_run_agent_skips_llm_on_repeat(monkeypatch):
+    monkeypatch.setattr(intent_router, "_router", intent_router.IntentRouter())
+    monkeypatch.setattr(serviceman_agent, "RESPONSE_CACHE", ResponseCache())
+    calls = []
+    monkeypatch.setattr(serviceman_agent, "ask_llm",
+                        lambda text, user: calls.append(text) or "Use PTFE tape.")
+    monkeypatch.setattr(serviceman_agent, "stream_llm",
+                        lambda text, user: iter(["Turn off ", "the valve."]))
+
+    assert serviceman_agent.run_agent("Can I use teflon tape on a gas fitting?", "ramu123") == "Use PTFE tape."
+    assert serviceman_agent.run_agent("can i use teflon tape on gas fittings", "suresh") == "Use PTFE tape."
+    assert len(calls) == 1
+
+    # A streamed answer is cached once the stream is consumed
+    assert "".join(serviceman_agent.run_agent("how do I shut off water", "ramu123", stream=True)) == \
+        "Turn off the valve."
+    assert serviceman_agent.run_agent("How do I shut off water?", "ramu123", stream=True) == "Turn off the valve."
+
+
+def test_similar_questions_with_different_subjects_miss():
+    cache = ResponseCache(similarity=0.5)
+    cache.put("Can I use teflon tape on a gas fitting?", "Only yellow gas-rated PTFE tape.")
+    cache.put("How do I turn off the geyser?", "Switch off the isolator.")
+    cache.put("What size fuse does a water heater need?", "Usually 16A.")
+
+    assert cache.get("can i use teflon tape on a water fitting") is None
+    assert cache.get("How do I turn on the geyser?") is None
+    assert cache.get("What size fuse does a gas heater need?") is None
+    assert cache.get("teflon tape on gas fittings, can I use it?") == "Only yellow gas-rated PTFE tape."
+    assert cache.stats()["misses"] == 3
@@ -0,0 +1,131 @@
+import sys
+import os
+from datetime import datetime
+
+import mongomock
+from bson import ObjectId
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.service_requests import (ServiceRequest, ServiceRequestRepository, PROJECTIONS,
+                                    format_time, request_label, migrate_in_background)
+
+
+def make_repo():
+    return ServiceRequestRepository(mongomock.MongoClient().db.service_requests)
+
+
+def test_legacy_documents_read_as_one_shape():
+    request = ServiceRequest.from_doc({
+        "_id": "job1", "user_id": "42", "category": "Plumbing", "status": "Completed",
+        "timestamp": "2025-03-01 09:30:00", "completion_time": "2025-03-02 17:00:00",
+    })
+    assert request.id == "job1" and request.short_id == "job1"
+    assert request.created_at == datetime(2025, 3, 1, 9, 30)
+    assert request.completed_at == datetime(2025, 3, 2, 17, 0)
+    assert format_time(request.completed_at) == "2025-03-02 17:00"
+    assert not hasattr(request, "__dict__")
+
+
+def test_list_view_fetches_only_rendered_fields():
+    repo = make_repo()
+    repo.col.insert_one({"_id": ObjectId(), "category": "Electrical", "user_id": "7",
+                         "timestamp": datetime(2025, 1, 1), "photo_embedding": b"\0" * 1024,
+                         "logs": [{"action": "CREATED"}]})
+    projection = PROJECTIONS["list"]
+    assert "photo_embedding" not in projection and "logs" not in projection
+
+    [request] = repo.find({"user_id": "7"}, sort=[("timestamp", -1)])
+    assert request.category == "Electrical" and request.created_at == datetime(2025, 1, 1)
+
+
+def test_create_and_update_store_datetimes():
+    repo = make_repo()
+    request_id = repo.create(ServiceRequest(requester="amy", category="Carpentry"))
+    doc = repo.col.find_one({"_id": request_id})
+    assert isinstance(doc["timestamp"], datetime) and doc["status"] == "Pending"
+
+    assert repo.update(str(request_id), status="Completed", completed_at=datetime(2025, 5, 1))
+    # String ids from the agent's sample data are matched too
+    repo.col.insert_one({"_id": "job1", "assigned_to": "bob"})
+    assert not repo.update("job1", query={"assigned_to": "eve"}, status="Completed")
+    assert repo.update("job1", query={"assigned_to": "bob"}, status="Completed")
+
+    request = repo.get(request_id)
+    assert request.completed_at == datetime(2025, 5, 1) and isinstance(request.updated_at, datetime)
+
+
+def test_migrate_times_rewrites_legacy_strings():
+    repo = make_repo()
+    repo.col.insert_many([
+        {"_id": 1, "timestamp": "2025-03-01 09:30:00", "completion_time": "2025-03-02 17:00:00"},
+        {"_id": 2, "timestamp": datetime(2025, 3, 1), "assignment_time": "2025-03-01 10:00:00"},
+        {"_id": 3, "timestamp": datetime(2025, 3, 1)},
+    ])
+    assert repo.migrate_times() == 2
+    assert repo.col.find_one({"_id": 1}) == {
+        "_id": 1, "timestamp": datetime(2025, 3, 1, 9, 30), "completed_at": datetime(2025, 3, 2, 17)}
+    assert repo.col.find_one({"_id": 2})["assigned_at"] == datetime(2025, 3, 1, 10)
+    assert repo.migrate_times() == 0
+
+
+def test_keyset_pages_cover_every_request_once():
+    repo = make_repo()
+    # Equal timestamps on some requests exercise the _id tie-break
+    repo.col.insert_many([{"_id": ObjectId(), "status": "Pending" if i % 3 else "Completed",
+                           "timestamp": datetime(2025, 1, 1 + i // 2)} for i in range(25)])
+    query = {"status": "Pending"}
+
+    for descending in (True, False):
+        seen, after = [], None
+        while True:
+            requests, after = repo.page(query, after=after, page_size=4, descending=descending)
+            seen.extend(requests)
+            if after is None:
+                break
+        expected = sorted(repo.col.find(query), key=lambda d: (d["timestamp"], d["_id"]),
+                          reverse=descending)
+        assert [r.id for r in seen] == [d["_id"] for d in expected]
+
+    assert repo.total(query) == 16 and repo.total() == 25
+    repo.col.insert_one({"_id": ObjectId(), "status": "Pending", "timestamp": datetime(2025, 2, 1)})
+    assert repo.total(query) == 16  # cached until COUNT_CACHE_TTL passes
+
+
+def test_migrate_dates_requests_without_timestamp():
+    repo = make_repo()
+    request_id = ObjectId()
+    repo.col.insert_one({"_id": request_id, "name": "web form"})
+    assert repo.migrate_times() == 1
+    assert repo.col.find_one({"_id": request_id})["timestamp"] == \
+        request_id.generation_time.replace(tzinfo=None)
+
+
+def test_admin_picker_labels_render_from_repository_output():
+    repo = make_repo()
+    first = repo.create(ServiceRequest(category="Plumbing"))
+    repo.create(ServiceRequest())
+    pending = list(repo.find({"status": "Pending"}, view="list", sort=[("timestamp", 1)]))
+
+    # The admin sidebar's Quick Assign and Force Complete pickers
+    options = [request_label(job) for job in pending]
+    assert options == [f"Plumbing #{str(first)[-6:]}", f"Unknown #{pending[1].short_id}"]
+    assert str(pending[0].id) == str(first)
+
+
+def test_legacy_timestamps_are_reported_until_migrated(caplog):
+    repo = make_repo()
+    repo.col.insert_many([{"_id": ObjectId(), "status": "Pending", "timestamp": datetime(2025, 1, i)}
+                          for i in range(1, 4)])
+    repo.col.insert_one({"_id": ObjectId(), "status": "Pending", "timestamp": "2025-01-02 12:00:00"})
+    assert repo.unordered_count() == 1
+
+    _, after = repo.page({"status": "Pending"}, page_size=2)
+    second, _ = repo.page({"status": "Pending"}, after=after, page_size=2)
+    assert len(second) == 1 and "skipped after the first page" in caplog.text
+
+    migrate_in_background(repo, wait=True)
+    assert repo.unordered_count() == 0
+    _, after = repo.page({"status": "Pending"}, page_size=2)
+    assert len(repo.page({"status": "Pending"}, after=after, page_size=2)[0]) == 2
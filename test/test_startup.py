@@ -0,0 +1,67 @@
+import sys
+import os
+import logging
+import subprocess
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from utils.startup import StartupTimer, warm_up_in_background
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bot_import_loads_no_models_or_clients():
+    code = ("import sys, utils.telegram_bot; "
+            "print(sorted(m for m in ('torch', 'transformers', 'openai') if m in sys.modules))")
+    env = dict(os.environ, MONGODB_URI="mongodb://localhost:1/", BOT_STATE_BACKEND="memory")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_timer_reports_steps_slowest_first(caplog):
+    clock = FakeClock()
+    timer = StartupTimer(clock=clock)
+    with timer.step("connect_to_db"):
+        clock.now += 0.25
+    with timer.step("import utils.telegram_bot"):
+        clock.now += 1.5
+    try:
+        with timer.step("user profile watch"):
+            clock.now += 0.01
+            raise RuntimeError("no replica set")
+    except RuntimeError:
+        pass
+
+    with caplog.at_level(logging.INFO, logger="utils.startup"):
+        text = timer.report()
+    assert [name for name, _ in timer.steps] == [
+        "connect_to_db", "import utils.telegram_bot", "user profile watch"]
+    lines = text.splitlines()
+    assert lines[0] == "Startup took 1760 ms"
+    assert lines[1].split() == ["import", "utils.telegram_bot", "1500", "ms"]
+    assert lines[3].split() == ["user", "profile", "watch", "10", "ms"]
+    assert text in caplog.text
+
+
+def test_warm_up_keeps_going_after_a_failure(caplog):
+    ran = []
+
+    def broken():
+        raise OSError("model files missing")
+
+    with caplog.at_level(logging.INFO, logger="utils.startup"):
+        warm_up_in_background([("CLIP model", broken),
+                               ("NIM client", lambda: ran.append("nim"))]).join(5)
+    assert ran == ["nim"]
+    assert "Warm-up of CLIP model failed" in caplog.text
+    assert "Background warm-up took" in caplog.text
@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.state_store import MemoryStateStore, MongoStateStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_compare_and_set_transitions():
+    store = MemoryStateStore(default_ttl=60)
+    assert store.compare_and_set(1, None, {"state": "AWAITING_CATEGORY"})
+    # A second "start" loses the race
+    assert not store.compare_and_set(1, None, {"state": "AWAITING_CATEGORY"})
+
+    assert store.compare_and_set(1, "AWAITING_CATEGORY",
+                                 {"state": "AWAITING_DESCRIPTION", "category": "Plumbing"})
+    assert not store.compare_and_set(1, "AWAITING_CATEGORY", {"state": "AWAITING_DESCRIPTION"})
+    assert store.get(1) == {"state": "AWAITING_DESCRIPTION", "category": "Plumbing"}
+
+    # Finishing the flow clears it exactly once
+    store.set(1, {"state": "AWAITING_PHOTO"})
+    assert store.compare_and_set(1, "AWAITING_PHOTO", None)
+    assert not store.compare_and_set(1, "AWAITING_PHOTO", None)
+    assert store.get(1) is None
+
+
+def test_values_are_copied():
+    store = MemoryStateStore()
+    value = {"state": "AWAITING_LOCATION"}
+    store.set(5, value)
+    value["state"] = "changed"
+    store.get(5)["state"] = "changed"
+    assert store.get(5) == {"state": "AWAITING_LOCATION"}
+
+
+def test_state_and_claims_expire():
+    clock = Clock()
+    store = MemoryStateStore(default_ttl=10, clock=clock)
+    store.set(1, {"state": "AWAITING_LOCATION"})
+    assert store.claim("processed", "1:1", ttl=5)
+    assert not store.claim("processed", "1:1", ttl=5)
+
+    clock.now = 6
+    assert store.claim("processed", "1:1", ttl=5)
+    assert store.get(1) is not None
+
+    clock.now = 11
+    assert store.get(1) is None
+    assert store.compare_and_set(1, None, {"state": "AWAITING_CATEGORY"})
+
+    store.release("processed", "1:1")
+    assert store.claim("processed", "1:1", ttl=5)
+
+
+def test_mongo_store_does_no_io_when_built():
+    class Unreachable:
+        def __getattr__(self, name):
+            raise AssertionError(f"{name} called while building the store")
+
+    store = MongoStateStore(Unreachable(), flush_interval=60)
+    store._stop.set()
@@ -0,0 +1,86 @@
+import sys
+import os
+from datetime import datetime
+
+import mongomock
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.status_digest import (status_digest_pipeline, fetch_status_digest,
+                                 render_status_digest, CALLBACK_PREFIX)
+
+
+def make_db(active=7, completed=5):
+    db = mongomock.MongoClient().db
+    db.users.insert_one({"username": "bob", "name": "Bob", "telegram": "bob_fixes"})
+    db.service_requests.insert_many(
+        [{"user_id": "42", "status": "Pending", "category": "Plumbing", "assigned_to": "bob",
+          "timestamp": datetime(2025, 1, 1 + i)} for i in range(active)] +
+        [{"user_id": "42", "status": "Completed", "category": "Electrical",
+          "timestamp": datetime(2025, 2, 1 + i), "completed_at": datetime(2025, 3, 1 + i)}
+         for i in range(completed)] +
+        [{"user_id": "7", "status": "Pending", "timestamp": datetime(2025, 1, 1)}])
+    return db
+
+
+def test_sort_follows_match():
+    stages = [next(iter(stage)) for stage in status_digest_pipeline(42)]
+    assert stages[:3] == ["$match", "$sort", "$project"]
+
+
+def test_counts_and_pages():
+    db = make_db()
+    first = fetch_status_digest(db.service_requests, 42, page=0, page_size=3)
+    assert (first["active_total"], first["completed_total"]) == (7, 5)
+    assert [r["timestamp"].day for r in first["active"]] == [7, 6, 5]
+    assert first["active"][0]["specialist"] == {"name": "Bob", "telegram": "bob_fixes"}
+    assert len(first["completed"]) == 3
+
+    last = fetch_status_digest(db.service_requests, 42, page=2, page_size=3)
+    assert [r["timestamp"].day for r in last["active"]] == [1]
+
+
+def test_completed_listed_by_completion_time():
+    db = mongomock.MongoClient().db
+    db.service_requests.insert_many([
+        {"user_id": "42", "status": "Completed", "category": "Old but just done",
+         "timestamp": datetime(2025, 1, 1), "completed_at": datetime(2025, 6, 1)},
+        {"user_id": "42", "status": "Completed", "category": "Legacy",
+         "timestamp": datetime(2025, 5, 1)},
+        {"user_id": "42", "status": "Completed", "category": "New, done long ago",
+         "timestamp": datetime(2025, 4, 1), "completed_at": datetime(2025, 4, 2)},
+        {"user_id": "42", "status": "Completed", "category": "Newest submitted",
+         "timestamp": datetime(2025, 5, 2), "completed_at": datetime(2025, 3, 1)},
+    ])
+    digest = fetch_status_digest(db.service_requests, 42)
+    assert [r["category"] for r in digest["completed"]] == [
+        "Old but just done", "Legacy", "New, done long ago"]
+
+
+def test_render_buttons_and_completed_section():
+    db = make_db()
+    digest = fetch_status_digest(db.service_requests, 42, page=0, page_size=3)
+    text, markup = render_status_digest(digest, page=0, page_size=3)
+    assert "(1/3)" in text and "Recently Completed" in text and "2 more completed" in text
+    assert "@bob_fixes" in text
+    assert markup == {"inline_keyboard": [[{"text": "Next ▶", "callback_data": f"{CALLBACK_PREFIX}1"}]]}
+
+    digest = fetch_status_digest(db.service_requests, 42, page=1, page_size=3)
+    text, markup = render_status_digest(digest, page=1, page_size=3)
+    assert "(2/3)" in text and "Recently Completed" not in text
+    assert [b["callback_data"] for b in markup["inline_keyboard"][0]] == [
+        f"{CALLBACK_PREFIX}0", f"{CALLBACK_PREFIX}2"]
+
+    digest = fetch_status_digest(db.service_requests, 42, page=2, page_size=3)
+    _, markup = render_status_digest(digest, page=2, page_size=3)
+    assert [b["text"] for b in markup["inline_keyboard"][0]] == ["◀ Previous"]
+
+
+def test_empty_and_single_page():
+    db = make_db(active=2, completed=0)
+    assert render_status_digest(fetch_status_digest(db.service_requests, 99)) == \
+        ("You have no requests in the system.", None)
+
+    text, markup = render_status_digest(fetch_status_digest(db.service_requests, 42))
+    assert "Your Active Requests:*" in text and markup is None
@@ -0,0 +1,80 @@
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fake_telegram import FakeTelegram
+from fake_openai import FakeOpenAI
+from utils.telegram_api import TelegramAPI
+from utils.outbound import OutboundQueue
+from utils.stream_relay import relay_stream, CURSOR
+from service_agents import intent_router, serviceman_agent
+
+ANSWER = ("Switch off the MCB, wait ten seconds, then push the lever fully up. "
+          "If it trips again straight away there is a fault on that circuit.")
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    openai = pytest.importorskip("openai")
+    llm = FakeOpenAI(ANSWER, first_token_delay=0.05, token_delay=0.03).start()
+    telegram = FakeTelegram().start()
+    api = TelegramAPI(token=telegram.token, base_url=telegram.base_url)
+    queue = OutboundQueue(api_factory=lambda: api, global_rate=1000, chat_rate=1000,
+                          chat_burst=1000).start()
+    monkeypatch.setattr(serviceman_agent, "_nim_client",
+                        openai.OpenAI(base_url=llm.base_url, api_key="test"))
+    monkeypatch.setattr(intent_router, "_router", intent_router.IntentRouter())
+    yield llm, telegram, queue
+    queue.stop(2)
+    api.close()
+    telegram.stop()
+    llm.stop()
+
+
+def test_streams_llm_answer_into_one_message(servers):
+    llm, telegram, queue = servers
+    started = time.monotonic()
+    chunks = serviceman_agent.run_agent("How do I reset an MCB?", "ramu123", stream=True)
+    assert not isinstance(chunks, str) and not llm.requests  # request starts with the relay
+
+    relay = relay_stream(42, chunks, outbound=queue, interval=0.1)
+    total = time.monotonic() - started
+
+    assert llm.requests[0]["stream"] is True
+    assert len(telegram.calls_to("sendMessage")) == 1
+    edits = telegram.calls_to("editMessageText")
+    assert len(edits) >= 3
+    assert {e["message_id"] for e in edits} == {1}
+    assert all(e["text"].endswith(CURSOR) and "parse_mode" not in e for e in edits[:-1])
+    assert edits[-1]["text"] == ANSWER and edits[-1]["parse_mode"] == "Markdown"
+    # Text is visible long before generation finishes
+    assert relay.stats()["first_text_seconds"] < total / 2
+
+
+def test_falls_back_to_plain_text(servers):
+    llm, telegram, queue = servers
+    llm.answer = "Use *both hands"
+
+    def reject_markdown(payload):
+        if "parse_mode" in payload:
+            return {"ok": False, "error_code": 400,
+                    "description": "Bad Request: can't parse entities"}
+        return {"ok": True, "result": {"message_id": payload["message_id"]}}
+    telegram.responses["editMessageText"] = (400, reject_markdown)
+
+    relay_stream(7, serviceman_agent.run_agent("what should I wear on site", "ramu123", stream=True),
+                 outbound=queue, interval=0.05)
+    final = telegram.calls_to("editMessageText")[-1]
+    assert final["text"] == "Use *both hands" and "parse_mode" not in final
+
+
+def test_local_intents_are_not_streamed(servers, monkeypatch):
+    llm, _, _ = servers
+    monkeypatch.setattr(serviceman_agent, "get_my_jobs", lambda user: "No pending jobs found.")
+    assert serviceman_agent.run_agent("list my jobs", "ramu123", stream=True) == "No pending jobs found."
+    assert not llm.requests
@@ -0,0 +1,96 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from bson import ObjectId
+from fake_openai import FakeOpenAI
+from service_agents import intent_router, serviceman_agent
+from utils import service_requests
+from utils.service_requests import ServiceRequestRepository
+
+LEAK = ObjectId("65f1c2ab9d3e4f0012a7b8c9")
+LIGHTS = ObjectId("65f1c2ab9d3e4f0012d4e5f6")
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    openai = pytest.importorskip("openai")
+    col = mongomock.MongoClient().db.service_requests
+    col.insert_many([
+        {"_id": LEAK, "assigned_to": "ramu123", "status": "Assigned",
+         "description": "Fix leaking pipe", "location": "Block B 4", "photo_embedding": b"x" * 1024},
+        {"_id": LIGHTS, "assigned_to": "ramu123", "status": "Assigned",
+         "description": "Install new lights", "location": "Block C 2"},
+        {"_id": "job9", "assigned_to": "suresh", "status": "Assigned", "description": "Paint door"},
+    ])
+    llm = FakeOpenAI("Your next job is the leaking pipe.").start()
+    monkeypatch.setattr(service_requests, "_repository", ServiceRequestRepository(col))
+    monkeypatch.setattr(serviceman_agent, "_nim_client",
+                        openai.OpenAI(base_url=llm.base_url, api_key="test"))
+    monkeypatch.setattr(intent_router, "_router", intent_router.IntentRouter())
+    yield llm, col
+    llm.stop()
+
+
+def test_multi_step_request_in_one_round_trip(agent):
+    llm, col = agent
+    friday = (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d")
+    llm.tool_calls = [
+        ("complete_job", {"job_id": "a7b8c9"}),
+        ("reschedule_job", {"job_id": "d4e5f6", "date": friday, "start": "10:00"}),
+        ("list_jobs", {}),
+    ]
+    reply = serviceman_agent.run_agent(
+        "complete job a7b8c9 and move job d4e5f6 to friday 10am", "ramu123")
+
+    assert len(llm.requests) == 1
+    request = llm.requests[0]
+    assert {t["function"]["name"] for t in request["tools"]} == {
+        "list_jobs", "complete_job", "job_status", "reschedule_job"}
+    # Job context is in the prompt, without heavy fields or other servicemen's jobs
+    prompt = request["messages"][0]["content"]
+    assert str(LEAK) in prompt and str(LIGHTS) in prompt and "Paint door" not in prompt
+
+    leak = col.find_one({"_id": LEAK})
+    assert leak["status"] == "Completed" and leak["completed_by"] == "ramu123"
+    assert isinstance(leak["completed_at"], datetime) and isinstance(leak["updated_at"], datetime)
+    assert col.find_one({"_id": LIGHTS})["scheduled_time"] == {"date": friday, "start": "10:00", "end": "11:00"}
+    assert f"Job {LEAK} marked as completed." in reply
+    # The listing runs after the completion in the same turn
+    assert "Install new lights" in reply and "Fix leaking pipe" not in reply
+
+
+def test_context_answers_and_bad_calls(agent):
+    llm, col = agent
+    assert serviceman_agent.run_agent("which customer is waiting longest for me", "ramu123") == \
+        "Your next job is the leaking pipe."
+
+    llm.tool_calls = [("reschedule_job", {"job_id": "job9", "date": "2099-01-01", "start": "9"}),
+                      ("reschedule_job", {"job_id": "job9", "date": "2099-01-01", "start": "09:00"}),
+                      ("explode", {})]
+    reply = serviceman_agent.run_agent("reschedule job9 to new year", "ramu123")
+    assert "use a date like" in reply
+    assert "not yours" in reply and "scheduled_time" not in col.find_one({"_id": "job9"})
+    assert "Could not run explode" in reply
+
+
+def test_short_references_resolve_outside_the_tool_agent(agent):
+    llm, col = agent
+    col.insert_one({"_id": ObjectId("65f1c2ab9d3e4f0012ffee01"), "assigned_to": "suresh",
+                    "status": "Assigned"})
+
+    assert serviceman_agent.run_agent("status of job #a7b8c9", "ramu123") == \
+        f"Job {LEAK} status: Assigned"
+    assert serviceman_agent.run_agent("complete job #a7b8c9", "ramu123") == \
+        f"Job {LEAK} marked as completed."
+    assert col.find_one({"_id": LEAK})["completed_by"] == "ramu123"
+    assert "already completed" in serviceman_agent.run_agent("complete job #a7b8c9", "ramu123")
+    # Only the serviceman's own jobs are searched
+    assert "already completed" in serviceman_agent.run_agent("complete job #ffee01", "ramu123")
+    assert len(llm.requests) == 0
@@ -0,0 +1,64 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.user_cache import UserProfileCache
+
+
+class FakeUsers:
+    """Just enough of a pymongo collection for $in and equality lookups"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = 0
+
+    def _project(self, doc, projection):
+        return {k: v for k, v in doc.items() if projection.get(k)}
+
+    def find_one(self, query, projection):
+        self.calls += 1
+        for doc in self.docs:
+            if doc.get("telegram_id") == query["telegram_id"]:
+                return self._project(doc, projection)
+        return None
+
+    def find(self, query, projection):
+        self.calls += 1
+        wanted = set(query["telegram_id"]["$in"])
+        return [self._project(d, projection) for d in self.docs if d.get("telegram_id") in wanted]
+
+
+def test_prefetch_batches_lookups():
+    users = FakeUsers([
+        {"telegram_id": "1", "username": "ramu123", "role": "serviceman", "password": "x"},
+        {"telegram_id": "2", "username": "asha", "role": "resident"},
+    ])
+    cache = UserProfileCache(users)
+
+    assert cache.prefetch([1, 2, 3, 1]) == 3
+    assert users.calls == 1
+
+    assert cache.get(1)["role"] == "serviceman"
+    assert "password" not in cache.get(1)
+    assert cache.get(3) is None  # negative answers are cached too
+    assert users.calls == 1
+    assert cache.prefetch([1, 2]) == 0
+
+
+def test_invalidation():
+    users = FakeUsers([])
+    cache = UserProfileCache(users)
+    assert cache.get(7) is None
+
+    users.docs.append({"telegram_id": "7", "username": "new", "role": "serviceman"})
+    assert cache.get(7) is None
+    cache.invalidate(7)
+    assert cache.get(7)["username"] == "new"
+
+    cache._apply_change({"operationType": "update",
+                         "fullDocument": {"telegram_id": "7", "role": "admin"},
+                         "updateDescription": {"updatedFields": {"role": "admin"}}})
+    users.docs[0]["role"] = "admin"
+    assert cache.get(7)["role"] == "admin"
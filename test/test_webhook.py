@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+import asyncio
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.webhook import WebhookApp
+
+
+class RecordingDispatcher:
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.updates = []
+
+    def submit(self, update, block=True, timeout=None):
+        if self.accept:
+            self.updates.append(update)
+        return self.accept
+
+    def stats(self):
+        return {"queued": len(self.updates)}
+
+
+def call(app, method="POST", path="/telegram/webhook", body=b"", secret="s3cret"):
+    headers = []
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    chunks = [{"type": "http.request", "body": body[:10], "more_body": True},
+              {"type": "http.request", "body": body[10:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+def test_accepts_valid_update():
+    dispatcher = RecordingDispatcher()
+    app = WebhookApp(dispatcher, secret_token="s3cret")
+    update = {"update_id": 5, "message": {"message_id": 1, "chat": {"id": 9}, "text": "/start"}}
+
+    status, payload = call(app, body=json.dumps(update).encode())
+
+    assert status == 200 and payload["ok"]
+    assert dispatcher.updates == [update]
+
+
+def test_rejects_bad_secret_and_payloads():
+    dispatcher = RecordingDispatcher()
+    app = WebhookApp(dispatcher, secret_token="s3cret")
+    body = json.dumps({"update_id": 1}).encode()
+
+    assert call(app, body=body, secret="wrong")[0] == 401
+    assert call(app, body=body, secret=None)[0] == 401
+    assert call(app, body=b"not json")[0] == 400
+    assert call(app, body=b"[1, 2]")[0] == 400
+    assert call(app, method="GET", body=body)[0] == 405
+    assert call(app, path="/other", body=body)[0] == 404
+    assert dispatcher.updates == []
+    assert app.rejected == 2
+
+
+def test_full_queue_asks_telegram_to_retry():
+    app = WebhookApp(RecordingDispatcher(accept=False), secret_token="s3cret")
+    status, _ = call(app, body=json.dumps({"update_id": 1}).encode())
+    assert status == 503
+
+
+def test_healthz_reports_database_health():
+    database = {"ok": True}
+    app = WebhookApp(RecordingDispatcher(), secret_token="s3cret", health_check=lambda: database)
+
+    status, payload = call(app, method="GET", path="/healthz", secret=None)
+    assert status == 200 and payload["database"] == {"ok": True}
+
+    database["ok"] = False
+    status, payload = call(app, method="GET", path="/healthz", secret=None)
+    assert status == 503 and not payload["ok"]
+
+
+def test_secret_is_required():
+    try:
+        WebhookApp(RecordingDispatcher(), secret_token=None)
+    except ValueError:
+        return
+    assert False, "expected ValueError"
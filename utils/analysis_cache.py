@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for photo analysis results.
+A result is stored under every key that identifies its photo: Telegram's
+file_unique_id, the sha256 of the downloaded bytes and a 64-bit dHash of the
+decoded image (which survives re-encoding by Telegram clients). A 64-bit
+dHash can be shared by two different low-texture photos (two plain walls),
+so results are stored with a 16x16 grayscale fingerprint and a lookup by
+content only hits when the fingerprints agree. Every key is
+prefixed with the model tag (backend name and category index version), so
+switching backends or rebuilding the categories starts from a cold cache
+instead of serving labels from the old model. Lookups go to an in-process
+LRU first and then to one MongoDB $in query.
+"""
+import os
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_COLLECTION = os.getenv("ANALYSIS_CACHE_COLLECTION", "photo_analysis_cache")
+MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_ENTRIES", "2000"))
+MEMORY_TTL = int(os.getenv("ANALYSIS_CACHE_MEMORY_TTL", "3600"))
+# Results for an old model tag are never read again and expire through the
+# TTL index on created_at, declared in utils.indexes
+STORE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Mean absolute difference (0-255) between fingerprints of the same photo;
+# JPEG re-encoding stays well under it, different photos go well over
+FINGERPRINT_TOLERANCE = float(os.getenv("ANALYSIS_CACHE_FINGERPRINT_TOLERANCE", "4"))
+FINGERPRINT_SIZE = 16
+
+_MISS = object()
+
+
+def file_key(model, file_unique_id):
+    return f"{model}|file:{file_unique_id}"
+
+
+def content_keys(model, content, image):
+    """sha256 of the raw bytes and dHash of the decoded image"""
+    return [f"{model}|sha256:{hashlib.sha256(content).hexdigest()}",
+            f"{model}|dhash:{dhash(image)}"]
+
+
+def fingerprint(image, size=FINGERPRINT_SIZE):
+    """Tiny grayscale copy of an image, as bytes"""
+    return np.asarray(image.convert("L").resize((size, size), Image.BILINEAR),
+                      dtype=np.uint8).tobytes()
+
+
+def same_photo(a, b, tolerance=FINGERPRINT_TOLERANCE):
+    """Whether two fingerprints come from the same picture"""
+    if a is None or b is None or len(a) != len(b):
+        return False
+    a = np.frombuffer(a, dtype=np.uint8).astype(np.int16)
+    b = np.frombuffer(b, dtype=np.uint8).astype(np.int16)
+    return float(np.abs(a - b).mean()) <= tolerance
+
+
+def dhash(image, size=8):
+    """
+    Difference hash: compares neighbouring pixels of a tiny grayscale copy.
+
+    Returns:
+        str: 16 hex digits for the default 8x8 hash
+    """
+    gray = np.asarray(image.convert("L").resize((size + 1, size), Image.BILINEAR),
+                      dtype=np.int16)
+    bits = 0
+    for bit in (gray[:, :-1] > gray[:, 1:]).flatten():
+        bits = (bits << 1) | int(bit)
+    return f"{bits:0{size * size // 4}x}"
+
+
+class AnalysisCache:
+    """
+    Photo analysis results keyed by photo identity.
+
+    Args:
+        collection: MongoDB collection backing the cache (None = memory only)
+        max_entries (int): In-process LRU size
+        memory_ttl (int): Seconds an entry stays in the LRU
+    """
+
+    def __init__(self, collection=None, max_entries=MEMORY_ENTRIES, memory_ttl=MEMORY_TTL):
+        self.col = collection
+        self._memory = TTLCache(max_entries=max_entries, ttl=memory_ttl)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def get(self, keys, fingerprint=None):
+        """
+        Return the cached result for any of keys, or None.
+
+        Args:
+            fingerprint (bytes): fingerprint() of the photo being looked up;
+                when given, only entries stored with a matching one count
+        """
+        keys = list(keys)
+        for key in keys:
+            entry = self._memory.get(key, _MISS)
+            if entry is not _MISS and self._matches(entry, fingerprint):
+                self._count("memory_hits")
+                # Backfill the other keys so later lookups by them hit too
+                self._remember(keys, entry)
+                return entry["result"]
+
+        if self.col is not None:
+            try:
+                docs = list(self.col.find({"_id": {"$in": keys}}, {"result": 1, "fingerprint": 1}))
+            except Exception as e:
+                logger.warning(f"Analysis cache lookup failed: {str(e)}")
+                docs = []
+            for doc in docs:
+                entry = {"result": doc["result"], "fingerprint": doc.get("fingerprint")}
+                if self._matches(entry, fingerprint):
+                    self._count("store_hits")
+                    self._remember(keys, entry)
+                    self.put(keys, entry["result"], entry["fingerprint"], remember=False)
+                    return entry["result"]
+
+        self._count("misses")
+        return None
+
+    @staticmethod
+    def _matches(entry, fingerprint):
+        return fingerprint is None or same_photo(entry["fingerprint"], fingerprint)
+
+    def put(self, keys, result, fingerprint=None, remember=True):
+        """Store result (and the photo's fingerprint) under every key"""
+        keys = list(keys)
+        entry = {"result": result, "fingerprint": fingerprint}
+        if remember:
+            self._remember(keys, entry)
+        if self.col is None:
+            return
+
+        from pymongo import UpdateOne
+        now = datetime.utcnow()
+        fields = {"result": result, "created_at": now}
+        if fingerprint is not None:
+            fields["fingerprint"] = fingerprint
+        try:
+            self.col.bulk_write([
+                UpdateOne({"_id": key}, {"$setOnInsert": fields}, upsert=True)
+                for key in keys
+            ], ordered=False)
+        except Exception as e:
+            logger.warning(f"Analysis cache write failed: {str(e)}")
+
+    def _remember(self, keys, entry):
+        for key in keys:
+            self._memory.set(key, entry)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.store_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "memory": self._memory.stats(),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """Return the process-wide analysis cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from utils.mongo import get_collection
+                _cache = AnalysisCache(get_collection(CACHE_COLLECTION))
+    return _cache
@@ -0,0 +1,241 @@
+"""
+asyncio-native runtime for the Telegram bot.
+Polling, outbound sends and photo downloads share a single keep-alive httpx
+client (HTTP/2 when the h2 package is installed), so they overlap instead of
+each blocking on its own connection.
+"""
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from utils import telegram_api
+from utils.dispatcher import DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AsyncTelegramAPI:
+    """
+    Non-blocking Telegram client on a pooled httpx.AsyncClient.
+
+    Args:
+        token (str): Bot token
+        base_url (str): API root, overridable for tests
+        max_connections (int): Connection pool size
+    """
+
+    def __init__(self, token=telegram_api.TOKEN, base_url=telegram_api.API_URL,
+                 max_connections=telegram_api.POOL_SIZE):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=httpx.Timeout(10.0)
+        )
+
+    def method_url(self, method):
+        return f"{self.base_url}/bot{self.token}/{method}"
+
+    def file_url(self, file_path):
+        return f"{self.base_url}/file/bot{self.token}/{file_path}"
+
+    async def call(self, method, payload=None, timeout=10):
+        """Call a Bot API method and return Telegram's JSON response"""
+        response = await self.client.post(
+            self.method_url(method), json=payload or {}, timeout=timeout)
+        try:
+            return response.json()
+        except ValueError:
+            return telegram_api._error_result(response.status_code, response.text)
+
+    async def download(self, url, timeout=10, max_bytes=None):
+        """Stream a file, aborting once it exceeds max_bytes"""
+        async with self.client.stream("GET", url, timeout=timeout) as response:
+            response.raise_for_status()
+            telegram_api._check_size(
+                int(response.headers.get("Content-Length") or 0), max_bytes)
+            data = bytearray()
+            async for chunk in response.aiter_bytes(telegram_api.CHUNK_SIZE):
+                data += chunk
+                telegram_api._check_size(len(data), max_bytes)
+            return bytes(data)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class ThreadBridgeAPI:
+    """
+    Blocking facade over AsyncTelegramAPI for handler threads.
+
+    The existing handlers are synchronous; while the async runtime is active
+    they reach Telegram through this bridge so every request rides the
+    runtime's shared client instead of a separate session.
+    """
+
+    def __init__(self, api, loop):
+        self.api = api
+        self.loop = loop
+
+    def method_url(self, method):
+        return self.api.method_url(method)
+
+    def file_url(self, file_path):
+        return self.api.file_url(file_path)
+
+    def call(self, method, payload=None, timeout=10):
+        future = asyncio.run_coroutine_threadsafe(
+            self.api.call(method, payload, timeout), self.loop)
+        return future.result(timeout + 5)
+
+    def download(self, url, timeout=10, max_bytes=None, into=None):
+        future = asyncio.run_coroutine_threadsafe(
+            self.api.download(url, timeout, max_bytes), self.loop)
+        data = future.result(timeout + 5)
+        if into is None:
+            return data
+        into[:] = data
+        return memoryview(into)
+
+    def close(self):
+        pass
+
+
+class AsyncBotRuntime:
+    """
+    Event-loop driven bot runner.
+
+    Long-polls getUpdates on the event loop and runs the synchronous update
+    handler in a thread pool, one serial lane per chat.
+
+    Args:
+        handler (callable): Function called with each update dict
+        prefetch (callable): Optional function called with each polled batch
+            (in the thread pool) before its updates are queued
+        api (AsyncTelegramAPI): Client to use (created if omitted)
+        workers (int): Handler threads
+        max_queue (int): Maximum number of updates waiting to be processed
+        poll_timeout (int): getUpdates long-poll timeout in seconds
+    """
+
+    def __init__(self, handler, prefetch=None, api=None, workers=DEFAULT_WORKERS,
+                 max_queue=DEFAULT_QUEUE_SIZE, poll_timeout=30):
+        self.handler = handler
+        self.prefetch = prefetch
+        self.api = api
+        self.workers = workers
+        self.max_queue = max_queue
+        self.poll_timeout = poll_timeout
+        self.offset = 0
+
+        self._loop = None
+        self._stopping = None
+        self._slots = None
+        self._executor = None
+        self._lanes = {}
+        self._tasks = set()
+
+    async def run(self):
+        """Run until stop() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="update-worker")
+        if self.api is None:
+            self.api = AsyncTelegramAPI()
+
+        previous = telegram_api.set_api(ThreadBridgeAPI(self.api, self._loop))
+        logger.info(
+            f"Async runtime started (http2={HTTP2_AVAILABLE}, workers={self.workers})")
+
+        poller = asyncio.create_task(self._poll())
+        try:
+            await self._stopping.wait()
+        finally:
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+            telegram_api.set_api(previous)
+            await self.api.aclose()
+
+    def stop(self):
+        """Request shutdown; safe to call from any thread"""
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _poll(self):
+        failures = 0
+        while True:
+            try:
+                updates = await self.api.call(
+                    "getUpdates",
+                    {"offset": self.offset + 1, "timeout": self.poll_timeout},
+                    timeout=self.poll_timeout + 5
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Update polling failed: {str(e)}")
+                updates = None
+            else:
+                if not updates.get("ok"):
+                    logger.error(f"getUpdates refused: {updates.get('error_code')} "
+                                 f"{updates.get('description')}")
+                    updates = None
+
+            if updates is None:
+                # Telegram down, token revoked or a webhook still set: don't hammer it
+                failures += 1
+                await asyncio.sleep(telegram_api.poll_delay(failures))
+                continue
+            failures = 0
+
+            results = updates.get("result", [])
+            if results and self.prefetch:
+                await self._loop.run_in_executor(self._executor, self.prefetch, results)
+            for update in results:
+                self.offset = max(self.offset, update["update_id"])
+                await self.submit(update)
+
+    async def submit(self, update):
+        """Queue an update, waiting while max_queue updates are in flight"""
+        await self._slots.acquire()
+
+        chat_id = update_chat_id(update)
+        lane = self._lanes.get(chat_id)
+        if lane is not None:
+            lane.append(update)
+            return
+
+        lane = self._lanes[chat_id] = deque([update])
+        task = asyncio.create_task(self._drain(chat_id, lane))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, chat_id, lane):
+        while lane:
+            update = lane.popleft()
+            try:
+                await self._loop.run_in_executor(self._executor, self.handler, update)
+            except Exception as e:
+                logger.error(
+                    f"Update handler failed for chat {chat_id}: {str(e)}", exc_info=True)
+            finally:
+                self._slots.release()
+        del self._lanes[chat_id]
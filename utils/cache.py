@@ -0,0 +1,129 @@
+"""
+Bounded in-process caches with LRU eviction and per-entry TTL.
+All operations are O(1); memory is capped by max_entries.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe mapping with LRU eviction and expiry.
+
+    Args:
+        max_entries (int): Hard cap on stored entries
+        ttl (float): Seconds an entry stays valid after it is written
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600, clock=time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key, now):
+        """Return a live value or _MISSING (lock held)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at <= now:
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl, now):
+        """Insert or refresh an entry, evicting as needed (lock held)"""
+        self._data[key] = (value, now + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+
+        # Oldest entries first: drop expired ones, then least recently used
+        while len(self._data) > self.max_entries:
+            _, (_, expires_at) = self._data.popitem(last=False)
+            if expires_at <= now:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, self.clock())
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl, self.clock())
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key, self.clock()) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DedupCache(TTLCache):
+    """
+    "Have I seen this key recently?" set built on TTLCache.
+
+    Unlike clearing a set once it grows past a limit, only the oldest keys
+    are forgotten, so there is no burst of duplicates after eviction.
+    """
+
+    def add(self, key, ttl=None):
+        """
+        Record key if it is new.
+
+        Returns:
+            bool: True if the key was new (a miss), False if it is a duplicate
+        """
+        with self._lock:
+            now = self.clock()
+            if self._lookup(key, now) is not _MISSING:
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._store(key, True, ttl, now)
+            return True
+
+    def discard(self, key):
+        self.pop(key)
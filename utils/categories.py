@@ -0,0 +1,328 @@
+"""
+Issue category registry and its precomputed CLIP text embedding index.
+
+Each category document is a classifier label with several prompt variants
+and the service (keyboard button) it belongs to. The prompts are encoded
+once, averaged per category and stored as a float16 matrix, so classifying
+an image is one matrix multiply and adding a category only needs:
+
+    python -m utils.categories add <id> "<name>" --service Plumbing --prompt "..."
+    python -m utils.categories rebuild
+"""
+import os
+import json
+import hashlib
+import logging
+import argparse
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from bson import Binary
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_COLLECTION = os.getenv("CATEGORY_COLLECTION", "issue_categories")
+INDEX_COLLECTION = os.getenv("CATEGORY_INDEX_COLLECTION", "category_index")
+# How often running bots look for a rebuilt index or new keyboard labels
+REFRESH_SECONDS = int(os.getenv("CATEGORY_REFRESH_SECONDS", "60"))
+OTHER_SERVICE = "Other"
+
+DEFAULT_CATEGORIES = [
+    {"_id": "water_leak", "name": "water leak plumbing", "service": "Plumbing", "order": 10,
+     "prompts": ["water leak plumbing", "a photo of a leaking pipe",
+                 "water dripping from a tap or under a sink", "a water stain from a leak"]},
+    {"_id": "electrical", "name": "electrical wiring problem", "service": "Electrical", "order": 20,
+     "prompts": ["electrical wiring problem", "a photo of exposed or burnt wires",
+                 "a damaged power socket or switch board", "a broken light fixture"]},
+    {"_id": "carpentry", "name": "broken furniture carpentry", "service": "Carpentry", "order": 30,
+     "prompts": ["broken furniture carpentry", "a photo of a broken wooden door",
+                 "a damaged cupboard or drawer", "a broken chair or table"]},
+    {"_id": "appliance", "name": "appliance repair", "service": "Appliance Repair", "order": 40,
+     "prompts": ["appliance repair", "a photo of a broken washing machine",
+                 "a faulty refrigerator or air conditioner", "a damaged kitchen appliance"]},
+    {"_id": "painting", "name": "wall crack painting", "service": "Painting", "order": 50,
+     "prompts": ["wall crack painting", "a photo of a cracked wall",
+                 "peeling paint on a wall", "damp patches and mould on a wall"]},
+    {"_id": "roof", "name": "roof damage", "service": OTHER_SERVICE, "order": 60,
+     "prompts": ["roof damage", "a photo of a damaged roof",
+                 "missing or broken roof tiles", "a leaking ceiling"]},
+]
+
+
+def registry_version(categories):
+    """Content hash of the names and prompts an index was built from"""
+    payload = [(c["_id"], c["name"], list(c["prompts"])) for c in categories]
+    return hashlib.sha1(json.dumps(payload).encode()).hexdigest()[:12]
+
+
+def ensemble(prompt_embeds, owners, count):
+    """Average normalized prompt embeddings per category and renormalize"""
+    matrix = np.zeros((count, prompt_embeds.shape[1]), dtype=np.float32)
+    np.add.at(matrix, owners, prompt_embeds)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+class CategoryIndex:
+    """
+    Normalized text embeddings, one row per category.
+
+    Args:
+        names (list): Classifier labels (returned as issue_type)
+        services (list): Service each label belongs to
+        matrix (np.ndarray): (len(names), dim) embeddings
+        logit_scale (float): CLIP's learned temperature
+        version (str): registry_version() of the source categories
+    """
+
+    def __init__(self, names, services, matrix, logit_scale, version=None):
+        self.names = list(names)
+        self.services = list(services)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.logit_scale = float(logit_scale)
+        self.version = version
+
+    @classmethod
+    def build(cls, categories, encode_text, logit_scale):
+        """
+        Encode every prompt variant and ensemble them per category.
+
+        Args:
+            categories (list): Category documents
+            encode_text (callable): list of prompts -> normalized (n, dim) array
+        """
+        prompts, owners = [], []
+        for i, category in enumerate(categories):
+            prompts.extend(category["prompts"])
+            owners.extend([i] * len(category["prompts"]))
+        matrix = ensemble(np.asarray(encode_text(prompts), dtype=np.float32),
+                          np.array(owners), len(categories))
+        return cls([c["name"] for c in categories],
+                   [c.get("service", OTHER_SERVICE) for c in categories],
+                   matrix, logit_scale, registry_version(categories))
+
+    def probabilities(self, image_embeds):
+        """Softmax over categories for normalized image embeddings"""
+        logits = self.logit_scale * (np.asarray(image_embeds, dtype=np.float32) @ self.matrix.T)
+        logits -= logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def to_document(self):
+        return {
+            "names": self.names,
+            "services": self.services,
+            "shape": list(self.matrix.shape),
+            "matrix": Binary(self.matrix.astype(np.float16).tobytes()),
+            "logit_scale": self.logit_scale,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        matrix = np.frombuffer(doc["matrix"], dtype=np.float16).reshape(doc["shape"])
+        return cls(doc["names"], doc["services"], matrix, doc["logit_scale"], doc["version"])
+
+    def save(self, path):
+        np.savez(path, names=np.array(self.names), services=np.array(self.services),
+                 matrix=self.matrix.astype(np.float16), logit_scale=np.float32(self.logit_scale),
+                 version=np.array(self.version or ""))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls([str(n) for n in data["names"]], [str(s) for s in data["services"]],
+                   data["matrix"], float(data["logit_scale"]), str(data["version"]) or None)
+
+
+class CategoryRegistry:
+    """
+    Categories and their embedding index in MongoDB.
+
+    Args:
+        collection: Category documents
+        index_collection: One index document per model
+        model_name (str): Embedding model the index belongs to
+    """
+
+    def __init__(self, collection, index_collection, model_name="openai/clip-vit-base-patch32"):
+        self.col = collection
+        self.index_col = index_collection
+        self.model_name = model_name
+        self._labels = TTLCache(max_entries=1, ttl=REFRESH_SECONDS)
+
+    def active(self):
+        return list(self.col.find({"active": {"$ne": False}}).sort([("order", 1), ("_id", 1)]))
+
+    def seed(self):
+        """Insert the default categories into an empty registry"""
+        if self.col.count_documents({}, limit=1):
+            return 0
+        now = datetime.utcnow()
+        self.col.insert_many([{**c, "active": True, "updated_at": now} for c in DEFAULT_CATEGORIES])
+        return len(DEFAULT_CATEGORIES)
+
+    def upsert(self, category_id, name, service, prompts, order=None):
+        fields = {"name": name, "service": service, "prompts": list(prompts),
+                  "active": True, "updated_at": datetime.utcnow()}
+        if order is not None:
+            fields["order"] = order
+        self.col.update_one({"_id": category_id}, {"$set": fields}, upsert=True)
+        self._labels.clear()
+
+    def deactivate(self, category_id):
+        self.col.update_one({"_id": category_id}, {"$set": {"active": False}})
+        self._labels.clear()
+
+    def service_labels(self):
+        """Keyboard buttons: each service once, in category order, Other last"""
+        labels = self._labels.get("services")
+        if labels is None:
+            labels = []
+            # An unseeded registry shows the built-in categories
+            for category in self.active() or DEFAULT_CATEGORIES:
+                service = category.get("service", OTHER_SERVICE)
+                if service not in labels and service != OTHER_SERVICE:
+                    labels.append(service)
+            labels.append(OTHER_SERVICE)
+            self._labels.set("services", labels)
+        return labels
+
+    def rebuild_index(self, encode_text, logit_scale):
+        """Encode the active categories and store the index"""
+        index = CategoryIndex.build(self.active(), encode_text, logit_scale)
+        self.index_col.replace_one(
+            {"_id": self.model_name},
+            {**index.to_document(), "built_at": datetime.utcnow()},
+            upsert=True)
+        logger.info(f"Built category index {index.version} ({len(index.names)} categories)")
+        return index
+
+    def index_version(self):
+        doc = self.index_col.find_one({"_id": self.model_name}, {"version": 1})
+        return doc["version"] if doc else None
+
+    def load_index(self):
+        doc = self.index_col.find_one({"_id": self.model_name})
+        return CategoryIndex.from_document(doc) if doc else None
+
+
+class IndexSource:
+    """
+    Current category index for the classifier, picking up rebuilds.
+
+    The stored version is checked at most every REFRESH_SECONDS; the matrix
+    is only fetched when it changed. Without a registry (or before the
+    first rebuild) the fallback index is used.
+
+    Args:
+        registry (CategoryRegistry): None to always use the fallback
+        fallback (callable): Returns a CategoryIndex
+    """
+
+    def __init__(self, registry, fallback, refresh=REFRESH_SECONDS, clock=time.monotonic):
+        self.registry = registry
+        self.fallback = fallback
+        self.refresh = refresh
+        self.clock = clock
+        self._index = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            now = self.clock()
+            if self._checked_at is None or now - self._checked_at >= self.refresh:
+                self._checked_at = now
+                self._index = self._latest() or self._index or self.fallback()
+            return self._index
+
+    def _latest(self):
+        if self.registry is None:
+            return None
+        try:
+            version = self.registry.index_version()
+            if version is None:
+                return None
+            if self._index is not None and self._index.version == version:
+                return self._index
+            index = self.registry.load_index()
+            logger.info(f"Loaded category index {index.version} ({len(index.names)} categories)")
+            return index
+        except Exception as e:
+            logger.warning(f"Category index unavailable, keeping current one: {str(e)}")
+            return None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_category_registry():
+    """Return the process-wide registry on the main database"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from utils.db import db
+                _registry = CategoryRegistry(db[CATEGORY_COLLECTION], db[INDEX_COLLECTION])
+    return _registry
+
+
+def service_labels():
+    """Category keyboard labels, falling back to the defaults if the registry is unreachable"""
+    try:
+        return get_category_registry().service_labels()
+    except Exception as e:
+        logger.warning(f"Category registry unavailable: {str(e)}")
+        labels = [c["service"] for c in DEFAULT_CATEGORIES if c["service"] != OTHER_SERVICE]
+        return list(dict.fromkeys(labels)) + [OTHER_SERVICE]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage issue categories")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("seed", help="Insert the default categories if none exist")
+    commands.add_parser("list", help="Show active categories")
+    commands.add_parser("rebuild", help="Re-encode prompts and store the embedding index")
+    add = commands.add_parser("add", help="Add or update a category")
+    add.add_argument("id")
+    add.add_argument("name", help="Label reported as the detected issue")
+    add.add_argument("--service", default=OTHER_SERVICE, help="Keyboard button it belongs to")
+    add.add_argument("--prompt", action="append", required=True, help="Prompt variant (repeatable)")
+    add.add_argument("--order", type=int)
+    remove = commands.add_parser("remove", help="Deactivate a category")
+    remove.add_argument("id")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    registry = get_category_registry()
+
+    if args.command == "seed":
+        print(f"Inserted {registry.seed()} categories")
+    elif args.command == "list":
+        for c in registry.active():
+            print(f"{c['_id']:<24} {c.get('service', OTHER_SERVICE):<18} {c['name']} ({len(c['prompts'])} prompts)")
+        print(f"Index version: {registry.index_version()}")
+    elif args.command == "add":
+        # Keep the built-in categories alongside the first custom one
+        registry.seed()
+        registry.upsert(args.id, args.name, args.service, args.prompt, args.order)
+        print("Saved; run 'rebuild' to update the classifier")
+    elif args.command == "remove":
+        registry.deactivate(args.id)
+        print("Deactivated; run 'rebuild' to update the classifier")
+    elif args.command == "rebuild":
+        from utils.image_processing import TorchClipBackend
+        backend = TorchClipBackend()
+        registry.seed()
+        index = registry.rebuild_index(backend.encode_text, backend.logit_scale())
+        print(f"Index {index.version}: {len(index.names)} categories, {index.matrix.shape[1]} dims")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""
+ONNX Runtime backend for photo classification.
+The CLIP vision tower is exported once to ONNX (optionally int8 dynamically
+quantized) together with an index of the built-in categories, so the bot
+hosts can classify photos on CPU without importing torch. Categories from
+the registry (utils.categories) are used instead once an index is built.
+
+Export (needs torch + transformers, run once per model or category change):
+    python -m utils.clip_onnx export --out models/clip-onnx --quantize
+"""
+import os
+import argparse
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+ONNX_DIR = os.getenv("CLIP_ONNX_DIR", "models/clip-onnx")
+ONNX_THREADS = int(os.getenv("CLIP_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+VISION_FILE = "vision.onnx"
+VISION_INT8_FILE = "vision.int8.onnx"
+INDEX_FILE = "category_index.npz"
+
+# CLIPImageProcessor settings for openai/clip-vit-base-patch32
+IMAGE_SIZE = 224
+IMAGE_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+IMAGE_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+def preprocess(images, size=IMAGE_SIZE):
+    """
+    Resize (shortest side, bicubic), center crop and normalize like CLIPProcessor.
+
+    Returns:
+        np.ndarray: float32 batch of shape (n, 3, size, size)
+    """
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    for i, img in enumerate(images):
+        img = img.convert("RGB")
+        width, height = img.size
+        scale = size / min(width, height)
+        resized = (max(size, round(width * scale)), max(size, round(height * scale)))
+        img = img.resize(resized, Image.BICUBIC)
+
+        left = (resized[0] - size) // 2
+        top = (resized[1] - size) // 2
+        img = img.crop((left, top, left + size, top + size))
+
+        pixels = np.asarray(img, dtype=np.float32) / 255.0
+        batch[i] = ((pixels - IMAGE_MEAN) / IMAGE_STD).transpose(2, 0, 1)
+    return batch
+
+
+class OnnxClipBackend:
+    """
+    CLIP image embeddings from the exported vision graph in onnxruntime.
+
+    Args:
+        model_dir (str): Directory written by export_model()
+        quantized (bool): Use the int8 graph instead of fp32
+    """
+
+    def __init__(self, model_dir=ONNX_DIR, quantized=False):
+        self.model_dir = model_dir
+        self.quantized = quantized
+        # Same value as CLIP_BACKEND; stats and analysis cache keys use it
+        self.name = "onnx-int8" if quantized else "onnx"
+        self._session = None
+
+    def _load(self):
+        if self._session is not None:
+            return
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        graph = VISION_INT8_FILE if self.quantized else VISION_FILE
+
+        self._session = ort.InferenceSession(
+            os.path.join(self.model_dir, graph), options,
+            providers=["CPUExecutionProvider"])
+        logger.info(f"Loaded ONNX CLIP graph {graph} from {self.model_dir}")
+
+    def warm_up(self):
+        self._load()
+
+    def image_embeddings(self, images):
+        """Normalized image embeddings, shape (len(images), dim)"""
+        self._load()
+        return self._session.run(["image_embeds"], {"pixel_values": preprocess(images)})[0]
+
+    def default_index(self):
+        """Built-in categories as encoded at export time"""
+        from utils.categories import CategoryIndex
+        return CategoryIndex.load(os.path.join(self.model_dir, INDEX_FILE))
+
+
+def export_model(out_dir=ONNX_DIR, quantize=False, opset=17):
+    """
+    Export the vision tower and built-in category index for OnnxClipBackend.
+
+    Args:
+        out_dir (str): Output directory
+        quantize (bool): Also write an int8 dynamically quantized graph
+    """
+    import torch
+    from utils.image_processing import TorchClipBackend, load_model
+
+    model, _ = load_model()
+    os.makedirs(out_dir, exist_ok=True)
+
+    class VisionEmbeddings(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            embeds = self.clip.get_image_features(pixel_values=pixel_values)
+            return embeds / embeds.norm(dim=-1, keepdim=True)
+
+    vision_path = os.path.join(out_dir, VISION_FILE)
+    dummy = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    torch.onnx.export(
+        VisionEmbeddings(model).eval(), (dummy,), vision_path,
+        input_names=["pixel_values"], output_names=["image_embeds"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+        opset_version=opset
+    )
+
+    TorchClipBackend().default_index().save(os.path.join(out_dir, INDEX_FILE))
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(vision_path, os.path.join(out_dir, VISION_INT8_FILE),
+                         weight_type=QuantType.QInt8)
+
+    logger.info(f"Exported CLIP vision graph to {out_dir} (int8={quantize})")
+    return out_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export CLIP for the ONNX backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export the vision graph and built-in category index")
+    export.add_argument("--out", default=ONNX_DIR)
+    export.add_argument("--quantize", action="store_true",
+                        help="Also write an int8 dynamically quantized graph")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        export_model(args.out, quantize=args.quantize)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,12 +1,14 @@
 """
 Database connection module for KommunityKonect
 Handles MongoDB connection and collections
+
+Importing this module does no network I/O: the collections below are
+handles on the shared client, which connects in the background and makes
+the first operation wait for the server. Call connect_to_db() where a
+process must not start without the database (the bot does); use
+health_check() to report on it.
 """
-import os
-import sys
 import logging
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ConfigurationError
 from dotenv import load_dotenv
 
 # Configure logging
@@ -19,64 +21,33 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# MongoDB connection string
-MONGO_URI = os.getenv("MONGODB_URI")
-DB_NAME = os.getenv("DB_NAME", "kommunity_konect")
-
-# Initialize connection and collections
-client = None
-db = None
-requests_col = None
-users_col = None
-schedules_col = None
-calendar_config_col = None
-
-
-def connect_to_db():
-    """Establish connection to MongoDB"""
-    global client, db, requests_col, users_col, schedules_col, calendar_config_col
-
-    if not MONGO_URI:
-        logger.error("MONGO_URI environment variable is not set")
-        sys.exit(
-            "MongoDB connection string not found. Please set MONGO_URI environment variable.")
-
-    try:
-        # Create a MongoDB client with increased timeout
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-
-        # Verify connection works by pinging the server
-        client.admin.command('ping')
-
-        logger.info("Connected to MongoDB successfully")
-
-        # Get database and collections
-        db = client[DB_NAME]
-        requests_col = db["service_requests"]
-        users_col = db["users"]
-        schedules_col = db["schedules"]
-        calendar_config_col = db["calendar_config"]
+# Connection settings and the pooled client live in utils.mongo
+from utils.mongo import (MONGO_URI, DB_NAME, SERVICE_REQUESTS, USERS, SCHEDULES,
+                         CALENDAR_CONFIG, get_client, connect, health_check)
 
-        # Create indexes if they don't exist
-        requests_col.create_index("user_id")
-        requests_col.create_index("status")
-        users_col.create_index("username", unique=True)
-        users_col.create_index("telegram_id", unique=True)
+if not MONGO_URI:
+    logger.error("MONGODB_URI environment variable is not set; using mongodb://localhost:27017")
 
-        return True
+# Collections on the shared client
+client = get_client(MONGO_URI)
+db = client[DB_NAME]
+requests_col = db[SERVICE_REQUESTS]
+users_col = db[USERS]
+schedules_col = db[SCHEDULES]
+calendar_config_col = db[CALENDAR_CONFIG]
 
-    except ConnectionFailure as e:
-        logger.error(f"Could not connect to MongoDB: {e}")
-        sys.exit(f"Database connection failed: {e}")
 
-    except ConfigurationError as e:
-        logger.error(f"MongoDB configuration error: {e}")
-        sys.exit(f"Database configuration error: {e}")
+def connect_to_db(**retry_options):
+    """
+    Wait for MongoDB to answer, retrying with exponential backoff.
 
-    except Exception as e:
-        logger.error(f"Unexpected error connecting to MongoDB: {e}")
-        sys.exit(f"Unexpected database error: {e}")
+    Indexes are not touched here; they are synced out of band with
+    `python -m utils.indexes sync` (the bot also adds missing ones at start).
 
+    Args:
+        **retry_options: retries, backoff, max_backoff (see utils.mongo.connect)
 
-# Connect to database on module load
-connect_to_db()
+    Returns:
+        bool: True if connected, False if MongoDB stayed unreachable
+    """
+    return connect(MONGO_URI, **retry_options)
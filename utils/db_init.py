@@ -1,31 +1,24 @@
 """
 Database initialization script to properly setup collections and indexes
 """
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import OperationFailure
+from utils.mongo import get_client, DB_NAME, MONGO_URI
+from utils.indexes import sync_indexes
 
 # Connect to MongoDB
 
 
-def init_database(connection_string="mongodb://localhost:27017/"):
-    client = MongoClient(connection_string)
-    db = client["kommunity_konect"]
+def init_database(connection_string=None):
+    client = get_client(connection_string or MONGO_URI or "mongodb://localhost:27017/")
+    db = client[DB_NAME]
 
-    # Initialize users collection with proper indexes
-    users_col = db["users"]
-
-    # Create indexes
-    try:
-        # Drop the existing telegram_id index that's causing issues
-        users_col.drop_index("telegram_id_1")
-        print("Dropped existing telegram_id index")
-    except OperationFailure:
-        print("No existing telegram_id index to drop")
-
-    # Create a new index that allows for sparse values
-    users_col.create_index([("telegram_id", ASCENDING)],
-                           unique=True, sparse=True)
-    users_col.create_index([("username", ASCENDING)], unique=True)
+    # Indexes come from the spec in utils.indexes; this also replaces the old
+    # non-sparse unique telegram_id index with the sparse one
+    result = sync_indexes(db)
+    for name, plan in result.items():
+        for model in plan["create"] + plan["rebuild"]:
+            print(f"Built {name}.{model.document['name']}")
+        for index in plan["drop"]:
+            print(f"Dropped {name}.{index}")
 
     print("Database initialized with proper indexes")
     return client
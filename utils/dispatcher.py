@@ -0,0 +1,186 @@
+"""
+Concurrent update dispatcher for the Telegram bot.
+Fans updates out to a bounded worker pool while keeping one serial lane per chat,
+so a slow handler (photo analysis, LLM call) only delays its own chat.
+"""
+import os
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.getenv("BOT_WORKERS", "8"))
+DEFAULT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "1000"))
+
+
+def update_chat_id(update):
+    """Return the chat an update belongs to (None if it has no chat)"""
+    message = update.get("message") or update.get("edited_message")
+    if message:
+        return message.get("chat", {}).get("id")
+
+    query = update.get("callback_query")
+    if query and query.get("message"):
+        return query["message"].get("chat", {}).get("id")
+
+    return None
+
+
+class UpdateDispatcher:
+    """
+    Bounded worker pool with per-chat ordering.
+
+    Updates for the same chat are processed strictly in arrival order by one
+    worker at a time; updates for different chats run in parallel.
+
+    Args:
+        handler (callable): Function called with each update dict
+        workers (int): Number of worker threads
+        max_queue (int): Maximum number of updates waiting to be processed
+    """
+
+    def __init__(self, handler, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_SIZE):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._has_work = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+
+        # chat_id -> deque of pending updates for that chat
+        self._lanes = {}
+        # chats with pending updates that no worker currently owns
+        self._ready = deque()
+        # chats currently being processed by a worker
+        self._active = set()
+        self._pending = 0
+        self._running = False
+        self._threads = []
+
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the worker threads"""
+        with self._lock:
+            if self._running:
+                return self
+            self._running = True
+
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"update-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(
+            f"Update dispatcher started with {self.workers} workers (queue size {self.max_queue})")
+        return self
+
+    def submit(self, update, block=True, timeout=None):
+        """
+        Queue an update for processing.
+
+        Blocks while the queue is full unless block is False.
+
+        Returns:
+            bool: True if queued, False if the queue stayed full
+        """
+        chat_id = update_chat_id(update)
+
+        with self._not_full:
+            if self._pending >= self.max_queue:
+                if not block:
+                    return False
+                if not self._not_full.wait_for(
+                        lambda: self._pending < self.max_queue, timeout):
+                    return False
+
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                lane = self._lanes[chat_id] = deque()
+            lane.append(update)
+            self._pending += 1
+
+            # A chat goes on the ready list only if no worker owns it already
+            if chat_id not in self._active and len(lane) == 1:
+                self._ready.append(chat_id)
+                self._has_work.notify()
+
+        return True
+
+    def _next_update(self, chat_id):
+        """Pop the next update for a chat, or release the lane (lock held)"""
+        lane = self._lanes.get(chat_id)
+        if lane:
+            return lane.popleft()
+
+        self._lanes.pop(chat_id, None)
+        self._active.discard(chat_id)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._has_work:
+                self._has_work.wait_for(
+                    lambda: self._ready or not self._running)
+                if not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+                self._active.add(chat_id)
+                update = self._next_update(chat_id)
+
+            # Drain this chat's lane so its updates stay in order
+            while update is not None:
+                try:
+                    self.handler(update)
+                    ok = True
+                except Exception as e:
+                    ok = False
+                    logger.error(
+                        f"Update handler failed for chat {chat_id}: {str(e)}", exc_info=True)
+
+                with self._lock:
+                    if ok:
+                        self.processed += 1
+                    else:
+                        self.failed += 1
+                    self._pending -= 1
+                    self._not_full.notify()
+                    if self._pending == 0:
+                        self._idle.notify_all()
+                    update = self._next_update(chat_id)
+
+    def join(self, timeout=None):
+        """Wait until every queued update has been processed"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def stop(self, timeout=None):
+        """Finish queued work and stop the worker threads"""
+        self.join(timeout)
+        with self._lock:
+            self._running = False
+            self._has_work.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        """Snapshot of dispatcher counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._pending,
+                "active_chats": len(self._active),
+                "processed": self.processed,
+                "failed": self.failed,
+            }
@@ -0,0 +1,219 @@
+"""
+Duplicate issue detection from photo embeddings.
+Requests are indexed by their CLIP image embedding, partitioned by
+normalized location, and searched within a time window: several residents
+photographing the same burst pipe within the hour land close together.
+
+The index is a flat inner-product search per location partition (the
+partitions act as IVF-style coarse cells), kept in memory, persisted with
+np.savez and rebuilt from MongoDB when no snapshot exists.
+
+Requests are checked once their photo has been classified, by the
+background PhotoAnalysisWorker (utils/photo_analysis.py), not while
+handle_photo answers the resident: the embedding only exists after the
+model has run.
+"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.service_requests import to_datetime, LEGACY_TIME_FORMAT
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.92"))
+DUPLICATE_WINDOW_HOURS = float(os.getenv("DUPLICATE_WINDOW_HOURS", "6"))
+DUPLICATE_INDEX_PATH = os.getenv("DUPLICATE_INDEX_PATH", "models/duplicate_index.npz")
+EMBEDDING_DTYPE = np.float16
+
+def location_key(location):
+    """Partition key: lowercase words only, so "Block B, flat 4" == "block b flat 4" """
+    return " ".join(re.findall(r"[a-z0-9]+", (location or "").lower()))
+
+
+def request_time(timestamp):
+    """Epoch seconds for a request's stored timestamp (UTC string or naive UTC datetime)"""
+    timestamp = to_datetime(timestamp)
+    if timestamp is None:
+        return time.time()
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def encode_embedding(vector):
+    """Compact bytes for storing an embedding on a request (float16)"""
+    return np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embedding(data):
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE).astype(np.float32)
+
+
+class _Partition:
+    """Growable arrays for one location"""
+
+    def __init__(self, dim, capacity=16):
+        self.size = 0
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.ids = []
+
+    def add(self, request_id, timestamp, vector):
+        if self.size == len(self.times):
+            capacity = 2 * len(self.times)
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.times = np.resize(self.times, capacity)
+        self.vectors[self.size] = vector
+        self.times[self.size] = timestamp
+        self.ids.append(request_id)
+        self.size += 1
+
+    def keep(self, mask):
+        kept = int(mask.sum())
+        self.vectors[:kept] = self.vectors[:self.size][mask]
+        self.times[:kept] = self.times[:self.size][mask]
+        self.ids = [i for i, k in zip(self.ids, mask) if k]
+        self.size = kept
+
+
+class DuplicateIndex:
+    """
+    Windowed nearest-neighbour search over request photo embeddings.
+
+    Args:
+        dim (int): Embedding size
+        threshold (float): Cosine similarity at or above which requests match
+        window_hours (float): Only requests this close in time can match
+    """
+
+    def __init__(self, dim=512, threshold=DUPLICATE_THRESHOLD,
+                 window_hours=DUPLICATE_WINDOW_HOURS):
+        self.dim = dim
+        self.threshold = threshold
+        self.window = window_hours * 3600
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(p.size for p in self._partitions.values())
+
+    def add(self, request_id, location, timestamp, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / np.linalg.norm(vector)
+        key = location_key(location)
+        with self._lock:
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self.dim)
+            partition.add(str(request_id), timestamp, vector)
+
+    def search(self, location, timestamp, vector, k=3, exclude=None):
+        """
+        Find likely duplicates of a new request.
+
+        Returns:
+            list: (request_id, similarity) pairs, most similar first
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / np.linalg.norm(vector)
+        with self._lock:
+            partition = self._partitions.get(location_key(location))
+            if partition is None or partition.size == 0:
+                return []
+            scores = partition.vectors[:partition.size] @ vector
+            in_window = np.abs(partition.times[:partition.size] - timestamp) <= self.window
+            candidates = np.flatnonzero(in_window & (scores >= self.threshold))
+            ranked = candidates[np.argsort(-scores[candidates])]
+            matches, seen = [], {str(exclude)}
+            for i in ranked:
+                if partition.ids[i] not in seen:
+                    seen.add(partition.ids[i])
+                    matches.append((partition.ids[i], float(scores[i])))
+                    if len(matches) == k:
+                        break
+        return matches
+
+    def prune(self, now=None):
+        """Forget requests too old to match anything new"""
+        cutoff = (now or time.time()) - self.window
+        removed = 0
+        with self._lock:
+            for key in list(self._partitions):
+                partition = self._partitions[key]
+                mask = partition.times[:partition.size] >= cutoff
+                removed += partition.size - int(mask.sum())
+                partition.keep(mask)
+                if partition.size == 0:
+                    del self._partitions[key]
+        return removed
+
+    def save(self, path=DUPLICATE_INDEX_PATH):
+        with self._lock:
+            keys, ids, times, vectors = [], [], [], []
+            for key, partition in self._partitions.items():
+                keys.extend([key] * partition.size)
+                ids.extend(partition.ids)
+                times.append(partition.times[:partition.size])
+                vectors.append(partition.vectors[:partition.size])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path, keys=np.array(keys), ids=np.array(ids),
+            times=np.concatenate(times) if times else np.empty(0),
+            vectors=(np.concatenate(vectors) if vectors
+                     else np.empty((0, self.dim))).astype(EMBEDDING_DTYPE),
+            saved_at=np.float64(time.time())
+        )
+
+    @classmethod
+    def load(cls, path=DUPLICATE_INDEX_PATH, **kwargs):
+        data = np.load(path)
+        index = cls(dim=data["vectors"].shape[1] if data["vectors"].size else 512, **kwargs)
+        for key, request_id, timestamp, vector in zip(
+                data["keys"], data["ids"], data["times"], data["vectors"]):
+            # Keys are already normalized, and location_key is idempotent
+            index.add(str(request_id), str(key), float(timestamp), vector)
+        index.saved_at = float(data["saved_at"])
+        return index
+
+    @classmethod
+    def from_requests(cls, requests_col, since=None, **kwargs):
+        """Rebuild from requests that have a stored photo embedding"""
+        index = cls(**kwargs)
+        since = since if since is not None else time.time() - index.window
+        cutoff = datetime.fromtimestamp(since, timezone.utc).replace(tzinfo=None)
+        # Requests store datetimes; ones saved before that keep a UTC string
+        cursor = requests_col.find(
+            {"photo_embedding": {"$exists": True},
+             "$or": [{"timestamp": {"$gte": cutoff}},
+                     {"timestamp": {"$gte": cutoff.strftime(LEGACY_TIME_FORMAT)}}]},
+            {"location": 1, "timestamp": 1, "photo_embedding": 1}
+        )
+        for req in cursor:
+            vector = decode_embedding(req["photo_embedding"])
+            index.dim = len(vector)
+            index.add(req["_id"], req.get("location"), request_time(req.get("timestamp")), vector)
+        return index
+
+
+def load_duplicate_index(requests_col, path=DUPLICATE_INDEX_PATH):
+    """Snapshot from disk if present, topped up or rebuilt from MongoDB"""
+    if os.path.exists(path):
+        try:
+            index = DuplicateIndex.load(path)
+            # Requests embedded shortly before the snapshot may be missing from it;
+            # re-reading a margin is harmless because search() skips repeated ids
+            recent = DuplicateIndex.from_requests(requests_col, since=index.saved_at - 600)
+            for key, partition in recent._partitions.items():
+                for i in range(partition.size):
+                    index.add(partition.ids[i], key, partition.times[i], partition.vectors[i])
+            index.prune()
+            return index
+        except Exception as e:
+            logger.warning(f"Could not load duplicate index from {path}: {str(e)}")
+    return DuplicateIndex.from_requests(requests_col)
@@ -1,11 +1,21 @@
-import requests
 from PIL import Image
-from io import BytesIO
-from transformers import CLIPProcessor, CLIPModel
-from huggingface_hub import login
-import torch
+import io
 import os
+import logging
+import time
+import queue
+import threading
+from concurrent.futures import Future
 from dotenv import load_dotenv
+from utils.telegram_api import get_api
+from utils.metrics import LatencyWindow
+from utils.analysis_cache import file_key, content_keys, fingerprint
+from utils.duplicates import encode_embedding
+from utils.categories import (
+    DEFAULT_CATEGORIES, CategoryIndex, IndexSource, get_category_registry
+)
+
+logger = logging.getLogger(__name__)
 
 # Disable symlinks warning
 os.environ['HF_HUB_DISABLE_SYMLINKS_WARNING'] = '1'
@@ -13,53 +23,367 @@ os.environ['HF_HUB_DISABLE_SYMLINKS_WARNING'] = '1'
 # Initialize environment
 load_dotenv()
 
-# Authenticate with Hugging Face
-login(token=os.getenv("HUGGINGFACE_TOKEN"))
+MODEL_NAME = "openai/clip-vit-base-patch32"
 
-# Load model with new token parameter
-model = CLIPModel.from_pretrained(
-    "openai/clip-vit-base-patch32",
-    token=os.getenv("HUGGINGFACE_TOKEN")
-)
-processor = CLIPProcessor.from_pretrained(
-    "openai/clip-vit-base-patch32",
-    token=os.getenv("HUGGINGFACE_TOKEN")
-)
+# torch, transformers and the CLIP weights are loaded on first use
+model = None
+processor = None
+_model_lock = threading.Lock()
 
-ISSUE_CATEGORIES = [
-    "water leak plumbing",
-    "electrical wiring problem",
-    "broken furniture carpentry",
-    "wall crack painting",
-    "appliance repair",
-    "roof damage"
-]
 
+def load_model():
+    """
+    Import torch/transformers and load CLIP once per process.
 
-def analyze_telegram_photo(photo_url):
-    """Analyze home service issues from photos"""
-    try:
-        response = requests.get(photo_url, timeout=10)
-        img = Image.open(BytesIO(response.content))
-
-        inputs = processor(
-            text=ISSUE_CATEGORIES,
-            images=img,
-            return_tensors="pt",
-            padding=True,
-            truncation=True
-        )
-
-        with torch.no_grad():
-            outputs = model(**inputs)
-            probs = outputs.logits_per_image.softmax(dim=1)
-            top_prob, top_idx = torch.max(probs, dim=1)
+    Returns:
+        tuple: (model, processor)
+    """
+    global model, processor
+    if model is None:
+        with _model_lock:
+            if model is None:
+                from transformers import CLIPProcessor, CLIPModel
+                from huggingface_hub import login
+
+                token = os.getenv("HUGGINGFACE_TOKEN")
+                # Authenticate with Hugging Face
+                if token:
+                    login(token=token)
+
+                loaded_processor = CLIPProcessor.from_pretrained(MODEL_NAME, token=token)
+                loaded_model = CLIPModel.from_pretrained(MODEL_NAME, token=token)
+                loaded_model.eval()
+                processor, model = loaded_processor, loaded_model
+    return model, processor
+
+
+# Labels of the built-in categories; the live set comes from the registry
+ISSUE_CATEGORIES = [c["name"] for c in DEFAULT_CATEGORIES]
+
+
+# Micro-batching: wait up to MAX_WAIT_MS for up to MAX_BATCH images
+MAX_BATCH = int(os.getenv("CLIP_MAX_BATCH", "8"))
+MAX_WAIT_MS = float(os.getenv("CLIP_MAX_WAIT_MS", "20"))
+INFERENCE_TIMEOUT = 60
+
+# Telegram caps bot photo downloads well below this; larger files are refused
+MAX_PHOTO_BYTES = int(os.getenv("PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+# JPEGs are decoded at the smallest DCT scale that keeps both sides >= this
+# (the CLIP input size), instead of at full camera resolution
+DECODE_SIZE = int(os.getenv("PHOTO_DECODE_SIZE", "224"))
+
+# "torch" (default), "onnx" or "onnx-int8"; see utils/clip_onnx.py
+CLIP_BACKEND = os.getenv("CLIP_BACKEND", "torch")
+
+
+class TorchClipBackend:
+    """CLIP in PyTorch: image embeddings for classification, text embeddings for index builds"""
+
+    name = "torch"
+
+    def encode_text(self, prompts):
+        """Normalized text embeddings, shape (len(prompts), dim)"""
+        import torch
+        model, processor = load_model()
+        inputs = processor(text=list(prompts), return_tensors="pt",
+                           padding=True, truncation=True)
+        with torch.inference_mode():
+            embeds = model.get_text_features(**inputs)
+            return (embeds / embeds.norm(dim=-1, keepdim=True)).numpy()
+
+    def logit_scale(self):
+        model, _ = load_model()
+        return float(model.logit_scale.exp().item())
+
+    def image_embeddings(self, images):
+        """Normalized image embeddings, shape (len(images), dim)"""
+        import torch
+        model, processor = load_model()
+        inputs = processor(images=images, return_tensors="pt")
+        with torch.inference_mode():
+            embeds = model.get_image_features(**inputs)
+            return (embeds / embeds.norm(dim=-1, keepdim=True)).numpy()
+
+    def default_index(self):
+        """Index of the built-in categories, encoded locally"""
+        return CategoryIndex.build(DEFAULT_CATEGORIES, self.encode_text, self.logit_scale())
+
+    def warm_up(self):
+        load_model()
+
+
+def create_backend(name=None):
+    """Build the classifier backend selected by CLIP_BACKEND"""
+    name = name or CLIP_BACKEND
+    if name == "torch":
+        return TorchClipBackend()
+    if name in ("onnx", "onnx-int8"):
+        from utils.clip_onnx import OnnxClipBackend
+        return OnnxClipBackend(quantized=name == "onnx-int8")
+    raise ValueError(f"Unknown CLIP_BACKEND: {name}")
+
+
+class ClipInferenceService:
+    """
+    Batches image classification requests into single CLIP forward passes.
+
+    Each batch runs only the vision side; scoring against the category
+    index (precomputed text embeddings) is a single matrix multiply.
+
+    Args:
+        backend: Object with image_embeddings(images), default_index() and
+            warm_up(); defaults to the one selected by CLIP_BACKEND
+        index: CategoryIndex, or a callable returning the current one
+            (e.g. an IndexSource); defaults to the backend's built-in index
+        max_batch (int): Most images per forward pass
+        max_wait_ms (float): How long the first image waits for company
+    """
+
+    def __init__(self, backend=None, index=None, max_batch=MAX_BATCH,
+                 max_wait_ms=MAX_WAIT_MS):
+        self.backend = backend or create_backend()
+        if index is None:
+            index = IndexSource(None, self.backend.default_index)
+        self.index = index if callable(index) else (lambda: index)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.latency = LatencyWindow()
+        self.images = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="clip-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def classify(self, image):
+        """
+        Queue a PIL image for classification.
+
+        Returns:
+            Future: Resolves to (category, confidence percent, image embedding)
+        """
+        self.start()
+        future = Future()
+        self._queue.put((image, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        """Block for one job, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            try:
+                results = self.predict([image for image, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.monotonic()
+            with self._lock:
+                self.images += len(batch)
+                self.batches += 1
+                self.busy_seconds += finished - started
+            for (_, future, enqueued_at), result in zip(batch, results):
+                self.latency.record(finished - enqueued_at)
+                future.set_result(result)
+
+    def predict(self, images):
+        """Classify a list of images in one forward pass"""
+        index = self.index()
+        embeds = self.backend.image_embeddings(images)
+        probs = index.probabilities(embeds)
+        top_idx = probs.argmax(axis=-1)
+        return [(index.names[int(i)], float(row[i]) * 100, embedding)
+                for row, i, embedding in zip(probs, top_idx, embeds)]
+
+    def model_tag(self):
+        """Backend and category index version; cached results are keyed by it"""
+        return f"{self.backend.name}:{self.index().version}"
 
+    def stats(self):
+        """Throughput, batch fill and end-to-end latency percentiles"""
+        with self._lock:
+            images, batches, busy = self.images, self.batches, self.busy_seconds
         return {
-            "issue_type": ISSUE_CATEGORIES[top_idx],
-            "confidence": float(top_prob) * 100,
+            "backend": self.backend.name,
+            "index_version": self.index().version,
+            "images": images,
+            "batches": batches,
+            "mean_batch_size": round(images / batches, 2) if batches else None,
+            "images_per_second": round(images / busy, 2) if busy else None,
+            "queued": self._queue.qsize(),
+            "latency": self.latency.summary(),
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def _registry():
+    """The category registry, or None when the database is unavailable"""
+    try:
+        return get_category_registry()
+    except Exception as e:
+        logger.warning(f"Category registry unavailable, using built-in categories: {str(e)}")
+        return None
+
+
+def get_inference_service():
+    """Return the process-wide CLIP batcher"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                backend = create_backend()
+                _service = ClipInferenceService(
+                    backend, IndexSource(_registry(), backend.default_index))
+    return _service
+
+
+def inference_stats():
+    """Batcher stats, or None if no photo has been classified in this process"""
+    service = _service
+    return service.stats() if service is not None else None
+
+
+def warm_up():
+    """Load the model and category embeddings ahead of the first photo"""
+    service = get_inference_service()
+    service.backend.warm_up()
+    service.index()
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a memoryview, so PIL decodes without a copy"""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+# One download buffer per worker thread, reused across photos
+_buffers = threading.local()
+
+
+def download_photo(photo_url, max_bytes=MAX_PHOTO_BYTES):
+    """
+    Stream a photo into this thread's reusable buffer.
+
+    Returns:
+        memoryview: Valid until the next download on this thread; release()
+        it when done
+    """
+    buffer = getattr(_buffers, "data", None)
+    if buffer is None:
+        buffer = _buffers.data = bytearray()
+    return get_api().download(photo_url, timeout=10, max_bytes=max_bytes, into=buffer)
+
+
+def decode_image(data, size=DECODE_SIZE):
+    """Decode to RGB, letting libjpeg downscale while decoding"""
+    img = Image.open(_BufferReader(data))
+    if img.format == "JPEG" and size:
+        img.draft("RGB", (size, size))
+    return img.convert("RGB")
+
+
+def analyze_telegram_photo(photo_url, file_unique_id=None, cache=None):
+    """
+    Analyze home service issues from photos.
+
+    Args:
+        photo_url (str): Telegram file URL
+        file_unique_id (str): Telegram's stable id for the file, if known
+        cache (AnalysisCache): Checked by file id before downloading and by
+            content hash (confirmed by fingerprint) before running the model
+
+    Returns:
+        dict: issue_type, confidence and the float16 image "embedding" bytes
+        on success, or an error
+    """
+    try:
+        service = get_inference_service()
+        model = service.model_tag() if cache is not None else None
+        keys = [file_key(model, file_unique_id)] if cache is not None and file_unique_id else []
+        if keys:
+            cached = cache.get(keys)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        content = download_photo(photo_url)
+        try:
+            # Decode here so the batcher thread only runs the model
+            img = decode_image(content)
+            hashes = content_keys(model, content, img) if cache is not None else []
+        finally:
+            content.release()
+
+        if cache is not None:
+            # A dHash can collide across different flat photos; the
+            # fingerprint confirms it is the same picture before reuse
+            thumb = fingerprint(img)
+            keys += hashes
+            cached = cache.get(hashes, fingerprint=thumb)
+            if cached is not None:
+                cache.put(keys, cached, thumb)
+                return {**cached, "cached": True}
+
+        issue_type, confidence, embedding = service.classify(img).result(
+            timeout=INFERENCE_TIMEOUT)
+
+        result = {
+            "issue_type": issue_type,
+            "confidence": confidence,
+            "embedding": encode_embedding(embedding),
             "success": True
         }
+        if cache is not None:
+            cache.put(keys, result, thumb)
+        return result
 
     except Exception as e:
         return {
@@ -0,0 +1,377 @@
+"""
+Declarative MongoDB indexes for KommunityKonect.
+
+INDEX_SPECS lists every index the app relies on, per collection, and
+QUERY_SHAPES lists the queries the bot, the agent and the Streamlit pages
+issue. Two commands keep them honest:
+
+    python -m utils.indexes sync [--dry-run] [--keep-extra]
+    python -m utils.indexes verify
+
+sync creates missing indexes, rebuilds ones whose keys or options changed
+and drops indexes the spec no longer lists (collections outside the spec
+are left alone). Running it twice is a no-op.
+
+verify explains every query shape. It exits non-zero if any of them would
+scan a whole collection, and reports the ones that sort in memory (add
+--strict-sort to fail on those too).
+
+Index builds on MongoDB 4.2+ only lock the collection briefly at the start
+and end, so syncing a live database does not block the app.
+"""
+import sys
+import json
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from utils.mongo import (SERVICE_REQUESTS, USERS, SCHEDULES, COMMUNITY_POSTS,
+                         COMMUNITY_EVENTS, BOT_STATE, get_db)
+from utils.status_digest import status_digest_pipeline
+from utils.analysis_cache import CACHE_COLLECTION as ANALYSIS_CACHE, STORE_TTL as ANALYSIS_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Options that make two indexes on the same keys different
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation")
+
+INDEX_SPECS = {
+    SERVICE_REQUESTS: [
+        # Serviceman job lists: equality on assigned_to, then the urgency sort,
+        # then the status range ($ne Completed), so the sort comes from the index
+        IndexModel([("assigned_to", ASCENDING), ("urgency", DESCENDING), ("status", ASCENDING)]),
+        # /status digest and the user dashboard: a user's requests, newest first
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("timestamp", DESCENDING)]),
+        # Admin dashboard pages in (timestamp, _id) keyset order, unfiltered or
+        # filtered by status, urgency or both; the unfiltered one also serves
+        # the duplicate index rebuild's time window
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("urgency", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("urgency", ASCENDING),
+                    ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        # Photo analyses to resume after a restart
+        IndexModel([("photo_analysis.status", ASCENDING)], sparse=True),
+        # Home page count; only requests filed from the web carry a requester
+        IndexModel([("requester", ASCENDING)], sparse=True),
+    ],
+    USERS: [
+        IndexModel([("username", ASCENDING)], unique=True),
+        # Web-registered users have no telegram_id until they link the bot
+        IndexModel([("telegram_id", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("role", ASCENDING)]),
+    ],
+    SCHEDULES: [
+        IndexModel([("serviceman", ASCENDING), ("date", ASCENDING)]),
+    ],
+    COMMUNITY_EVENTS: [
+        IndexModel([("date", DESCENDING)]),
+        IndexModel([("host", ASCENDING), ("date", DESCENDING)]),
+        IndexModel([("attendees", ASCENDING), ("date", DESCENDING)]),
+        IndexModel([("title", ASCENDING)]),
+    ],
+    COMMUNITY_POSTS: [
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("author", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("invited_users", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("likes", DESCENDING)]),
+    ],
+    # Photo analysis results by photo identity (utils.analysis_cache)
+    ANALYSIS_CACHE: [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=ANALYSIS_CACHE_TTL),
+    ],
+    # Conversation state and update claims (utils.state_store, mongo backend)
+    BOT_STATE: [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Placeholder values; only the shape of each query matters to the planner
+_USER = "sample_user"
+_DAY = "2026-01-01"
+# A later admin dashboard page (see ServiceRequestRepository.page)
+_ADMIN_KEYSET = {"$or": [{"timestamp": {"$lt": datetime(2026, 1, 1)}},
+                         {"timestamp": datetime(2026, 1, 1), "_id": {"$lt": ObjectId("f" * 24)}}]}
+_ADMIN_ORDER = [("timestamp", -1), ("_id", -1)]
+
+
+def _find(name, collection, filter, sort=None, source=""):
+    return {"name": name, "collection": collection, "filter": filter,
+            "sort": sort, "source": source}
+
+
+def _aggregate(name, collection, pipeline, source=""):
+    return {"name": name, "collection": collection, "pipeline": pipeline, "source": source}
+
+
+QUERY_SHAPES = [
+    _find("serviceman_open_jobs", SERVICE_REQUESTS,
+          {"assigned_to": _USER, "status": {"$ne": "Completed"}}, [("urgency", -1)],
+          "utils/job_utils.py get_serviceman_jobs"),
+    _find("agent_job_context", SERVICE_REQUESTS,
+          {"assigned_to": _USER, "status": {"$ne": "Completed"}},
+          [("scheduled_time.date", 1), ("_id", 1)],
+          "service_agents/serviceman_agent.py fetch_job_context"),
+    _find("agent_next_appointment", SERVICE_REQUESTS,
+          {"assigned_to": _USER, "status": {"$ne": "Completed"},
+           "scheduled_time.date": {"$gte": _DAY}},
+          [("scheduled_time.date", 1), ("scheduled_time.start", 1)],
+          "service_agents/serviceman_agent.py _next_scheduled_job"),
+    _find("serviceman_assigned", SERVICE_REQUESTS, {"assigned_to": _USER}, None,
+          "pages/2_Serviceman_View.py, pages/Home.py"),
+    _find("admin_page", SERVICE_REQUESTS, _ADMIN_KEYSET, _ADMIN_ORDER,
+          "pages/1_Admin_Dashboard.py"),
+    _find("admin_page_by_status", SERVICE_REQUESTS, {"$and": [{"status": "Pending"}, _ADMIN_KEYSET]},
+          _ADMIN_ORDER, "pages/1_Admin_Dashboard.py"),
+    _find("admin_page_by_urgency", SERVICE_REQUESTS, {"$and": [{"urgency": "High"}, _ADMIN_KEYSET]},
+          _ADMIN_ORDER, "pages/1_Admin_Dashboard.py"),
+    _find("admin_page_by_status_and_urgency", SERVICE_REQUESTS,
+          {"$and": [{"status": "Pending", "urgency": "High"}, _ADMIN_KEYSET]}, _ADMIN_ORDER,
+          "pages/1_Admin_Dashboard.py"),
+    _find("pending_requests", SERVICE_REQUESTS, {"status": "Pending"}, None,
+          "pages/1_Admin_Dashboard.py"),
+    _find("user_requests", SERVICE_REQUESTS, {"user_id": _USER}, [("timestamp", -1)],
+          "pages/5_User_Dashboard.py"),
+    _aggregate("status_digest", SERVICE_REQUESTS, status_digest_pipeline(_USER),
+               "utils/status_digest.py"),
+    _find("requester_count", SERVICE_REQUESTS, {"requester": _USER}, None, "pages/Home.py"),
+    _find("pending_photo_analyses", SERVICE_REQUESTS,
+          {"photo_analysis.status": "pending", "photo_file_id": {"$exists": True}}, None,
+          "utils/photo_analysis.py resume_pending"),
+    _find("recent_photo_embeddings", SERVICE_REQUESTS,
+          {"photo_embedding": {"$exists": True},
+           "$or": [{"timestamp": {"$gte": datetime(2026, 1, 1)}},
+                   {"timestamp": {"$gte": f"{_DAY} 00:00:00"}}]},
+          None, "utils/duplicates.py DuplicateIndex.from_requests"),
+
+    _find("user_by_username", USERS, {"username": _USER}, None,
+          "utils/auth.py, pages/0_Login_or_Register.py"),
+    _find("users_by_telegram_id", USERS, {"telegram_id": {"$in": [1, 2]}}, None,
+          "utils/user_cache.py"),
+    _find("servicemen", USERS, {"role": "serviceman"}, None,
+          "pages/1_Admin_Dashboard.py, utils/community_calendar.py"),
+
+    _find("serviceman_day", SCHEDULES, {"serviceman": _USER, "date": _DAY}, None,
+          "utils/calendar_utils.py"),
+
+    _find("events_by_date", COMMUNITY_EVENTS, {}, [("date", -1)], "pages/4_Community.py"),
+    _find("events_by_title", COMMUNITY_EVENTS, {}, [("title", 1)], "pages/4_Community.py"),
+    _find("events_hosted", COMMUNITY_EVENTS, {"host": _USER}, [("date", -1)],
+          "pages/4_Community.py"),
+    _find("events_attending", COMMUNITY_EVENTS, {"attendees": _USER}, [("date", -1)],
+          "pages/4_Community.py, pages/Home.py"),
+    _find("event_invitations", COMMUNITY_EVENTS,
+          {"date": {"$gte": _DAY}, "attendees": {"$ne": _USER}}, [("date", 1)],
+          "pages/4_Community.py"),
+
+    _find("posts_newest", COMMUNITY_POSTS, {}, [("timestamp", -1)],
+          "pages/4_Community.py, pages/5_User_Dashboard.py"),
+    _find("posts_most_liked", COMMUNITY_POSTS, {}, [("likes", -1)], "pages/4_Community.py"),
+    _find("posts_by_author", COMMUNITY_POSTS, {"author": _USER}, [("timestamp", -1)],
+          "pages/4_Community.py, pages/Home.py"),
+    _find("posts_invited", COMMUNITY_POSTS, {"invited_users": _USER}, [("timestamp", -1)],
+          "pages/4_Community.py"),
+]
+
+
+def _signature(keys, options):
+    """Comparable (keys, options) pair for an index definition"""
+    keys = tuple((field, int(direction)) for field, direction in keys)
+    compared = tuple(sorted((k, json.dumps(options[k], sort_keys=True, default=str))
+                            for k in COMPARED_OPTIONS
+                            # expireAfterSeconds=0 is a TTL index, unlike a missing option
+                            if options.get(k) is not None and options.get(k) is not False))
+    return keys, compared
+
+
+def plan_sync(collection, models, prune=True, rebuild=True):
+    """
+    Work out what sync would change on one collection.
+
+    Returns:
+        dict: "create" and "rebuild" (IndexModels), "drop" (index names)
+            and "unchanged" (index names)
+    """
+    existing = {name: _signature(info["key"], info)
+                for name, info in collection.index_information().items() if name != "_id_"}
+    wanted = {m.document["name"]: m for m in models}
+    plan = {"create": [], "rebuild": [], "drop": [], "unchanged": []}
+
+    for name, model in wanted.items():
+        signature = _signature(model.document["key"].items(), model.document)
+        if name not in existing:
+            plan["create"].append(model)
+        elif existing[name] == signature:
+            plan["unchanged"].append(name)
+        elif rebuild:
+            plan["rebuild"].append(model)
+        else:
+            logger.warning(f"Index {collection.name}.{name} differs from the spec; "
+                           f"run `python -m utils.indexes sync` to rebuild it")
+
+    if prune:
+        plan["drop"] = [name for name in existing if name not in wanted]
+    return plan
+
+
+def sync_collection(collection, models, prune=True, rebuild=True, dry_run=False):
+    """Bring one collection's indexes in line with models; returns the plan applied"""
+    plan = plan_sync(collection, models, prune=prune, rebuild=rebuild)
+    if dry_run:
+        return plan
+
+    # Drop first: a stale index may hold the name or key pattern a new one needs
+    for name in plan["drop"] + [m.document["name"] for m in plan["rebuild"]]:
+        collection.drop_index(name)
+        logger.info(f"Dropped index {collection.name}.{name}")
+    for model in plan["create"] + plan["rebuild"]:
+        try:
+            collection.create_indexes([model])
+            logger.info(f"Built index {collection.name}.{model.document['name']}")
+        except OperationFailure as e:
+            # e.g. duplicate values under a new unique index; keep going with the rest
+            logger.error(f"Could not build index {collection.name}.{model.document['name']}: {str(e)}")
+            plan.setdefault("failed", []).append(model)
+    return plan
+
+
+def sync_indexes(db=None, specs=None, prune=True, rebuild=True, dry_run=False):
+    """
+    Sync every collection in the spec.
+
+    Args:
+        db: Database, the application database by default
+        specs (dict): Collection name -> list of IndexModel, INDEX_SPECS by default
+        prune (bool): Drop indexes not in the spec
+        rebuild (bool): Replace indexes whose keys or options changed
+        dry_run (bool): Only report what would change
+
+    Returns:
+        dict: Collection name -> plan (see plan_sync)
+    """
+    db = db if db is not None else get_db()
+    specs = specs if specs is not None else INDEX_SPECS
+    return {name: sync_collection(db[name], models, prune=prune, rebuild=rebuild, dry_run=dry_run)
+            for name, models in specs.items()}
+
+
+def ensure_indexes(db=None, wait=False):
+    """
+    Create missing indexes on a background thread without dropping or
+    rebuilding anything; safe to call on every start.
+    """
+    def run():
+        try:
+            sync_indexes(db, prune=False, rebuild=False)
+        except Exception as e:
+            logger.error(f"Index sync failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name="index-sync", daemon=True)
+    thread.start()
+    if wait:
+        thread.join()
+    return thread
+
+
+def plan_stages(explain):
+    """Stage names in the winning plan(s) of an explain() result"""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            if in_plan and "stage" in node:
+                stages.append(node["stage"])
+            for key, value in node.items():
+                if key == "rejectedPlans":
+                    continue
+                walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def explain_shape(db, shape):
+    """Explain one query shape without executing it"""
+    collection = db[shape["collection"]]
+    if "pipeline" in shape:
+        return db.command("aggregate", collection.name, pipeline=shape["pipeline"], explain=True)
+    cursor = collection.find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    return cursor.explain()
+
+
+def plan_problems(stages):
+    """
+    What is wrong with a winning plan.
+
+    Returns:
+        list: "COLLSCAN" for a whole-collection scan (or no plan at all),
+        "SORT" for a blocking in-memory sort
+    """
+    problems = []
+    if "COLLSCAN" in stages or not stages:
+        problems.append("COLLSCAN")
+    if "SORT" in stages:
+        problems.append("SORT")
+    return problems
+
+
+def verify_query_shapes(db=None, shapes=None):
+    """
+    Explain every query shape.
+
+    Returns:
+        list: (shape name, problems, stage names) for shapes whose plan has
+        any plan_problems()
+    """
+    db = db if db is not None else get_db()
+    failures = []
+    for shape in shapes if shapes is not None else QUERY_SHAPES:
+        stages = plan_stages(explain_shape(db, shape))
+        problems = plan_problems(stages)
+        if problems:
+            failures.append((shape["name"], problems, stages))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KommunityKonect index manager")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync = commands.add_parser("sync", help="Create, rebuild and drop indexes to match the spec")
+    sync.add_argument("--dry-run", action="store_true", help="Only show what would change")
+    sync.add_argument("--keep-extra", action="store_true", help="Keep indexes not in the spec")
+    verify = commands.add_parser("verify", help="Fail if any query shape scans a whole collection")
+    verify.add_argument("--strict-sort", action="store_true", help="Also fail on in-memory sorts")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if args.command == "sync":
+        result = sync_indexes(prune=not args.keep_extra, dry_run=args.dry_run)
+        for name, plan in result.items():
+            for action in ("create", "rebuild", "drop", "failed"):
+                for item in plan.get(action, []):
+                    index = item if isinstance(item, str) else item.document["name"]
+                    print(f"{action:>8} {name}.{index}")
+        return 1 if any(plan.get("failed") for plan in result.values()) else 0
+
+    failing = {"COLLSCAN", "SORT"} if args.strict_sort else {"COLLSCAN"}
+    failures = verify_query_shapes()
+    by_name = {shape["name"]: shape for shape in QUERY_SHAPES}
+    for name, problems, stages in failures:
+        print(f"{'/'.join(problems):>13} {name} ({by_name[name]['source']}): {' > '.join(stages)}")
+    scans = [name for name, problems, _ in failures if "COLLSCAN" in problems]
+    print(f"{len(QUERY_SHAPES) - len(scans)}/{len(QUERY_SHAPES)} query shapes use an index")
+    return 1 if any(failing & set(problems) for _, problems, _ in failures) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
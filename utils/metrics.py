@@ -0,0 +1,58 @@
+"""
+Small in-process metrics helpers shared by the bot's queues and caches.
+"""
+import threading
+from collections import deque
+
+
+def _pick(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+class LatencyWindow:
+    """
+    Sliding window of recent latency samples (in seconds).
+
+    Args:
+        size (int): Number of most recent samples kept
+    """
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def percentile(self, pct):
+        """Return the pct-th percentile of the window (None if empty)"""
+        with self._lock:
+            samples = sorted(self._samples)
+        return _pick(samples, pct)
+
+    def summary(self):
+        """p50/p95/p99 in milliseconds plus lifetime count and mean"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total
+
+        def pick(pct):
+            value = _pick(samples, pct)
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2) if count else None,
+            "p50_ms": pick(50),
+            "p95_ms": pick(95),
+            "p99_ms": pick(99),
+        }
@@ -0,0 +1,296 @@
+"""
+Process-wide MongoDB client registry.
+
+Every module and Streamlit page gets its client, database and collections
+from here instead of building its own MongoClient, so a process holds one
+connection pool per URI. Streamlit re-runs page scripts but keeps imported
+modules, so the pool also survives reruns.
+
+Pool settings come from the environment:
+
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS, MONGO_COMPRESSORS, MONGO_READ_PREFERENCE
+
+Compressors whose Python package is missing are skipped (zlib is always
+available; zstd and snappy need their optional modules).
+
+Creating a client does no network I/O, so importing modules that hold
+collection handles is cheap. connect() is the one place that waits for the
+server (retrying with exponential backoff); health_check() reports whether
+it is reachable right now.
+"""
+import os
+import time
+import atexit
+import random
+import logging
+import threading
+import warnings
+
+import pymongo
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import ConfigurationError, PyMongoError
+from pymongo.monitoring import ConnectionPoolListener
+
+from utils.metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("DB_NAME", "kommunity_konect")
+
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# connect(): attempts after the first, first delay and delay cap (seconds)
+CONNECT_RETRIES = int(os.getenv("MONGO_CONNECT_RETRIES", "5"))
+CONNECT_BACKOFF = float(os.getenv("MONGO_CONNECT_BACKOFF", "0.5"))
+CONNECT_BACKOFF_MAX = float(os.getenv("MONGO_CONNECT_BACKOFF_MAX", "30"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("MONGO_HEALTH_CHECK_TIMEOUT", "2"))
+
+# Collection names used across the bot and the Streamlit pages
+SERVICE_REQUESTS = "service_requests"
+USERS = "users"
+SCHEDULES = "schedules"
+CALENDAR_CONFIG = "calendar_config"
+COMMUNITY_POSTS = "community_posts"
+COMMUNITY_EVENTS = "community_events"
+SUPPORT_REQUESTS = "support_requests"
+BOT_STATE = "bot_state"
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """Connection checkout wait times and pool events for every registry client"""
+
+    def __init__(self):
+        self.wait = LatencyWindow()
+        self.created = 0
+        self.closed = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+
+    # Called by the driver on its own threads; counters are best-effort
+    def connection_checked_out(self, event):
+        # duration (pymongo 4.7+) is the time spent waiting for a connection
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            self.wait.record(duration)
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def pool_cleared(self, event):
+        self.cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def stats(self):
+        return {
+            "connections_open": self.created - self.closed,
+            "connections_created": self.created,
+            "checkout_failures": self.checkout_failures,
+            "pool_cleared": self.cleared,
+            "checkout_wait": self.wait.summary(),
+        }
+
+
+POOL_METRICS = PoolMetrics()
+
+_clients = {}
+_clients_pid = os.getpid()
+_connected = set()  # URIs a ping has succeeded on in this process
+_lock = threading.Lock()
+
+
+def client_options():
+    """Keyword arguments every registry client is created with"""
+    return {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "maxIdleTimeMS": MAX_IDLE_MS,
+        "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+        "compressors": COMPRESSORS,
+        "readPreference": READ_PREFERENCE,
+        "appname": "kommunity-konect",
+        "event_listeners": [POOL_METRICS],
+    }
+
+
+def get_client(uri=None):
+    """
+    The shared client for a connection string (MONGODB_URI by default).
+
+    Clients connect in the background; the first operation waits for
+    server selection.
+    """
+    global _clients, _clients_pid, _connected
+    uri = uri or MONGO_URI
+    with _lock:
+        # Pools must not be shared across fork(); start over in a child process
+        if _clients_pid != os.getpid():
+            _clients, _clients_pid, _connected = {}, os.getpid(), set()
+        client = _clients.get(uri)
+        if client is None:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                client = MongoClient(uri, **client_options())
+            for warning in caught:
+                logger.debug(f"MongoDB client option: {warning.message}")
+            if not _clients:
+                atexit.register(close_clients)
+            _clients[uri] = client
+            logger.info(f"MongoDB client created (pool {MIN_POOL_SIZE}-{MAX_POOL_SIZE}, "
+                        f"read preference {READ_PREFERENCE})")
+    return client
+
+
+def get_db(name=None, uri=None):
+    """The application database (DB_NAME) on the shared client"""
+    return get_client(uri)[name or DB_NAME]
+
+
+def get_collection(name, read_preference=None):
+    """
+    A collection in the application database.
+
+    Args:
+        name (str): Collection name
+        read_preference: Optional pymongo read preference for this handle
+            (e.g. ReadPreference.SECONDARY_PREFERRED for dashboards)
+    """
+    collection = get_db()[name]
+    if read_preference is not None:
+        collection = collection.with_options(read_preference=read_preference)
+    return collection
+
+
+def service_requests():
+    return get_collection(SERVICE_REQUESTS)
+
+
+def users():
+    return get_collection(USERS)
+
+
+def schedules():
+    return get_collection(SCHEDULES)
+
+
+def calendar_config():
+    return get_collection(CALENDAR_CONFIG)
+
+
+def community_posts():
+    return get_collection(COMMUNITY_POSTS)
+
+
+def community_events():
+    return get_collection(COMMUNITY_EVENTS)
+
+
+def connect(uri=None, retries=CONNECT_RETRIES, backoff=CONNECT_BACKOFF,
+            max_backoff=CONNECT_BACKOFF_MAX, sleep=time.sleep):
+    """
+    Wait until the server answers a ping, retrying with exponential backoff.
+
+    Only the first successful call per URI pings; later calls return at once.
+
+    Args:
+        uri (str): Connection string, MONGODB_URI by default
+        retries (int): Attempts after the first one
+        backoff (float): Delay before the first retry; doubles each retry
+        max_backoff (float): Upper bound on a single delay
+
+    Returns:
+        bool: True once connected, False if every attempt failed
+    """
+    uri = uri or MONGO_URI
+    if uri in _connected and _clients_pid == os.getpid():
+        return True
+
+    for attempt in range(retries + 1):
+        try:
+            get_client(uri).admin.command("ping")
+            _connected.add(uri)
+            logger.info("Connected to MongoDB" + (f" after {attempt} retries" if attempt else ""))
+            return True
+        except ConfigurationError as e:
+            # A malformed URI or missing option won't fix itself
+            logger.error(f"MongoDB configuration error: {str(e)}")
+            return False
+        except PyMongoError as e:
+            if attempt == retries:
+                logger.error(f"Could not connect to MongoDB after {attempt + 1} attempts: {str(e)}")
+                return False
+            # Full jitter keeps restarted processes from retrying in lockstep
+            delay = random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+            logger.warning(f"MongoDB not reachable ({str(e)}); retrying in {delay:.1f}s")
+            sleep(delay)
+    return False
+
+
+def health_check(uri=None, timeout=HEALTH_CHECK_TIMEOUT):
+    """
+    Ping the server once, giving up after timeout seconds.
+
+    Returns:
+        dict: ok, latency_ms, error (None when ok) and the pool stats
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        with pymongo.timeout(timeout):
+            get_client(uri).admin.command("ping")
+    except PyMongoError as e:
+        error = str(e)
+    return {
+        "ok": error is None,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+        "error": error,
+        "pool": pool_stats(),
+    }
+
+
+def pool_stats():
+    """Pool sizes and checkout wait percentiles across registry clients"""
+    with _lock:
+        clients = len(_clients)
+    return {"clients": clients, **POOL_METRICS.stats()}
+
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _connected.clear()
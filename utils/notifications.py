@@ -1,9 +1,9 @@
-import os
-import requests
 import logging
 from datetime import datetime
-from bson import ObjectId
-from utils.db import requests_col, users_col
+from utils.db import users_col
+from utils.service_requests import get_requests_repo, format_time
+from utils.outbound import running_outbound, PRIORITY_NOTIFICATION
+from utils.telegram_api import get_api
 
 # Configure logging
 logging.basicConfig(
@@ -12,24 +12,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load Telegram token
-TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# Seconds a direct send (outside the bot process) may block the caller
+DIRECT_SEND_TIMEOUT = 5
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Failed to send message: {str(future.exception())}")
+
 
 def send_telegram_message(chat_id, text, parse_mode="Markdown"):
-    """Send a message to a Telegram user"""
+    """
+    Send a message to a Telegram user ahead of regular bot traffic.
+
+    In the bot process the message joins the running outbound queue and this
+    returns once it is queued. Elsewhere (the Streamlit app) it is one direct
+    call, so the web process neither waits on the queue nor starts its
+    sender threads.
+    """
+    payload = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": parse_mode
+    }
     try:
-        response = requests.post(
-            f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-            json={
-                "chat_id": chat_id,
-                "text": text,
-                "parse_mode": parse_mode
-            },
-            timeout=10
-        )
-        
-        if not response.ok:
-            logger.error(f"Failed to send message: {response.text}")
+        queue = running_outbound()
+        if queue is not None:
+            queue.send(chat_id, payload, priority=PRIORITY_NOTIFICATION).add_done_callback(_log_failure)
+            return True
+
+        result = get_api().call("sendMessage", payload, timeout=DIRECT_SEND_TIMEOUT)
+        if not result.get("ok"):
+            logger.error(f"Failed to send message: {result.get('description')}")
             return False
         return True
     except Exception as e:
@@ -48,18 +62,16 @@ def notify_assignment(request_id, serviceman_username):
         bool: Success or failure
     """
     try:
-        # Convert string ID to ObjectId if needed
-        if isinstance(request_id, str):
-            request_id = ObjectId(request_id)
-            
-        # Get request details
-        request = requests_col.find_one({"_id": request_id})
+        repo = get_requests_repo()
+
+        # Get request details (ObjectId or string ids)
+        request = repo.get(request_id, view="notification")
         if not request:
             logger.error(f"Request {request_id} not found for assignment notification")
             return False
             
         # Get user details
-        user_id = request.get("user_id")
+        user_id = request.user_id
         if not user_id:
             logger.error(f"No user_id found for request {request_id}")
             return False
@@ -71,27 +83,23 @@ def notify_assignment(request_id, serviceman_username):
             return False
             
         # Update request status in database
-        result = requests_col.update_one(
-            {"_id": request_id},
-            {
-                "$set": {
-                    "status": "Assigned",
-                    "assigned_to": serviceman_username,
-                    "assignment_time": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-                }
-            }
+        updated = repo.update(
+            request.id,
+            status="Assigned",
+            assigned_to=serviceman_username,
+            assigned_at=datetime.utcnow()
         )
         
-        if not result.modified_count:
+        if not updated:
             logger.warning(f"Failed to update request {request_id} status")
             
         # Prepare notification message
         message = (
-            f"🔔 *Service Update: Request #{str(request_id)[-6:]}*\n\n"
-            f"Good news! A specialist has been assigned to your {request.get('category', 'service')} request.\n\n"
+            f"🔔 *Service Update: Request #{request.short_id}*\n\n"
+            f"Good news! A specialist has been assigned to your {request.category or 'service'} request.\n\n"
             f"*Specialist:* {serviceman.get('name', 'Your specialist')}\n"
             f"*Contact:* @{serviceman.get('telegram', '')}\n\n"
-            f"They will be in touch shortly to address your issue at {request.get('location', 'your location')}."
+            f"They will be in touch shortly to address your issue at {request.location or 'your location'}."
         )
         
         # Send notification to user
@@ -114,49 +122,43 @@ def notify_completion(request_id, serviceman_username):
         bool: Success or failure
     """
     try:
-        # Convert string ID to ObjectId if needed
-        if isinstance(request_id, str):
-            request_id = ObjectId(request_id)
-            
-        # Get request details
-        request = requests_col.find_one({"_id": request_id})
+        repo = get_requests_repo()
+
+        # Get request details (ObjectId or string ids)
+        request = repo.get(request_id, view="notification")
         if not request:
             logger.error(f"Request {request_id} not found for completion notification")
             return False
             
         # Verify the serviceman is assigned to this request
-        if request.get("assigned_to") != serviceman_username:
+        if request.assigned_to != serviceman_username:
             logger.warning(f"Serviceman {serviceman_username} not assigned to request {request_id}")
             # Continue anyway - may be a supervisor or admin override
             
         # Get user details
-        user_id = request.get("user_id")
+        user_id = request.user_id
         if not user_id:
             logger.error(f"No user_id found for request {request_id}")
             return False
             
         # Update request status in database
-        completion_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        result = requests_col.update_one(
-            {"_id": request_id},
-            {
-                "$set": {
-                    "status": "Completed",
-                    "completed_by": serviceman_username,
-                    "completion_time": completion_time
-                }
-            }
+        completed_at = datetime.utcnow()
+        updated = repo.update(
+            request.id,
+            status="Completed",
+            completed_by=serviceman_username,
+            completed_at=completed_at
         )
         
-        if not result.modified_count:
+        if not updated:
             logger.warning(f"Failed to update request {request_id} status to Completed")
             
         # Prepare notification message
         message = (
-            f"✅ *Service Completed: Request #{str(request_id)[-6:]}*\n\n"
-            f"Your {request.get('category', 'service')} request has been marked as completed.\n\n"
-            f"*Location:* {request.get('location', 'Not specified')}\n"
-            f"*Completed on:* {completion_time}\n\n"
+            f"✅ *Service Completed: Request #{request.short_id}*\n\n"
+            f"Your {request.category or 'service'} request has been marked as completed.\n\n"
+            f"*Location:* {request.location or 'Not specified'}\n"
+            f"*Completed on:* {format_time(completed_at)}\n\n"
             f"Thank you for using our service! If you have any feedback or the issue wasn't fully resolved, please let us know."
         )
         
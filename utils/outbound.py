@@ -0,0 +1,379 @@
+"""
+Outbound message queue for the Telegram bot.
+Schedules sends under Telegram's rate limits (about 30 msg/s per bot and
+1 msg/s per chat), honours retry_after on 429s, retries transient failures
+with backoff, and lets chats with notifications waiting be served ahead of
+chats with only menu chatter. Within a chat messages keep their order.
+"""
+import os
+import time
+import atexit
+import random
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.metrics import LatencyWindow
+from utils.telegram_api import get_api
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, lower value is sent first
+PRIORITY_NOTIFICATION = 0  # assignment / completion notices
+PRIORITY_REPLY = 1         # direct answers in a conversation
+PRIORITY_CHATTER = 2       # menus, help, keyboards
+PRIORITY_NAMES = {
+    PRIORITY_NOTIFICATION: "notification",
+    PRIORITY_REPLY: "reply",
+    PRIORITY_CHATTER: "chatter",
+}
+
+GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+CHAT_BURST = int(os.getenv("TG_CHAT_BURST", "3"))
+SENDER_THREADS = int(os.getenv("TG_SENDER_THREADS", "4"))
+MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "5"))
+
+
+class TokenBucket:
+    """
+    Classic token bucket.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (int): Maximum burst size
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def delay(self, now=None):
+        """Seconds until a token is available (0 if one is available now)"""
+        now = self.clock() if now is None else now
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def consume(self, now=None):
+        """Take a token if one is available"""
+        now = self.clock() if now is None else now
+        if self.delay(now) > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds, now=None):
+        """Block the bucket for a while (used for Telegram's retry_after)"""
+        now = self.clock() if now is None else now
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Message:
+    __slots__ = ("chat_id", "method", "payload", "priority", "seq",
+                 "attempts", "enqueued_at", "future")
+
+    def __init__(self, chat_id, method, payload, priority, seq, enqueued_at):
+        self.chat_id = chat_id
+        self.method = method
+        self.payload = payload
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.enqueued_at = enqueued_at
+        self.future = Future()
+
+
+class _Lane:
+    """Per-chat FIFO queue with its own rate limit"""
+    __slots__ = ("messages", "bucket", "busy", "version")
+
+    def __init__(self, bucket):
+        self.messages = deque()
+        self.bucket = bucket
+        self.busy = False
+        self.version = 0
+
+    def priority(self):
+        """The most urgent priority waiting in this chat"""
+        return min(message.priority for message in self.messages)
+
+
+class OutboundQueue:
+    """
+    Rate-limited, prioritised sender.
+
+    Messages to one chat are delivered one at a time in arrival order, so a
+    reply keyboard never lands after the prompt that follows it. Across chats
+    the scheduler picks the chat with the most urgent waiting message whose
+    per-chat bucket allows a send, subject to the global bucket.
+
+    Args:
+        api_factory (callable): Returns the Telegram client to send with
+        global_rate (float): Messages per second across all chats
+        chat_rate (float): Messages per second to a single chat
+        chat_burst (int): Short burst allowed per chat
+        senders (int): Concurrent HTTP sends
+        max_retries (int): Attempts after the first before giving up
+        backoff_base (float): Initial retry delay in seconds
+        backoff_max (float): Retry delay cap in seconds
+    """
+
+    def __init__(self, api_factory=get_api, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 chat_burst=CHAT_BURST, senders=SENDER_THREADS, max_retries=MAX_RETRIES,
+                 backoff_base=0.5, backoff_max=30.0, clock=time.monotonic):
+        self.api_factory = api_factory
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.senders = senders
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+
+        self.global_bucket = TokenBucket(global_rate, max(1, int(global_rate)), clock)
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._lanes = {}
+        # (priority, seq, version, chat_id) of chats that may send now
+        self._ready = []
+        # (not_before, seq, version, chat_id) of throttled chats
+        self._waiting = []
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._in_flight = 0
+        self._running = False
+        self._thread = None
+        self._executor = None
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttled = 0
+        self.queue_latency = LatencyWindow()
+        self.send_latency = LatencyWindow()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.senders, thread_name_prefix="outbound-sender")
+        self._thread = threading.Thread(
+            target=self._schedule_loop, name="outbound-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def send(self, chat_id, payload, method="sendMessage", priority=PRIORITY_REPLY):
+        """
+        Queue a Bot API call addressed to a chat.
+
+        Returns:
+            concurrent.futures.Future: Resolves to Telegram's result dict, or
+            raises OutboundError once retries are exhausted
+        """
+        with self._cond:
+            message = _Message(chat_id, method, payload, priority,
+                               next(self._seq), self.clock())
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                lane = self._lanes[chat_id] = _Lane(
+                    TokenBucket(self.chat_rate, self.chat_burst, self.clock))
+
+            # A more urgent message re-files the chat under its new priority
+            reschedule = not lane.messages or priority < lane.priority()
+            lane.messages.append(message)
+            self._depth[priority] += 1
+            if reschedule and not lane.busy:
+                self._schedule_lane(chat_id, lane)
+            self._cond.notify()
+        return message.future
+
+    def _schedule_lane(self, chat_id, lane):
+        """File a lane under ready or waiting (lock held)"""
+        lane.version += 1
+        head = lane.messages[0]
+        delay = lane.bucket.delay()
+        if delay > 0:
+            heapq.heappush(self._waiting,
+                           (self.clock() + delay, head.seq, lane.version, chat_id))
+        else:
+            heapq.heappush(self._ready,
+                           (lane.priority(), head.seq, lane.version, chat_id))
+
+    def _schedule_loop(self):
+        with self._cond:
+            while self._running or self._ready or self._waiting or self._in_flight:
+                now = self.clock()
+
+                # Promote throttled chats whose wait is over
+                while self._waiting and self._waiting[0][0] <= now:
+                    _, _, version, chat_id = heapq.heappop(self._waiting)
+                    lane = self._lanes.get(chat_id)
+                    if lane and lane.version == version and not lane.busy:
+                        self._schedule_lane(chat_id, lane)
+
+                if not self._ready or self._in_flight >= self.senders:
+                    timeout = self._waiting[0][0] - now if self._waiting else None
+                    if not self._running and not self._ready and not self._waiting:
+                        timeout = 0.05
+                    self._cond.wait(timeout)
+                    continue
+
+                global_delay = self.global_bucket.delay(now)
+                if global_delay > 0:
+                    self._cond.wait(global_delay)
+                    continue
+
+                _, _, version, chat_id = heapq.heappop(self._ready)
+                lane = self._lanes.get(chat_id)
+                if not lane or lane.version != version or lane.busy or not lane.messages:
+                    continue  # stale entry
+
+                if not lane.bucket.consume(now):
+                    self._schedule_lane(chat_id, lane)
+                    continue
+
+                self.global_bucket.consume(now)
+                message = lane.messages.popleft()
+                lane.busy = True
+                self._in_flight += 1
+                self._executor.submit(self._deliver, message)
+
+    def _deliver(self, message):
+        started = self.clock()
+        message.attempts += 1
+        retry_after = None
+        error = None
+        result = None
+
+        try:
+            result = self.api_factory().call(message.method, message.payload, timeout=10)
+        except Exception as e:
+            error = str(e)
+
+        finished = self.clock()
+        self.send_latency.record(finished - started)
+
+        if result is not None and result.get("ok"):
+            outcome = "sent"
+        elif result is not None and result.get("error_code") == 429:
+            outcome = "retry"
+            retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+            error = result.get("description")
+        elif result is None or (result.get("error_code") or 0) >= 500:
+            outcome = "retry"
+            error = error or result.get("description")
+        else:
+            outcome = "failed"
+            error = result.get("description")
+
+        if outcome == "retry" and message.attempts > self.max_retries:
+            outcome = "failed"
+
+        with self._cond:
+            lane = self._lanes[message.chat_id]
+            lane.busy = False
+            self._in_flight -= 1
+
+            if outcome == "retry":
+                if retry_after is not None:
+                    self.throttled += 1
+                    lane.bucket.pause(retry_after, finished)
+                else:
+                    backoff = min(self.backoff_max,
+                                  self.backoff_base * 2 ** (message.attempts - 1))
+                    lane.bucket.pause(backoff * random.uniform(0.8, 1.2), finished)
+                self.retried += 1
+                lane.messages.appendleft(message)
+                logger.warning(
+                    f"Retrying {message.method} to {message.chat_id} "
+                    f"(attempt {message.attempts}): {error}")
+            else:
+                self._depth[message.priority] -= 1
+                if outcome == "sent":
+                    self.sent += 1
+                    self.queue_latency.record(finished - message.enqueued_at)
+                else:
+                    self.failed += 1
+                    logger.error(f"Message failed to {message.chat_id}: {error}")
+
+            if lane.messages:
+                self._schedule_lane(message.chat_id, lane)
+            else:
+                del self._lanes[message.chat_id]
+            self._cond.notify()
+
+        # Resolve outside the lock so callbacks can enqueue more messages
+        if outcome == "sent":
+            message.future.set_result(result)
+        elif outcome == "failed":
+            message.future.set_exception(OutboundError(error, result))
+
+    def stop(self, timeout=10):
+        """Stop accepting work and wait up to timeout for queued messages"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        """Queue depth per priority lane, counters and latency percentiles"""
+        with self._cond:
+            depth = {PRIORITY_NAMES[p]: n for p, n in self._depth.items()}
+            return {
+                "depth": depth,
+                "queued": sum(depth.values()),
+                "in_flight": self._in_flight,
+                "chats": len(self._lanes),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "throttled": self.throttled,
+                "queue_latency": self.queue_latency.summary(),
+                "send_latency": self.send_latency.summary(),
+            }
+
+
+class OutboundError(Exception):
+    """A queued message could not be delivered"""
+
+    def __init__(self, description, result=None):
+        super().__init__(description)
+        self.result = result
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def running_outbound():
+    """The process-wide queue if something in this process started it, else None"""
+    return _queue
+
+
+def get_outbound():
+    """Return the process-wide outbound queue, starting it on first use"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = OutboundQueue().start()
+                atexit.register(_queue.stop, 5)
+    return _queue
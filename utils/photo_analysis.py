@@ -0,0 +1,227 @@
+"""
+Background photo analysis for bot submissions.
+The request is saved with photo_analysis.status = "pending"; a worker pool
+then resolves the Telegram file, runs the classifier, writes the result back
+to the request document and sends the user a follow-up message.
+"""
+import os
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+
+from utils.telegram_api import get_api
+from utils.duplicates import decode_embedding, request_time
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_WORKERS = int(os.getenv("PHOTO_ANALYSIS_WORKERS", "2"))
+ANALYSIS_QUEUE_SIZE = int(os.getenv("PHOTO_ANALYSIS_QUEUE", "100"))
+
+# Save the duplicate index snapshot after this many new requests
+DUPLICATE_CHECKPOINT_EVERY = int(os.getenv("DUPLICATE_CHECKPOINT_EVERY", "50"))
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def format_analysis_message(request_id, analysis, duplicates=()):
+    """User-facing follow-up for a finished analysis"""
+    ref = f"Request #{str(request_id)[-6:]}"
+    if not analysis.get("success", False):
+        return (
+            f"⚠️ *{ref}:* I couldn't clearly identify the issue in your photo, "
+            "but your request has been submitted and a specialist will review it."
+        )
+
+    issue_type = analysis.get("issue_type", "unknown issue")
+    confidence = analysis.get("confidence", 0)
+    message = (
+        f"*📋 Issue Analysis ({ref}):*\n\n"
+        f"• *Detected Problem:* {issue_type.replace('_', ' ').title()}\n"
+        f"• *Confidence:* {confidence:.1f}%\n\n"
+        f"Based on the image analysis, this appears to be a {issue_type.split()[0]} issue. "
+        f"Our service specialist will address this when assigned to your request."
+    )
+    if duplicates:
+        message += (
+            "\n\n🔁 A very similar issue was reported at this location recently. "
+            "Our team will check whether it's the same problem and handle them together."
+        )
+    return message
+
+
+class PhotoAnalysisWorker:
+    """
+    Bounded pool that analyses request photos off the conversation path.
+
+    Args:
+        requests_col: Service requests collection to write results to
+        notify (callable): notify(chat_id, text) sends the follow-up message
+        workers (int): Concurrent analyses
+        max_queue (int): Jobs allowed to wait before submit() refuses more
+        analyze (callable): analyze(photo_url, file_unique_id, cache) -> result
+            dict; defaults to the CLIP classifier, imported on first use
+        cache (AnalysisCache): Optional cache of results by photo identity
+        duplicates (DuplicateIndex): Optional index used to flag likely
+            duplicate requests by photo, location and time
+    """
+
+    def __init__(self, requests_col, notify, workers=ANALYSIS_WORKERS,
+                 max_queue=ANALYSIS_QUEUE_SIZE, analyze=None, cache=None, duplicates=None):
+        self.requests_col = requests_col
+        self.notify = notify
+        self.analyze = analyze
+        self.cache = cache
+        self.duplicates = duplicates
+        self._unsaved = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="photo-analysis")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.flagged = 0
+
+    def submit(self, request_id, chat_id, file_id, file_unique_id=None):
+        """
+        Queue a photo for analysis.
+
+        Returns:
+            bool: False if the queue is full (the request stays pending and
+            is picked up by resume_pending on the next start)
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning(f"Photo analysis queue full, deferring request {request_id}")
+            return False
+
+        future = self._executor.submit(
+            self._run, request_id, chat_id, file_id, file_unique_id)
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _analyzer(self):
+        if self.analyze is None:
+            from utils.image_processing import analyze_telegram_photo
+            self.analyze = analyze_telegram_photo
+        return self.analyze
+
+    def _run(self, request_id, chat_id, file_id, file_unique_id=None):
+        analysis = {"success": False, "error": "Photo could not be retrieved"}
+        update = {}
+        try:
+            file_response = get_api().call("getFile", {"file_id": file_id})
+            if file_response.get("ok"):
+                photo_url = get_api().file_url(file_response["result"]["file_path"])
+                update["photo_url"] = photo_url
+                analysis = self._analyzer()(
+                    photo_url, file_unique_id=file_unique_id, cache=self.cache)
+            else:
+                analysis["error"] = file_response.get("description", analysis["error"])
+        except Exception as e:
+            logger.error(f"Photo analysis error: {str(e)}", exc_info=True)
+            analysis = {"success": False, "error": str(e)}
+
+        # Copy: the result dict may also be held by the analysis cache
+        analysis = dict(analysis)
+        embedding = analysis.pop("embedding", None)
+        logger.info(f"Analysis result for {request_id}: {analysis}")
+        ok = analysis.get("success", False)
+
+        matches = []
+        if embedding is not None:
+            update["photo_embedding"] = embedding
+            matches = self._find_duplicates(request_id, decode_embedding(embedding))
+            if matches:
+                update["possible_duplicates"] = [
+                    {"request_id": ObjectId(i) if ObjectId.is_valid(i) else i,
+                     "similarity": round(score, 4)}
+                    for i, score in matches
+                ]
+
+        update["photo_analysis"] = {
+            **analysis,
+            "status": DONE if ok else FAILED,
+            "analyzed_at": datetime.utcnow()
+        }
+
+        try:
+            self.requests_col.update_one({"_id": request_id}, {"$set": update})
+        except Exception as e:
+            logger.error(f"Could not save analysis for {request_id}: {str(e)}")
+
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if matches:
+                self.flagged += 1
+
+        self.notify(chat_id, format_analysis_message(request_id, analysis, matches))
+
+    def _find_duplicates(self, request_id, vector):
+        """Search for earlier requests with the same photo nearby, then index this one"""
+        if self.duplicates is None:
+            return []
+        try:
+            req = self.requests_col.find_one(
+                {"_id": request_id}, {"location": 1, "timestamp": 1}) or {}
+            location = req.get("location")
+            timestamp = request_time(req.get("timestamp"))
+
+            matches = self.duplicates.search(location, timestamp, vector, exclude=request_id)
+            self.duplicates.add(request_id, location, timestamp, vector)
+            if matches:
+                logger.info(f"Request {request_id} looks like a duplicate of {matches}")
+
+            with self._lock:
+                self._unsaved += 1
+                checkpoint = self._unsaved >= DUPLICATE_CHECKPOINT_EVERY
+                if checkpoint:
+                    self._unsaved = 0
+            if checkpoint:
+                self.duplicates.prune()
+                self.duplicates.save()
+            return matches
+        except Exception as e:
+            logger.error(f"Duplicate check failed for {request_id}: {str(e)}")
+            return []
+
+    def resume_pending(self, limit=100):
+        """Requeue analyses left pending by a restart or a full queue"""
+        pending = self.requests_col.find(
+            {"photo_analysis.status": PENDING, "photo_file_id": {"$exists": True}},
+            {"user_id": 1, "photo_file_id": 1, "photo_file_unique_id": 1}
+        ).limit(limit)
+
+        queued = 0
+        for req in pending:
+            if not self.submit(req["_id"], req["user_id"], req["photo_file_id"],
+                               req.get("photo_file_unique_id")):
+                break
+            queued += 1
+        if queued:
+            logger.info(f"Requeued {queued} pending photo analyses")
+        return queued
+
+    def stats(self):
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "flagged_duplicates": self.flagged,
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if self.duplicates is not None and self._unsaved:
+            self.duplicates.save()
@@ -0,0 +1,346 @@
+"""
+Service request model and repository.
+
+Requests arrive from the bot, the web form and the admin tools, and older
+documents use different names and types for the same thing (a
+"%Y-%m-%d %H:%M:%S" string in timestamp, completion_time next to
+completed_at, ObjectId next to "job1"-style ids). ServiceRequest reads all
+of those into one shape; the repository writes times as native datetimes
+and reads only the fields a view renders (see PROJECTIONS).
+
+Existing documents are converted when the bot starts (see
+migrate_in_background), or by hand with:
+
+    python -m utils.service_requests migrate
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from bson import ObjectId
+
+from utils.cache import TTLCache
+from utils.mongo import service_requests
+
+logger = logging.getLogger(__name__)
+
+LEGACY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DISPLAY_TIME_FORMAT = "%Y-%m-%d %H:%M"
+BATCH_SIZE = 100
+PAGE_SIZES = [10, 25, 50, 100]
+# Seconds a filtered total stays cached; unfiltered totals use collection metadata
+COUNT_CACHE_TTL = float(os.getenv("REQUEST_COUNT_CACHE_TTL", "60"))
+
+STATUSES = ["Pending", "Assigned", "In Progress", "Completed"]
+
+# Model attribute -> document field. created_at stays in "timestamp", which
+# the (user_id, status, timestamp) index and the /status digest sort on
+FIELDS = {
+    "id": "_id",
+    "user_id": "user_id",
+    "requester": "requester",
+    "name": "name",
+    "category": "category",
+    "description": "description",
+    "urgency": "urgency",
+    "location": "location",
+    "status": "status",
+    "assigned_to": "assigned_to",
+    "scheduled_time": "scheduled_time",
+    "admin_notes": "admin_notes",
+    "serviceman_notes": "serviceman_notes",
+    "photo_file_id": "photo_file_id",
+    "photo_analysis": "photo_analysis",
+    "possible_duplicates": "possible_duplicates",
+    "completed_by": "completed_by",
+    "created_at": "timestamp",
+    "updated_at": "updated_at",
+    "assigned_at": "assigned_at",
+    "completed_at": "completed_at",
+}
+TIME_FIELDS = ("created_at", "updated_at", "assigned_at", "completed_at")
+# Older documents keep some times under these names, as strings
+LEGACY_FIELDS = {"completed_at": "completion_time", "assigned_at": "assignment_time"}
+# Requests the (timestamp, _id) keyset cannot reach past the first page
+UNORDERED = {"$or": [{"timestamp": {"$type": "string"}}, {"timestamp": {"$exists": False}}]}
+
+
+def _project(*attributes):
+    projection = {FIELDS[a]: 1 for a in attributes}
+    for attribute in attributes:
+        if attribute in LEGACY_FIELDS:
+            projection[LEGACY_FIELDS[attribute]] = 1
+    return projection
+
+
+PROJECTIONS = {
+    # Rows in the admin, serviceman and user lists
+    "list": _project("user_id", "requester", "name", "category", "description", "urgency",
+                     "location", "status", "assigned_to", "scheduled_time", "admin_notes",
+                     "serviceman_notes", "possible_duplicates", "created_at", "updated_at"),
+    # One request in full, minus the stored photo embedding and action log
+    "detail": {"photo_embedding": 0, "logs": 0},
+    # What a Telegram notification about a request needs
+    "notification": _project("user_id", "category", "location", "status", "assigned_to"),
+}
+
+
+def to_datetime(value):
+    """Naive UTC datetime for a stored time (datetime or legacy string), else None"""
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.strptime(str(value)[:19].replace("T", " "), LEGACY_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def format_time(value, default="N/A"):
+    """Display form of a stored time"""
+    value = to_datetime(value)
+    return value.strftime(DISPLAY_TIME_FORMAT) if value else default
+
+
+def id_filter(request_id):
+    """Match bot-created requests (ObjectId) as well as string ids like 'job1'"""
+    if isinstance(request_id, ObjectId):
+        return {"_id": request_id}
+    request_id = str(request_id)
+    if ObjectId.is_valid(request_id):
+        return {"_id": {"$in": [ObjectId(request_id), request_id]}}
+    return {"_id": request_id}
+
+
+class ServiceRequest:
+    """
+    One service request. Attributes not fetched by the projection are None.
+    """
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, **values):
+        for attribute in FIELDS:
+            setattr(self, attribute, values.get(attribute))
+
+    @classmethod
+    def from_doc(cls, doc):
+        values = {attribute: doc.get(field) for attribute, field in FIELDS.items()}
+        for attribute, legacy in LEGACY_FIELDS.items():
+            if values[attribute] is None:
+                values[attribute] = doc.get(legacy)
+        for attribute in TIME_FIELDS:
+            values[attribute] = to_datetime(values[attribute])
+        return cls(**values)
+
+    def to_doc(self):
+        """Document fields for the attributes that are set"""
+        return {FIELDS[a]: getattr(self, a) for a in FIELDS if getattr(self, a) is not None}
+
+    @property
+    def short_id(self):
+        """The "#a1b2c3" reference shown to users"""
+        return str(self.id)[-6:]
+
+    def __repr__(self):
+        return f"ServiceRequest({self.id!r}, {self.category!r}, {self.status!r})"
+
+
+def request_label(request):
+    """Short "Category #a1b2c3" label for pickers"""
+    return f"{request.category or 'Unknown'} #{request.short_id}"
+
+
+class ServiceRequestRepository:
+    """
+    Reads and writes service requests.
+
+    Args:
+        col: service_requests collection
+    """
+
+    def __init__(self, col, count_ttl=COUNT_CACHE_TTL):
+        self.col = col
+        self._counts = TTLCache(max_entries=256, ttl=count_ttl)
+
+    def get(self, request_id, view="detail"):
+        doc = self.col.find_one(id_filter(request_id), PROJECTIONS[view])
+        return ServiceRequest.from_doc(doc) if doc else None
+
+    def find(self, query=None, view="list", sort=None, limit=0, batch_size=BATCH_SIZE):
+        """
+        Requests matching query, streamed from a server-side cursor.
+
+        Args:
+            query (dict): Filter on document fields
+            view (str): Key in PROJECTIONS
+            sort (list): (field, direction) pairs
+            limit (int): 0 for no limit
+        """
+        cursor = self.col.find(query or {}, PROJECTIONS[view], batch_size=batch_size, limit=limit)
+        if sort:
+            cursor = cursor.sort(sort)
+        for doc in cursor:
+            yield ServiceRequest.from_doc(doc)
+
+    def count(self, query=None):
+        return self.col.count_documents(query or {})
+
+    def total(self, query=None):
+        """
+        Approximate number of requests matching query, for page counters.
+
+        Unfiltered totals come from collection metadata; filtered ones are
+        counted and cached for COUNT_CACHE_TTL seconds.
+        """
+        if not query:
+            return self.col.estimated_document_count()
+        key = json.dumps(query, sort_keys=True, default=str)
+        total = self._counts.get(key)
+        if total is None:
+            total = self.count(query)
+            self._counts.set(key, total)
+        return total
+
+    def page(self, query=None, after=None, page_size=PAGE_SIZES[0], descending=True, view="list"):
+        """
+        One page of requests in (created_at, id) order, by keyset rather than skip.
+
+        Args:
+            query (dict): Filter on document fields
+            after (tuple): (created_at, id) of the last request on the previous
+                page, None for the first page
+            page_size (int): Requests per page
+            descending (bool): Newest first
+
+        Requests with a legacy string (or no) timestamp only show up on the
+        first page; a warning is logged until migrate_times() has run.
+
+        Returns:
+            tuple: (list of ServiceRequest, keyset for the next page or None)
+        """
+        direction = -1 if descending else 1
+        if after is not None:
+            unordered = self.unordered_count()
+            if unordered:
+                logger.warning(f"{unordered} requests have string or missing timestamps and are "
+                               f"skipped after the first page; run `python -m utils.service_requests migrate`")
+            created_at, request_id = after
+            beyond = "$lt" if descending else "$gt"
+            keyset = {"$or": [{"timestamp": {beyond: created_at}},
+                              {"timestamp": created_at, "_id": {beyond: request_id}}]}
+            query = {"$and": [query, keyset]} if query else keyset
+        # One extra row tells whether another page follows
+        requests = list(self.find(query, view=view, limit=page_size + 1,
+                                  sort=[("timestamp", direction), ("_id", direction)]))
+        if len(requests) <= page_size:
+            return requests, None
+        requests = requests[:page_size]
+        return requests, (requests[-1].created_at, requests[-1].id)
+
+    def unordered_count(self):
+        """Requests still waiting for migrate_times(), cached like total()"""
+        return self.total(UNORDERED)
+
+    def create(self, request):
+        """Insert a new request; returns its id"""
+        request.created_at = request.created_at or datetime.utcnow()
+        request.status = request.status or "Pending"
+        request.id = self.col.insert_one(request.to_doc()).inserted_id
+        return request.id
+
+    def update(self, request_id, query=None, **changes):
+        """
+        Set attributes on a request (times as datetimes) and stamp updated_at.
+
+        Args:
+            query (dict): Extra conditions, e.g. {"assigned_to": username}
+
+        Returns:
+            bool: Whether a request was modified
+        """
+        fields = {FIELDS[attribute]: value for attribute, value in changes.items()}
+        fields["updated_at"] = datetime.utcnow()
+        result = self.col.update_one({**id_filter(request_id), **(query or {})}, {"$set": fields})
+        return result.modified_count == 1
+
+    def log_action(self, request_id, action, by_user):
+        self.col.update_one(id_filter(request_id), {"$push": {"logs": {
+            "action": action, "by": by_user, "timestamp": datetime.utcnow()}}})
+
+    def migrate_times(self):
+        """
+        Rewrite legacy string times as datetimes, and date requests saved
+        without a timestamp by their ObjectId, so every request has a place
+        in the (timestamp, _id) order. Returns the number of requests changed.
+        """
+        changed = 0
+        legacy = UNORDERED["$or"] + [{field: {"$exists": True}} for field in LEGACY_FIELDS.values()]
+        projection = {"timestamp": 1, **{field: 1 for field in LEGACY_FIELDS.values()},
+                      **{FIELDS[a]: 1 for a in LEGACY_FIELDS}}
+        for doc in self.col.find({"$or": legacy}, projection, batch_size=BATCH_SIZE):
+            fields, unset = {}, {}
+            if isinstance(doc.get("timestamp"), str) and to_datetime(doc["timestamp"]):
+                fields["timestamp"] = to_datetime(doc["timestamp"])
+            elif "timestamp" not in doc and isinstance(doc["_id"], ObjectId):
+                fields["timestamp"] = doc["_id"].generation_time.replace(tzinfo=None)
+            for attribute, field in LEGACY_FIELDS.items():
+                if field in doc:
+                    unset[field] = ""
+                    if doc.get(FIELDS[attribute]) is None and to_datetime(doc[field]):
+                        fields[FIELDS[attribute]] = to_datetime(doc[field])
+            update = {"$set": fields} if fields else {}
+            if unset:
+                update["$unset"] = unset
+            if update:
+                self.col.update_one({"_id": doc["_id"]}, update)
+                changed += 1
+        self._counts.clear()
+        return changed
+
+
+_repository = None
+
+
+def get_requests_repo():
+    """Repository on the shared service_requests collection"""
+    global _repository
+    if _repository is None:
+        _repository = ServiceRequestRepository(service_requests())
+    return _repository
+
+
+def migrate_in_background(repo=None, wait=False):
+    """
+    Run migrate_times() on a background thread; safe to call on every start.
+    """
+    def run():
+        try:
+            changed = (repo or get_requests_repo()).migrate_times()
+            if changed:
+                logger.info(f"Migrated {changed} service requests to datetime timestamps")
+        except Exception as e:
+            logger.error(f"Service request migration failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name="request-migration", daemon=True)
+    thread.start()
+    if wait:
+        thread.join()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service request maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Store legacy string times as datetimes")
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    print(f"{get_requests_repo().migrate_times()} requests migrated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
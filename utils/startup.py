@@ -0,0 +1,74 @@
+"""
+Startup timing for the bot runner.
+Records how long each import and initialization step takes so slow starts
+can be traced to a module or client, and warms heavy resources in the
+background once the bot is already answering.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Collects named step durations and logs them as one report"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.steps = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        """Time the enclosed block as one named step"""
+        began = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, self.clock() - began)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.steps.append((name, seconds))
+
+    def report(self, title="Startup"):
+        """Log each step and the total, slowest first; returns the report text"""
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s[1], reverse=True)
+        total = self.clock() - self.started
+
+        lines = [f"{title} took {total * 1000:.0f} ms"]
+        for name, seconds in steps:
+            lines.append(f"  {name:<32} {seconds * 1000:8.0f} ms")
+        text = "\n".join(lines)
+        logger.info(text)
+        return text
+
+
+def warm_up_in_background(tasks, timer=None):
+    """
+    Run slow initializers on a daemon thread after the bot has started.
+
+    Args:
+        tasks (list): (name, callable) pairs, run in order
+        timer (StartupTimer): Optional timer to record each task in
+
+    Returns:
+        threading.Thread: The started warm-up thread
+    """
+    def run():
+        warm = timer or StartupTimer()
+        for name, task in tasks:
+            try:
+                with warm.step(name):
+                    task()
+            except Exception as e:
+                logger.warning(f"Warm-up of {name} failed, it will load on first use: {str(e)}")
+        warm.report("Background warm-up")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,410 @@
+"""
+Conversation state storage for the Telegram bot.
+Keeps each chat's in-progress request flow (AWAITING_* state plus the fields
+collected so far) and short-lived claims used for deduplication, in a backend
+that can be shared between bot processes and survives restarts.
+
+Backends: in-memory (single process), MongoDB (TTL-indexed collection) and
+Redis or any Redis-compatible server. Select one with BOT_STATE_BACKEND.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from utils.cache import DedupCache
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("BOT_STATE_BACKEND", "memory")
+STATE_TTL = int(os.getenv("BOT_STATE_TTL", str(24 * 3600)))
+MAX_CLAIMS = int(os.getenv("BOT_STATE_MAX_CLAIMS", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class StateStore:
+    """
+    Interface shared by all backends.
+
+    Values are dicts with at least a "state" key (e.g. "AWAITING_LOCATION").
+    Every value expires ttl seconds after it was last written.
+    """
+
+    def get(self, chat_id):
+        """Return the chat's state dict, or None"""
+        raise NotImplementedError
+
+    def set(self, chat_id, value, ttl=None):
+        """Write a chat's state; may be batched with other writes"""
+        raise NotImplementedError
+
+    def delete(self, chat_id):
+        """Clear a chat's state; may be batched with other writes"""
+        raise NotImplementedError
+
+    def compare_and_set(self, chat_id, expected_state, value, ttl=None):
+        """
+        Atomically replace a chat's state if its current "state" matches.
+
+        Args:
+            chat_id: Telegram chat id
+            expected_state (str): Required current state (None = no state)
+            value (dict): New value, or None to clear the state
+            ttl (int): Expiry in seconds (defaults to STATE_TTL)
+
+        Returns:
+            bool: True if this caller performed the transition
+        """
+        raise NotImplementedError
+
+    def claim(self, namespace, key, ttl):
+        """Record key once; returns False if it was already claimed"""
+        raise NotImplementedError
+
+    def release(self, namespace, key):
+        """Forget a claim so the key can be claimed again"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write out any batched writes"""
+
+    def close(self):
+        self.flush()
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; state is lost on restart"""
+
+    def __init__(self, default_ttl=STATE_TTL, max_claims=MAX_CLAIMS, clock=time.monotonic):
+        self.default_ttl = default_ttl
+        self.max_claims = max_claims
+        self.clock = clock
+        self._states = {}
+        # namespace -> DedupCache, so claims have a fixed memory ceiling
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def _live(self, table, key, now):
+        entry = table.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del table[key]
+            return None
+        return entry
+
+    def get(self, chat_id):
+        with self._lock:
+            entry = self._live(self._states, chat_id, self.clock())
+            return dict(entry[0]) if entry else None
+
+    def set(self, chat_id, value, ttl=None):
+        with self._lock:
+            self._states[chat_id] = (
+                dict(value), self.clock() + (ttl or self.default_ttl))
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._states.pop(chat_id, None)
+
+    def compare_and_set(self, chat_id, expected_state, value, ttl=None):
+        with self._lock:
+            now = self.clock()
+            entry = self._live(self._states, chat_id, now)
+            current = entry[0].get("state") if entry else None
+            if current != expected_state:
+                return False
+            if value is None:
+                self._states.pop(chat_id, None)
+            else:
+                self._states[chat_id] = (dict(value), now + (ttl or self.default_ttl))
+            return True
+
+    def _claim_cache(self, namespace):
+        with self._lock:
+            cache = self._claims.get(namespace)
+            if cache is None:
+                cache = self._claims[namespace] = DedupCache(
+                    self.max_claims, self.default_ttl, self.clock)
+            return cache
+
+    def claim(self, namespace, key, ttl):
+        return self._claim_cache(namespace).add(key, ttl)
+
+    def release(self, namespace, key):
+        self._claim_cache(namespace).discard(key)
+
+
+class _BatchingStore(StateStore):
+    """
+    Buffers plain set/delete calls and writes them out together.
+
+    Reads consult the buffer first so a process always sees its own writes.
+    compare_and_set and claims are never batched.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=0.2):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="state-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _buffered(self, chat_id):
+        """(True, value) if the chat has an unflushed write"""
+        with self._pending_lock:
+            if chat_id in self._pending:
+                op = self._pending[chat_id]
+                return True, (dict(op[1]) if op[0] == "set" else None)
+        return False, None
+
+    def _buffer(self, chat_id, op):
+        with self._pending_lock:
+            self._pending[chat_id] = op
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def set(self, chat_id, value, ttl=None):
+        self._buffer(chat_id, ("set", dict(value), ttl or STATE_TTL))
+
+    def delete(self, chat_id):
+        self._buffer(chat_id, ("delete", None, None))
+
+    def get(self, chat_id):
+        found, value = self._buffered(chat_id)
+        if found:
+            return value
+        return self._read(chat_id)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error(f"State flush failed ({len(batch)} writes): {str(e)}")
+                    # Put the writes back unless newer ones replaced them
+                    with self._pending_lock:
+                        for chat_id, op in batch.items():
+                            self._pending.setdefault(chat_id, op)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def _read(self, chat_id):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+
+class MongoStateStore(_BatchingStore):
+    """
+    MongoDB-backed store.
+
+    One document per chat ({_id: "state:<chat_id>"}) and per claim
+    ({_id: "<namespace>:<key>"}), expired by a TTL index on expires_at
+    (declared in utils.indexes, so building the store does no I/O).
+    """
+
+    def __init__(self, collection, **kwargs):
+        self.col = collection
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def _state_id(chat_id):
+        return f"state:{chat_id}"
+
+    @staticmethod
+    def _expiry(ttl):
+        return datetime.utcnow() + timedelta(seconds=ttl or STATE_TTL)
+
+    def _read(self, chat_id):
+        # The TTL monitor only runs once a minute, so filter expired docs too
+        doc = self.col.find_one({
+            "_id": self._state_id(chat_id),
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        return doc["value"] if doc else None
+
+    def _write_batch(self, batch):
+        from pymongo import ReplaceOne, DeleteOne
+
+        ops = []
+        for chat_id, (kind, value, ttl) in batch.items():
+            doc_id = self._state_id(chat_id)
+            if kind == "set":
+                ops.append(ReplaceOne({"_id": doc_id}, {
+                    "value": value,
+                    "state": value.get("state"),
+                    "expires_at": self._expiry(ttl)
+                }, upsert=True))
+            else:
+                ops.append(DeleteOne({"_id": doc_id}))
+        self.col.bulk_write(ops, ordered=False)
+
+    def compare_and_set(self, chat_id, expected_state, value, ttl=None):
+        from pymongo.errors import DuplicateKeyError
+
+        # Make sure a batched write for this chat isn't applied after us
+        self.flush()
+        now = datetime.utcnow()
+        doc_id = self._state_id(chat_id)
+
+        if expected_state is None:
+            query = {"_id": doc_id, "$or": [
+                {"state": None}, {"expires_at": {"$lte": now}}]}
+        else:
+            query = {"_id": doc_id, "state": expected_state,
+                     "expires_at": {"$gt": now}}
+
+        if value is None:
+            if expected_state is None:
+                return True
+            return self.col.delete_one(query).deleted_count == 1
+
+        update = {"$set": {
+            "value": value,
+            "state": value.get("state"),
+            "expires_at": self._expiry(ttl)
+        }}
+        try:
+            # Upserting when no state is expected turns "someone else already
+            # has a state" into a duplicate key error instead of an overwrite
+            result = self.col.update_one(query, update, upsert=expected_state is None)
+        except DuplicateKeyError:
+            return False
+        return result.matched_count == 1 or result.upserted_id is not None
+
+    def claim(self, namespace, key, ttl):
+        from pymongo.errors import DuplicateKeyError
+
+        doc_id = f"{namespace}:{key}"
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
+        try:
+            self.col.insert_one({"_id": doc_id, "expires_at": expires_at})
+            return True
+        except DuplicateKeyError:
+            # An expired claim the TTL monitor hasn't removed yet can be taken over
+            result = self.col.update_one(
+                {"_id": doc_id, "expires_at": {"$lte": now}},
+                {"$set": {"expires_at": expires_at}}
+            )
+            return result.modified_count == 1
+
+    def release(self, namespace, key):
+        self.col.delete_one({"_id": f"{namespace}:{key}"})
+
+
+# Swap a chat's state only if its current "state" field matches ARGV[1]
+_REDIS_CAS = """
+local current = redis.call('HGET', KEYS[1], 'state')
+if (ARGV[1] == '' and not current) or current == ARGV[1] then
+    if ARGV[2] == '' then
+        redis.call('DEL', KEYS[1])
+    else
+        redis.call('DEL', KEYS[1])
+        redis.call('HSET', KEYS[1], 'state', ARGV[3], 'value', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+    end
+    return 1
+end
+return 0
+"""
+
+
+class RedisStateStore(_BatchingStore):
+    """
+    Redis (or Redis-compatible) store.
+
+    Each chat is a hash {state, value} with a key expiry; claims are
+    SET NX EX keys. Batched writes go out in one pipeline.
+    """
+
+    def __init__(self, client, prefix="kk", **kwargs):
+        self.redis = client
+        self.prefix = prefix
+        self._cas = client.register_script(_REDIS_CAS)
+        super().__init__(**kwargs)
+
+    def _key(self, chat_id):
+        return f"{self.prefix}:state:{chat_id}"
+
+    def _read(self, chat_id):
+        raw = self.redis.hget(self._key(chat_id), "value")
+        return json.loads(raw) if raw else None
+
+    def _write_batch(self, batch):
+        pipe = self.redis.pipeline(transaction=False)
+        for chat_id, (kind, value, ttl) in batch.items():
+            key = self._key(chat_id)
+            pipe.delete(key)
+            if kind == "set":
+                pipe.hset(key, mapping={
+                    "state": value.get("state") or "",
+                    "value": json.dumps(value)
+                })
+                pipe.expire(key, ttl)
+        pipe.execute()
+
+    def compare_and_set(self, chat_id, expected_state, value, ttl=None):
+        self.flush()
+        args = [
+            expected_state or "",
+            json.dumps(value) if value is not None else "",
+            (value or {}).get("state") or "",
+            ttl or STATE_TTL,
+        ]
+        return bool(self._cas(keys=[self._key(chat_id)], args=args))
+
+    def claim(self, namespace, key, ttl):
+        return bool(self.redis.set(
+            f"{self.prefix}:{namespace}:{key}", 1, nx=True, ex=max(1, int(ttl))))
+
+    def release(self, namespace, key):
+        self.redis.delete(f"{self.prefix}:{namespace}:{key}")
+
+
+def create_state_store(backend=STATE_BACKEND):
+    """Build the configured state backend"""
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "mongo":
+        from utils.mongo import get_collection, BOT_STATE
+        return MongoStateStore(get_collection(BOT_STATE))
+    if backend == "redis":
+        import redis
+        return RedisStateStore(redis.Redis.from_url(REDIS_URL))
+    raise ValueError(f"Unknown BOT_STATE_BACKEND: {backend}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Return the process-wide state store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_state_store()
+                logger.info(f"Using {type(_store).__name__} for conversation state")
+    return _store
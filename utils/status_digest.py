@@ -0,0 +1,139 @@
+"""
+/status digest for the Telegram bot.
+One aggregation returns a page of active requests (with the assigned
+specialist joined in), the most recent completed requests and the counts,
+which render into a single message with inline paging buttons.
+"""
+import math
+
+from utils.service_requests import format_time
+
+PAGE_SIZE = 5
+COMPLETED_SHOWN = 3
+CALLBACK_PREFIX = "status_page:"
+
+DIGEST_FIELDS = {"category": 1, "status": 1, "timestamp": 1, "completed_at": 1,
+                 "completion_time": 1, "assigned_to": 1}
+
+
+def status_digest_pipeline(user_id, page=0, page_size=PAGE_SIZE, users_collection="users"):
+    """
+    Build the aggregation behind /status.
+
+    $sort follows $match directly, so both are pushed down into the query
+    layer and sort only this user's requests, found through the
+    (user_id, status, timestamp) index; the specialist lookup only runs for
+    the page of active requests shown. Completed requests are re-sorted by
+    completion time, falling back to submission time for old documents
+    without completed_at.
+    """
+    completed = {"status": "Completed"}
+    return [
+        {"$match": {"user_id": str(user_id)}},
+        {"$sort": {"timestamp": -1, "_id": -1}},
+        {"$project": DIGEST_FIELDS},
+        {"$facet": {
+            "active": [
+                {"$match": {"status": {"$ne": "Completed"}}},
+                {"$skip": page * page_size},
+                {"$limit": page_size},
+                {"$lookup": {
+                    "from": users_collection,
+                    "localField": "assigned_to",
+                    "foreignField": "username",
+                    "as": "specialist"
+                }},
+                {"$addFields": {"specialist": {"$arrayElemAt": [
+                    {"$map": {"input": "$specialist", "in": {
+                        "name": "$$this.name", "telegram": "$$this.telegram"}}},
+                    0
+                ]}}},
+            ],
+            "completed": [
+                {"$match": completed},
+                {"$addFields": {"finished_at": {"$ifNull": ["$completed_at", "$timestamp"]}}},
+                {"$sort": {"finished_at": -1, "_id": -1}},
+                {"$limit": COMPLETED_SHOWN},
+            ],
+            "counts": [
+                {"$group": {
+                    "_id": {"$eq": ["$status", "Completed"]},
+                    "count": {"$sum": 1}
+                }},
+            ],
+        }},
+    ]
+
+
+def fetch_status_digest(requests_col, user_id, page=0, page_size=PAGE_SIZE,
+                        users_collection="users"):
+    """Run the digest aggregation and return its single result document"""
+    pipeline = status_digest_pipeline(user_id, page, page_size, users_collection)
+    result = next(requests_col.aggregate(pipeline), None) or {}
+
+    counts = {c["_id"]: c["count"] for c in result.get("counts", [])}
+    return {
+        "active": result.get("active", []),
+        "completed": result.get("completed", []),
+        "active_total": counts.get(False, 0),
+        "completed_total": counts.get(True, 0),
+    }
+
+
+def render_status_digest(digest, page=0, page_size=PAGE_SIZE):
+    """
+    Turn a digest into one Telegram message.
+
+    Returns:
+        tuple: (text, reply_markup or None)
+    """
+    active_total = digest["active_total"]
+    completed_total = digest["completed_total"]
+    if not active_total and not completed_total:
+        return "You have no requests in the system.", None
+
+    pages = max(1, math.ceil(active_total / page_size))
+    lines = []
+
+    if active_total:
+        header = "📋 *Your Active Requests"
+        if pages > 1:
+            header += f" ({page + 1}/{pages})"
+        lines.append(header + ":*")
+        for req in digest["active"]:
+            status = req.get("status", "Pending")
+            status_icon = "🟡" if status == "Pending" else "🟢"
+            lines.append(
+                f"\n{status_icon} *Request #{str(req['_id'])[-6:]}*\n"
+                f"• *Category*: {req.get('category', 'N/A')}\n"
+                f"• *Status*: {status}\n"
+                f"• *Submitted*: {format_time(req.get('timestamp'))}"
+            )
+            specialist = req.get("specialist")
+            if specialist:
+                lines.append(
+                    f"• *Specialist*: {specialist.get('name', '')} (@{specialist.get('telegram', '')})")
+
+    # Completed requests only on the first page
+    if completed_total and page == 0:
+        if lines:
+            lines.append("")
+        lines.append("✅ *Recently Completed Requests:*")
+        for req in digest["completed"]:
+            lines.append(
+                f"\n✓ *Request #{str(req['_id'])[-6:]}*\n"
+                f"• *Category*: {req.get('category', 'N/A')}\n"
+                f"• *Completed*: {format_time(req.get('completed_at') or req.get('completion_time') or req.get('timestamp'))}"
+            )
+        if completed_total > COMPLETED_SHOWN:
+            lines.append(
+                f"\n_...and {completed_total - COMPLETED_SHOWN} more completed requests_")
+
+    buttons = []
+    if page > 0:
+        buttons.append({"text": "◀ Previous", "callback_data": f"{CALLBACK_PREFIX}{page - 1}"})
+    if page + 1 < pages:
+        buttons.append({"text": "Next ▶", "callback_data": f"{CALLBACK_PREFIX}{page + 1}"})
+    reply_markup = {"inline_keyboard": [buttons]} if buttons else None
+
+    return "\n".join(lines), reply_markup
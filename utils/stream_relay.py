@@ -0,0 +1,179 @@
+"""
+Relay a streamed reply (e.g. LLM tokens) into a Telegram message.
+
+A placeholder is sent as soon as the relay starts and then edited in place
+(editMessageText) as text arrives. Edits go through the outbound queue and
+are coalesced: at most one is in flight, at most one per STREAM_EDIT_INTERVAL,
+and each carries all text received so far. Intermediate edits are sent
+without parse_mode because half a reply is rarely valid Markdown; the final
+edit applies it and falls back to plain text if Telegram rejects it.
+"""
+import os
+import time
+import logging
+import threading
+
+from utils.metrics import LatencyWindow
+from utils.outbound import get_outbound, OutboundError, PRIORITY_REPLY
+
+logger = logging.getLogger(__name__)
+
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Telegram rejects messages over 4096 characters; leave room for the cursor
+MAX_MESSAGE_CHARS = 4000
+PLACEHOLDER = "✍️ …"
+CURSOR = " ▌"
+FINAL_TIMEOUT = 30
+
+# Shared across relays: time from start() to the first edit carrying text
+FIRST_TEXT_LATENCY = LatencyWindow()
+
+
+def _split_point(text, limit):
+    """Last paragraph, line or word break before limit"""
+    for separator in ("\n\n", "\n", " "):
+        cut = text.rfind(separator, 0, limit)
+        if cut > limit // 2:
+            return cut + len(separator)
+    return limit
+
+
+class StreamRelay:
+    """
+    One streamed reply to a chat.
+
+    Args:
+        chat_id: Telegram chat
+        outbound (OutboundQueue): Defaults to the process-wide queue
+        interval (float): Minimum seconds between edits
+        parse_mode (str): Applied to the final text only
+    """
+
+    def __init__(self, chat_id, outbound=None, interval=STREAM_EDIT_INTERVAL,
+                 parse_mode="Markdown", priority=PRIORITY_REPLY, clock=time.monotonic):
+        self.chat_id = chat_id
+        self.outbound = outbound or get_outbound()
+        self.interval = interval
+        self.parse_mode = parse_mode
+        self.priority = priority
+        self.clock = clock
+        self.text = ""        # text of the current message
+        self.edits = 0
+        self._shown = None    # text the last edit carried
+        self._message = None  # Future for the current message's sendMessage
+        self._edit = None     # Future for the edit in flight
+        self._last_edit = 0.0
+        self._started = None
+        self._first_shown = None  # when the first edit with text was delivered
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Send the placeholder; call before waiting on the first token"""
+        self._started = self.clock()
+        self._message = self._send({"chat_id": self.chat_id, "text": PLACEHOLDER})
+        return self
+
+    def _send(self, payload, method="sendMessage"):
+        return self.outbound.send(self.chat_id, payload, method=method, priority=self.priority)
+
+    def _message_id(self, wait=False):
+        """The current message's id, None while it is being sent or if sending failed"""
+        if self._message is None or (not wait and not self._message.done()):
+            return None
+        try:
+            return self._message.result(FINAL_TIMEOUT)["result"]["message_id"]
+        except Exception as e:
+            logger.warning(f"Streaming placeholder to {self.chat_id} failed: {str(e)}")
+            self._message = None
+            return None
+
+    def feed(self, delta):
+        """Append streamed text and edit the message if it is time to"""
+        if not delta:
+            return
+        with self._lock:
+            self.text += delta
+            while len(self.text) > MAX_MESSAGE_CHARS:
+                self._roll_over()
+            self._maybe_edit()
+
+    def _maybe_edit(self):
+        if self._edit is not None and not self._edit.done():
+            return
+        if self.clock() - self._last_edit < self.interval or self.text == self._shown:
+            return
+        message_id = self._message_id()
+        if message_id is None:
+            return
+        self._edit = self._send({"chat_id": self.chat_id, "message_id": message_id,
+                                 "text": self.text + CURSOR}, method="editMessageText")
+        self._shown = self.text
+        self._last_edit = self.clock()
+        self.edits += 1
+        if self._first_shown is None:
+            self._first_shown = self._last_edit
+            self._edit.add_done_callback(self._record_first_text)
+
+    def _record_first_text(self, future):
+        if not future.exception():
+            self._first_shown = self.clock()
+            FIRST_TEXT_LATENCY.record(self._first_shown - self._started)
+
+    def _roll_over(self):
+        """Finish the current message at a break and continue in a new one"""
+        cut = _split_point(self.text, MAX_MESSAGE_CHARS)
+        head, self.text = self.text[:cut], self.text[cut:]
+        self._finalize(head)
+        self._shown = None
+        self._message = self._send({"chat_id": self.chat_id, "text": self.text or PLACEHOLDER})
+
+    def _finalize(self, text):
+        """Final edit of the current message, with parse_mode and a plain-text fallback"""
+        if self._edit is not None:
+            try:
+                self._edit.result(FINAL_TIMEOUT)
+            except Exception:
+                pass  # superseded by the final edit below
+        message_id = self._message_id(wait=True)
+        payload = {"chat_id": self.chat_id, "text": text or "…"}
+        method = "sendMessage"
+        if message_id is not None:
+            payload["message_id"] = message_id
+            method = "editMessageText"
+        if self.parse_mode:
+            payload["parse_mode"] = self.parse_mode
+        try:
+            return self._send(payload, method=method).result(FINAL_TIMEOUT)
+        except OutboundError as e:
+            if "parse" not in str(e).lower() or not self.parse_mode:
+                raise
+            payload.pop("parse_mode")
+            return self._send(payload, method=method).result(FINAL_TIMEOUT)
+
+    def finish(self):
+        """Deliver the complete text; returns it"""
+        with self._lock:
+            self._finalize(self.text)
+            if self._first_shown is None and self._started is not None:
+                FIRST_TEXT_LATENCY.record(self.clock() - self._started)
+            return self.text
+
+    def stats(self):
+        return {
+            "edits": self.edits,
+            "first_text_seconds": (round(self._first_shown - self._started, 3)
+                                   if self._first_shown is not None else None),
+        }
+
+
+def relay_stream(chat_id, chunks, **kwargs):
+    """Stream an iterable of text chunks into one (or more) Telegram messages"""
+    relay = StreamRelay(chat_id, **kwargs).start()
+    try:
+        for chunk in chunks:
+            relay.feed(chunk)
+    except Exception as e:
+        logger.error(f"Stream to {chat_id} broke off: {str(e)}")
+        relay.feed("\n\n⚠️ Reply interrupted, please try again.")
+    relay.finish()
+    return relay
@@ -0,0 +1,145 @@
+"""
+Shared Telegram Bot API client.
+All bot and notification traffic goes through one pooled keep-alive session
+instead of opening a new connection per request.
+"""
+import os
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "20"))
+# Delay after the first failed getUpdates; doubles per failure up to the cap
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1"))
+POLL_BACKOFF_MAX = float(os.getenv("POLL_BACKOFF_MAX", "60"))
+
+
+# Streaming downloads are read in chunks of this size
+CHUNK_SIZE = 64 * 1024
+
+
+def poll_delay(failures):
+    """Jittered exponential backoff before the next poll after failures in a row"""
+    cap = min(POLL_BACKOFF_MAX, POLL_BACKOFF * 2 ** (failures - 1))
+    return random.uniform(cap / 2, cap)
+
+
+class DownloadTooLarge(ValueError):
+    """A download exceeded its max_bytes cap"""
+
+
+def _check_size(size, max_bytes):
+    if max_bytes is not None and size > max_bytes:
+        raise DownloadTooLarge(f"File is larger than {max_bytes} bytes")
+
+
+def _read_capped(content_length, chunks, max_bytes=None, into=None):
+    """Collect streamed chunks, stopping as soon as max_bytes is exceeded"""
+    if content_length:
+        _check_size(int(content_length), max_bytes)
+
+    buffer = into if into is not None else bytearray()
+    del buffer[:]
+    for chunk in chunks:
+        buffer += chunk
+        _check_size(len(buffer), max_bytes)
+
+    return memoryview(buffer) if into is not None else bytes(buffer)
+
+
+def _error_result(status_code, text):
+    """Shape a non-JSON HTTP failure like a Telegram error response"""
+    return {"ok": False, "error_code": status_code, "description": text}
+
+
+class TelegramAPI:
+    """
+    Blocking Telegram client backed by a pooled requests.Session.
+
+    Args:
+        token (str): Bot token
+        base_url (str): API root, overridable for tests
+        pool_size (int): Maximum keep-alive connections per host
+    """
+
+    def __init__(self, token=TOKEN, base_url=API_URL, pool_size=POOL_SIZE):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def method_url(self, method):
+        return f"{self.base_url}/bot{self.token}/{method}"
+
+    def file_url(self, file_path):
+        return f"{self.base_url}/file/bot{self.token}/{file_path}"
+
+    def call(self, method, payload=None, timeout=10):
+        """
+        Call a Bot API method.
+
+        Returns:
+            dict: Telegram's JSON response ({"ok": ..., "result"/"description": ...})
+
+        Raises:
+            requests.RequestException: On network failure
+        """
+        response = self.session.post(
+            self.method_url(method), json=payload or {}, timeout=timeout)
+        try:
+            return response.json()
+        except ValueError:
+            return _error_result(response.status_code, response.text)
+
+    def download(self, url, timeout=10, max_bytes=None, into=None):
+        """
+        Stream a file (e.g. a photo) over the shared session.
+
+        Args:
+            url (str): File URL
+            timeout (float): Connect/read timeout in seconds
+            max_bytes (int): Abort with DownloadTooLarge beyond this size
+            into (bytearray): Reusable buffer to fill instead of allocating
+
+        Returns:
+            bytes, or a memoryview over into when a buffer is given
+        """
+        with self.session.get(url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            return _read_capped(response.headers.get("Content-Length"),
+                                response.iter_content(CHUNK_SIZE), max_bytes, into)
+
+    def close(self):
+        self.session.close()
+
+
+_api = None
+_api_lock = threading.Lock()
+
+
+def get_api():
+    """Return the process-wide Telegram client"""
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                _api = TelegramAPI()
+    return _api
+
+
+def set_api(api):
+    """Swap the process-wide client (used by the async runtime and tests)"""
+    global _api
+    with _api_lock:
+        previous, _api = _api, api
+    return previous
@@ -1,7 +1,7 @@
 # Import statements (make sure they work when imported from project root)
 import os
 import sys
-import requests
+import math
 import time
 import logging
 from dotenv import load_dotenv
@@ -9,10 +9,22 @@ from datetime import datetime
 from bson import ObjectId
 
 # Standard imports for this module that should work when called from project root
-from utils.image_processing import analyze_telegram_photo
 from utils.db import requests_col, users_col
 from service_agents.serviceman_agent import run_agent
 from utils.notifications import notify_assignment, notify_completion
+from utils.telegram_api import get_api, poll_delay
+from utils.outbound import get_outbound, PRIORITY_REPLY, PRIORITY_CHATTER
+from utils.stream_relay import relay_stream
+from utils.state_store import get_state_store
+from utils.cache import DedupCache
+from utils.user_cache import get_user_profiles
+from utils.dispatcher import update_chat_id
+from utils.categories import service_labels
+from utils.photo_analysis import PhotoAnalysisWorker, PENDING as PHOTO_ANALYSIS_PENDING
+from utils.status_digest import (
+    fetch_status_digest, render_status_digest, CALLBACK_PREFIX,
+    PAGE_SIZE as STATUS_PAGE_SIZE
+)
 
 # Initialize
 load_dotenv()
@@ -20,59 +32,84 @@ TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 # State tracking
 LAST_UPDATE_ID = 0
-PROCESSED_MESSAGES = set()
-USER_STATES = {}
-# Store message IDs to prevent duplicates
-SENT_MESSAGES = set()
-
-
-def send_message(chat_id, text, reply_markup=None, parse_mode="Markdown"):
-    """Enhanced message sender with deduplication and error handling"""
+# Conversation state lives in get_state_store(), shared by every bot process
+# using the same backend and built on first use
+# How long a handled update is remembered for deduplication
+PROCESSED_TTL = 24 * 3600
+# Local front for the shared claim: duplicates are rejected without a round trip
+PROCESSED_UPDATES = DedupCache(max_entries=5000, ttl=PROCESSED_TTL)
+# Recently sent message hashes, to avoid sending the same message twice
+SENT_MESSAGES = DedupCache(max_entries=1000, ttl=300)
+# Relay LLM answers token by token instead of waiting for the full completion
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "1") != "0"
+
+
+def send_message(chat_id, text, reply_markup=None, parse_mode="Markdown",
+                 priority=PRIORITY_REPLY, dedup=True):
+    """Queue a message for rate-limited delivery, skipping duplicates"""
     # Create a simple hash of the message to prevent duplicates
     message_hash = f"{chat_id}:{text[:20]}"
-    if message_hash in SENT_MESSAGES:
+    if dedup and not SENT_MESSAGES.add(message_hash):
         logging.debug(f"Skipping duplicate message: {message_hash}")
         return
 
-    try:
-        payload = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": parse_mode
-        }
-        if reply_markup:
-            payload["reply_markup"] = reply_markup
+    payload = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": parse_mode
+    }
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
 
-        response = requests.post(
-            f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-            json=payload,
-            timeout=10
-        )
+    # Forget the hash again if delivery fails so a retry can go out
+    def forget_on_failure(future):
+        if future.exception():
+            SENT_MESSAGES.discard(message_hash)
 
-        if response.ok:
-            # Add to sent messages cache
-            SENT_MESSAGES.add(message_hash)
-            # Limit cache size to prevent memory issues
-            if len(SENT_MESSAGES) > 1000:
-                SENT_MESSAGES.clear()
-        else:
-            logging.error(f"Message failed to {chat_id}: {response.text}")
-    except Exception as e:
-        logging.error(f"send_message error: {str(e)}")
+    future = get_outbound().send(chat_id, payload, priority=priority)
+    future.add_done_callback(forget_on_failure)
+    return future
+
+
+def reply_from_agent(chat_id, text, username):
+    """Answer a serviceman, streaming the reply when it comes from the LLM"""
+    response = run_agent(text, username, stream=AGENT_STREAMING)
+    if isinstance(response, str):
+        send_message(chat_id, response)
+    else:
+        relay_stream(chat_id, response)
+
+
+def send_analysis_result(chat_id, text):
+    """Deliver a photo analysis follow-up (never deduplicated, each names its request)"""
+    return send_message(chat_id, text, dedup=False)
+
+
+# Photo analysis runs off the conversation path; run_bot attaches the
+# analysis cache once the database is up
+PHOTO_WORKER = PhotoAnalysisWorker(requests_col, send_analysis_result)
 
 
 def is_serviceman(chat_id):
     """Check if user has serviceman role"""
-    user = users_col.find_one({"telegram_id": str(chat_id)})
-    return user and user.get("role") == "serviceman"
+    user = get_user_profiles().get(chat_id)
+    return bool(user) and user.get("role") == "serviceman"
 
 
 def get_serviceman_username(chat_id):
     """Fetch serviceman's internal username"""
-    user = users_col.find_one({"telegram_id": str(chat_id)})
+    user = get_user_profiles().get(chat_id)
     return user.get("username") if user else None
 
 
+def prefetch_senders(updates):
+    """Load the profiles of everyone in an update batch with one query"""
+    try:
+        get_user_profiles().prefetch(update_chat_id(u) for u in updates)
+    except Exception as e:
+        logging.error(f"Profile prefetch failed: {str(e)}")
+
+
 def send_welcome(chat_id):
     """Updated welcome with role detection"""
     if is_serviceman(chat_id):
@@ -91,7 +128,8 @@ def send_welcome(chat_id):
         reply_markup={
             "keyboard": buttons,
             "resize_keyboard": True
-        }
+        },
+        priority=PRIORITY_CHATTER
     )
 
 
@@ -135,8 +173,7 @@ def handle_serviceman_command(chat_id, command):
                     chat_id, f"⚠️ Failed to update job or notify user. Please try again.")
             return
 
-        response = run_agent(command, serviceman_username=username)
-        send_message(chat_id, response)
+        reply_from_agent(chat_id, command, username)
     except Exception as e:
         logging.error(f"Agent error: {str(e)}")
         send_message(chat_id, "🔧 System busy. Try again later.")
@@ -155,16 +192,15 @@ def send_help(chat_id):
         "/submit - Submit a new request\n"
         "/status - Check request status"
     )
-    send_message(chat_id, help_text)
+    send_message(chat_id, help_text, priority=PRIORITY_CHATTER)
 
 
 def start_request_flow(chat_id):
     """Start the request submission flow"""
-    USER_STATES[chat_id] = "AWAITING_CATEGORY"
+    get_state_store().set(chat_id, {"state": "AWAITING_CATEGORY"})
 
-    # Create keyboard with service categories
-    categories = ["Plumbing", "Electrical", "Carpentry",
-                  "Appliance Repair", "Painting", "Other"]
+    # Create keyboard with service categories from the registry
+    categories = service_labels()
     buttons = [[{"text": cat}] for cat in categories]
     buttons.append([{"text": "❌ Cancel"}])
 
@@ -179,18 +215,28 @@ def start_request_flow(chat_id):
     )
 
 
+def advance_state(chat_id, expected, next_state, **fields):
+    """Move a chat from one AWAITING_* state to the next, keeping collected fields"""
+    current = get_state_store().get(chat_id) or {}
+    updated = {**current, **fields, "state": next_state}
+    if not get_state_store().compare_and_set(chat_id, expected, updated):
+        logging.debug(f"Chat {chat_id} is no longer in {expected}")
+        return False
+    return True
+
+
 def handle_category_selection(chat_id, category):
     """Process category selection"""
     if category == "❌ Cancel":
-        USER_STATES.pop(chat_id, None)
+        get_state_store().delete(chat_id)
         send_welcome(chat_id)
         return
 
     # Store category in temporary state
-    if chat_id not in USER_STATES:
-        USER_STATES[chat_id] = {}
-    USER_STATES[chat_id] = {
-        "state": "AWAITING_DESCRIPTION", "category": category}
+    if not get_state_store().compare_and_set(chat_id, "AWAITING_CATEGORY", {
+            "state": "AWAITING_DESCRIPTION", "category": category}):
+        logging.debug(f"Stale category selection from {chat_id}")
+        return
 
     send_message(
         chat_id,
@@ -201,8 +247,9 @@ def handle_category_selection(chat_id, category):
 
 def handle_description(chat_id, description):
     """Process description input"""
-    USER_STATES[chat_id]["description"] = description
-    USER_STATES[chat_id]["state"] = "AWAITING_LOCATION"
+    if not advance_state(chat_id, "AWAITING_DESCRIPTION", "AWAITING_LOCATION",
+                         description=description):
+        return
 
     send_message(
         chat_id,
@@ -212,8 +259,9 @@ def handle_description(chat_id, description):
 
 def handle_location(chat_id, location):
     """Process location input"""
-    USER_STATES[chat_id]["location"] = location
-    USER_STATES[chat_id]["state"] = "AWAITING_PHOTO"
+    if not advance_state(chat_id, "AWAITING_LOCATION", "AWAITING_PHOTO",
+                         location=location):
+        return
 
     send_message(
         chat_id,
@@ -221,72 +269,26 @@ def handle_location(chat_id, location):
     )
 
 
-def handle_photo(chat_id, photo_file_id=None):
+def handle_photo(chat_id, photo_file_id=None, photo_file_unique_id=None):
     """Process photo submission or skip"""
-    request_data = USER_STATES.get(chat_id, {})
+    request_data = get_state_store().get(chat_id) or {}
+
+    # Finish the flow exactly once, even if the photo is delivered twice
+    if not get_state_store().compare_and_set(chat_id, "AWAITING_PHOTO", None):
+        logging.debug(f"Request from {chat_id} already submitted")
+        return
 
     if photo_file_id:
-        # Get photo URL
-        file_path_response = requests.get(
-            f"https://api.telegram.org/bot{TOKEN}/getFile",
-            params={"file_id": photo_file_id}
-        ).json()
-
-        if file_path_response["ok"]:
-            file_path = file_path_response["result"]["file_path"]
-            photo_url = f"https://api.telegram.org/file/bot{TOKEN}/{file_path}"
-            request_data["photo_url"] = photo_url
-
-            # Send processing message to user
-            send_message(chat_id, "🔍 Analyzing your photo...")
-
-            # Analyze photo with CLIP model
-            try:
-                analysis_result = analyze_telegram_photo(photo_url)
-
-                # Log the analysis for debugging
-                logging.info(f"Analysis result: {analysis_result}")
-
-                # Store the full analysis result in the request data
-                request_data["photo_analysis"] = analysis_result
-
-                if analysis_result.get("success", False):
-                    # Format the response for the user
-                    issue_type = analysis_result.get(
-                        "issue_type", "unknown issue")
-                    confidence = analysis_result.get("confidence", 0)
-
-                    # Create a user-friendly message
-                    analysis_message = (
-                        f"*📋 Issue Analysis:*\n\n"
-                        f"• *Detected Problem:* {issue_type.replace('_', ' ').title()}\n"
-                        f"• *Confidence:* {confidence:.1f}%\n\n"
-                        f"Based on the image analysis, this appears to be a {issue_type.split()[0]} issue. "
-                        f"Our service specialist will address this when assigned to your request."
-                    )
-
-                    send_message(chat_id, analysis_message)
-                else:
-                    # Handle error case
-                    error_msg = analysis_result.get("error", "Unknown error")
-                    logging.error(f"Photo analysis error: {error_msg}")
-                    send_message(
-                        chat_id,
-                        "⚠️ I couldn't clearly identify the issue in your photo, but your request has been submitted and a specialist will review it."
-                    )
-
-            except Exception as e:
-                logging.error(f"Photo analysis error: {str(e)}", exc_info=True)
-                send_message(
-                    chat_id,
-                    "❗ There was an issue analyzing your photo, but your request has been recorded."
-                )
+        # Analysed in the background once the request is saved
+        request_data["photo_file_id"] = photo_file_id
+        request_data["photo_file_unique_id"] = photo_file_unique_id
+        request_data["photo_analysis"] = {"status": PHOTO_ANALYSIS_PENDING}
 
     # Save request to database
     request_data.update({
         "user_id": str(chat_id),
         "status": "Pending",
-        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": datetime.utcnow()
     })
 
     # Remove state field before saving
@@ -305,9 +307,6 @@ def handle_photo(chat_id, photo_file_id=None):
         result = requests_col.insert_one(request_data)
         request_id = result.inserted_id
 
-    # Clear user state
-    USER_STATES.pop(chat_id, None)
-
     # Send confirmation
     send_message(
         chat_id,
@@ -315,48 +314,17 @@ def handle_photo(chat_id, photo_file_id=None):
         f"• Category: {request_data.get('category', 'Not specified')}\n"
         f"• Status: Pending\n\n"
         "We'll notify you when a specialist is assigned."
+        + ("\n\n🔍 Your photo is being analyzed, the result will follow shortly."
+           if photo_file_id else "")
     )
 
     # Return to main menu
     send_welcome(chat_id)
 
-    # Save request to database with a new ObjectId
-    request_data.update({
-        "user_id": str(chat_id),
-        "status": "Pending",
-        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    })
-
-    # Remove state field before saving
-    if "state" in request_data:
-        del request_data["state"]
-
-    # Insert into database - don't reuse IDs
-    try:
-        result = requests_col.insert_one(request_data)
-        request_id = result.inserted_id
-    except Exception as e:
-        logging.error(f"Database error: {str(e)}")
-        # Generate a new ObjectId and try again
-        from bson.objectid import ObjectId
-        request_data["_id"] = ObjectId()
-        result = requests_col.insert_one(request_data)
-        request_id = result.inserted_id
-
-    # Clear user state
-    USER_STATES.pop(chat_id, None)
-
-    # Send confirmation
-    send_message(
-        chat_id,
-        f"✅ *Request #{str(request_id)[-6:]} submitted successfully!*\n\n"
-        f"• Category: {request_data.get('category', 'Not specified')}\n"
-        f"• Status: Pending\n\n"
-        "We'll notify you when a specialist is assigned."
-    )
-
-    # Return to main menu
-    send_welcome(chat_id)
+    if photo_file_id and not PHOTO_WORKER.submit(
+            request_id, chat_id, photo_file_id, photo_file_unique_id):
+        # Stays pending; resume_pending() queues it again at the next start
+        logging.warning(f"Photo analysis for request {request_id} deferred")
 
 
 def send_long_message(chat_id, text, max_length=3900):
@@ -375,15 +343,14 @@ def send_long_message(chat_id, text, max_length=3900):
 
 def process_message(chat_id, text, message):
     """Process incoming messages based on user state"""
-    user_state = USER_STATES.get(chat_id, {})
-    state = user_state.get("state") if isinstance(
-        user_state, dict) else user_state
+    user_state = get_state_store().get(chat_id) or {}
+    state = user_state.get("state")
 
     # Command handling
     if text.startswith('/'):
         # Handle commands regardless of state
         if text == '/start':
-            USER_STATES.pop(chat_id, None)  # Reset state
+            get_state_store().delete(chat_id)  # Reset state
             send_welcome(chat_id)
             return
         elif text == '/status':
@@ -397,7 +364,7 @@ def process_message(chat_id, text, message):
     if state == "AWAITING_USERNAME":
         # Remove this state or implement handle_username function
         send_message(chat_id, "Username processing is not implemented yet.")
-        USER_STATES.pop(chat_id, None)  # Reset the state
+        get_state_store().delete(chat_id)  # Reset the state
         send_welcome(chat_id)
     elif state == "AWAITING_CATEGORY":
         handle_category_selection(chat_id, text)
@@ -411,7 +378,7 @@ def process_message(chat_id, text, message):
         elif message.get("photo"):
             # Get the largest photo (last in array)
             photo = message["photo"][-1]
-            handle_photo(chat_id, photo["file_id"])
+            handle_photo(chat_id, photo["file_id"], photo.get("file_unique_id"))
         else:
             send_message(chat_id, "Please send a photo or type 'skip'.")
     else:
@@ -422,135 +389,150 @@ def process_message(chat_id, text, message):
             send_help(chat_id)
         elif is_serviceman(chat_id):
             # Let serviceman agent handle unknown inputs
-            response = run_agent(text, get_serviceman_username(chat_id))
-            send_message(chat_id, response)
+            reply_from_agent(chat_id, text, get_serviceman_username(chat_id))
 
 
-def handle_updates():
-    global LAST_UPDATE_ID, PROCESSED_MESSAGES
+def fetch_updates(timeout=30):
+    """
+    Long-poll Telegram for new updates and advance the offset.
+
+    Returns:
+        list: Updates (empty when the poll timed out), or None when the
+        request failed or Telegram answered ok: false
+    """
+    global LAST_UPDATE_ID
 
     try:
-        updates = requests.get(
-            f"https://api.telegram.org/bot{TOKEN}/getUpdates",
-            params={"offset": LAST_UPDATE_ID + 1,
-                    "timeout": 30},  # Use long polling
-            timeout=35
-        ).json()
+        updates = get_api().call(
+            "getUpdates",
+            {"offset": LAST_UPDATE_ID + 1,
+             "timeout": timeout},  # Use long polling
+            timeout=timeout + 5
+        )
+    except Exception as e:
+        logging.error(f"Update polling failed: {str(e)}")
+        return None
+    if not updates.get("ok"):
+        logging.error(f"getUpdates refused: {updates.get('error_code')} {updates.get('description')}")
+        return None
 
-        for update in updates.get('result', []):
-            LAST_UPDATE_ID = update['update_id']
+    results = updates.get('result', [])
+    if results:
+        LAST_UPDATE_ID = max(LAST_UPDATE_ID, results[-1]['update_id'])
+    return results
 
-            # Skip processed messages
-            message = update.get('message', {})
-            if not message:
-                continue
 
-            message_id = message.get('message_id')
-            if not message_id or message_id in PROCESSED_MESSAGES:
-                logging.debug(
-                    f"Skipping already processed message: {message_id}")
-                continue
+def _mark_processed(update_id):
+    """Claim an update for handling; returns False if any worker already did"""
+    if not PROCESSED_UPDATES.add(update_id):
+        return False
+    return get_state_store().claim("processed", update_id, PROCESSED_TTL)
 
-            # Mark as processed immediately to prevent duplicate handling
-            PROCESSED_MESSAGES.add(message_id)
 
-            # Limit cache size
-            if len(PROCESSED_MESSAGES) > 1000:
-                PROCESSED_MESSAGES = set(list(PROCESSED_MESSAGES)[-500:])
+def dedup_stats():
+    """Hit/miss/eviction counters for the deduplication caches"""
+    return {
+        "processed_updates": PROCESSED_UPDATES.stats(),
+        "sent_messages": SENT_MESSAGES.stats(),
+    }
 
-            chat_id = message['chat']['id']
-            text = message.get('text', '')
 
-            # Process the message based on state
-            process_message(chat_id, text, message)
+def process_update(update):
+    """Handle a single Telegram update (message or button click)"""
+    try:
+        # Skip updates that were already handled (e.g. redelivered webhooks)
+        update_id = update.get('update_id')
+        if update_id is None or not _mark_processed(update_id):
+            logging.debug(f"Skipping already processed update: {update_id}")
+            return
+
+        # Handle callbacks (button clicks)
+        if 'callback_query' in update:
+            handle_callback(update)
+            return
+
+        message = update.get('message', {})
+        if not message:
+            return
 
-            # Handle callbacks (button clicks)
-            if 'callback_query' in update:
-                handle_callback(update)
+        chat_id = message['chat']['id']
+        text = message.get('text', '')
+
+        # Process the message based on state
+        process_message(chat_id, text, message)
 
     except Exception as e:
-        logging.error(f"Update loop failed: {str(e)}")
+        logging.error(f"Update {update.get('update_id')} failed: {str(e)}")
+
+
+def handle_updates():
+    """Fetch one batch of updates and process them in order"""
+    updates = fetch_updates() or []
+    prefetch_senders(updates)
+    for update in updates:
+        process_update(update)
+
+
+def run_polling(dispatcher, timeout=30, sleep=time.sleep):
+    """Feed long-polled updates into a dispatcher until interrupted"""
+    failures = 0
+    while True:
+        updates = fetch_updates(timeout)
+        if updates is None:
+            # Telegram down, token revoked or a webhook still set: don't hammer it
+            failures += 1
+            delay = poll_delay(failures)
+            logging.warning(f"Polling again in {delay:.1f}s after {failures} failure(s)")
+            sleep(delay)
+            continue
+        failures = 0
+        prefetch_senders(updates)
+        for update in updates:
+            dispatcher.submit(update)
 
 
 def handle_callback(update):
     """Process button clicks"""
     query = update["callback_query"]
     chat_id = query["message"]["chat"]["id"]
+    data = query.get("data", "")
 
-    if query["data"] == "check_status":
+    if data == "check_status":
         show_current_requests(chat_id)
+    elif data.startswith(CALLBACK_PREFIX):
+        # Page through the digest by editing the message in place
+        page = int(data[len(CALLBACK_PREFIX):] or 0)
+        show_current_requests(
+            chat_id, page=page, message_id=query["message"]["message_id"])
 
     # Acknowledge button press
-    requests.post(
-        f"https://api.telegram.org/bot{TOKEN}/answerCallbackQuery",
-        json={"callback_query_id": query["id"]}
-    )
+    get_api().call("answerCallbackQuery", {"callback_query_id": query["id"]})
 
 
-def show_current_requests(chat_id):
-    """Display all requests with status"""
-    requests = list(requests_col.find({
-        "user_id": str(chat_id)
-    }).sort("timestamp", -1))
+def show_current_requests(chat_id, page=0, message_id=None):
+    """Display a one-message digest of the user's requests"""
+    digest = fetch_status_digest(
+        requests_col, chat_id, page, users_collection=users_col.name)
 
-    if not requests:
-        send_message(chat_id, "You have no requests in the system.")
-        return
+    # Requests may have completed since the buttons were drawn
+    if page > 0 and not digest["active"]:
+        page = max(0, math.ceil(digest["active_total"] / STATUS_PAGE_SIZE) - 1)
+        digest = fetch_status_digest(
+            requests_col, chat_id, page, users_collection=users_col.name)
 
-    active_requests = [r for r in requests if r.get("status") != "Completed"]
-    completed_requests = [
-        r for r in requests if r.get("status") == "Completed"]
+    text, reply_markup = render_status_digest(digest, page)
 
-    if not active_requests and not completed_requests:
-        send_message(chat_id, "You have no requests in the system.")
+    if message_id is None:
+        # Always answer /status, even if the digest looks like the last one
+        send_message(chat_id, text, reply_markup=reply_markup, dedup=False)
         return
 
-    # Show active requests first
-    if active_requests:
-        send_message(chat_id, "📋 *Your Active Requests:*")
-        for req in active_requests:
-            status_icon = "🟡" if req["status"] == "Pending" else "🟢"
-            message = (
-                f"{status_icon} *Request #{str(req['_id'])[-6:]}*\n"
-                f"• *Category*: {req.get('category', 'N/A')}\n"
-                f"• *Status*: {req.get('status', 'Pending')}\n"
-                f"• *Submitted*: {req.get('timestamp', 'N/A')}"
-            )
-
-            if req.get("assigned_to"):
-                serviceman = users_col.find_one(
-                    {"username": req["assigned_to"]})
-                if serviceman:
-                    message += f"\n• *Specialist*: {serviceman.get('name', '')} (@{serviceman.get('telegram', '')})"
-
-            send_message(chat_id, message)
-
-    # Show recently completed requests (limited to 3)
-    if completed_requests:
-        send_message(chat_id, "✅ *Recently Completed Requests:*")
-        for req in completed_requests[:3]:  # Limit to 3 most recent
-            message = (
-                f"✓ *Request #{str(req['_id'])[-6:]}*\n"
-                f"• *Category*: {req.get('category', 'N/A')}\n"
-                f"• *Completed*: {req.get('completion_time', req.get('timestamp', 'N/A'))}"
-            )
-            send_message(chat_id, message)
-
-        if len(completed_requests) > 3:
-            send_message(
-                chat_id, f"_...and {len(completed_requests) - 3} more completed requests_")
-
-    # Return to main menu
-    buttons = [
-        [{"text": "📤 Submit Request"}],
-        [{"text": "❓ Help"}]
-    ]
-
-    send_message(
-        chat_id,
-        "What would you like to do next?",
-        reply_markup={
-            "keyboard": buttons,
-            "resize_keyboard": True
-        }
-    )
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "Markdown"
+    }
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+    get_outbound().send(chat_id, payload, method="editMessageText")
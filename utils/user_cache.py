@@ -0,0 +1,140 @@
+"""
+User profile cache for the Telegram bot.
+Role and username lookups by telegram_id are served from memory; misses for a
+whole getUpdates batch are filled with a single $in query.
+
+Users are created and edited by the Streamlit app, a separate process, so
+the bot learns of changes from a change stream on the users collection.
+Change streams need a replica set or Atlas; on a standalone server entries
+are only refreshed when they expire: a new registration is seen within
+USER_PROFILE_NEGATIVE_TTL seconds and a role change within USER_PROFILE_TTL.
+"""
+import os
+import logging
+import threading
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TTL = int(os.getenv("USER_PROFILE_TTL", "300"))
+# Unknown chats (most residents) are remembered for a shorter time
+NEGATIVE_TTL = int(os.getenv("USER_PROFILE_NEGATIVE_TTL", "60"))
+PROFILE_PROJECTION = {"_id": 0, "telegram_id": 1, "username": 1,
+                      "role": 1, "name": 1, "telegram": 1}
+
+_MISS = object()
+
+
+class UserProfileCache:
+    """
+    Cache of user profiles keyed by telegram_id.
+
+    Args:
+        collection: The users collection
+        ttl (int): Seconds a found profile is cached
+        negative_ttl (int): Seconds a "no such user" answer is cached
+        max_entries (int): Cache size cap
+    """
+
+    def __init__(self, collection, ttl=PROFILE_TTL, negative_ttl=NEGATIVE_TTL,
+                 max_entries=5000):
+        self.col = collection
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._watcher = None
+        self.queries = 0
+
+    def _store(self, telegram_id, profile):
+        ttl = None if profile is not None else self.negative_ttl
+        self._cache.set(telegram_id, profile, ttl=ttl)
+
+    def get(self, telegram_id):
+        """Return the profile dict for a telegram_id, or None if unregistered"""
+        telegram_id = str(telegram_id)
+        profile = self._cache.get(telegram_id, _MISS)
+        if profile is not _MISS:
+            return profile
+
+        self.queries += 1
+        profile = self.col.find_one({"telegram_id": telegram_id}, PROFILE_PROJECTION)
+        self._store(telegram_id, profile)
+        return profile
+
+    def prefetch(self, telegram_ids):
+        """
+        Load every uncached id with one query.
+
+        Returns:
+            int: Number of ids that had to be fetched
+        """
+        missing = {str(t) for t in telegram_ids if t is not None}
+        missing = [t for t in missing if t not in self._cache]
+        if not missing:
+            return 0
+
+        self.queries += 1
+        found = {}
+        for profile in self.col.find({"telegram_id": {"$in": missing}}, PROFILE_PROJECTION):
+            found[profile["telegram_id"]] = profile
+        for telegram_id in missing:
+            self._store(telegram_id, found.get(telegram_id))
+        return len(missing)
+
+    def invalidate(self, telegram_id=None):
+        """Drop one profile, or everything when telegram_id is None"""
+        if telegram_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(telegram_id))
+
+    def watch(self):
+        """
+        Invalidate entries from a change stream on the users collection.
+
+        Change streams need a replica set or Atlas; on a standalone server
+        this logs once and entries are only refreshed by their TTL.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch_loop, name="user-profile-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        try:
+            with self.col.watch(full_document="updateLookup") as stream:
+                for change in stream:
+                    self._apply_change(change)
+        except Exception as e:
+            logger.info(f"User change stream unavailable, using TTL only: {str(e)}")
+
+    def _apply_change(self, change):
+        operation = change.get("operationType")
+        document = change.get("fullDocument") or {}
+        updated = (change.get("updateDescription") or {}).get("updatedFields", {})
+
+        if operation == "delete" or "telegram_id" in updated:
+            # The old telegram_id isn't in the event, so start over
+            self.invalidate()
+        elif document.get("telegram_id"):
+            self.invalidate(document["telegram_id"])
+
+    def stats(self):
+        return {**self._cache.stats(), "queries": self.queries}
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_user_profiles():
+    """Return the process-wide profile cache"""
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                from utils.db import users_col
+                _profiles = UserProfileCache(users_col)
+    return _profiles
+
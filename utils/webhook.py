@@ -0,0 +1,145 @@
+"""
+Webhook ingestion for the Telegram bot.
+A minimal ASGI app that accepts Telegram update POSTs, checks the secret token,
+hands the update to the dispatcher and acknowledges immediately. Any number of
+these processes can sit behind a load balancer.
+"""
+import os
+import hmac
+import json
+import asyncio
+import logging
+
+from utils.telegram_api import get_api
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+MAX_BODY_BYTES = 1024 * 1024
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+class WebhookApp:
+    """
+    ASGI application receiving Telegram updates.
+
+    Args:
+        dispatcher (UpdateDispatcher): Started dispatcher that processes updates
+        secret_token (str): Value Telegram sends in X-Telegram-Bot-Api-Secret-Token
+        path (str): URL path the webhook is registered at
+        health_check (callable): Optional dependency check for /healthz,
+            returning a dict with "ok" (e.g. utils.mongo.health_check)
+    """
+
+    def __init__(self, dispatcher, secret_token=WEBHOOK_SECRET, path=WEBHOOK_PATH,
+                 health_check=None):
+        if not secret_token:
+            raise ValueError("A webhook secret token is required (set WEBHOOK_SECRET)")
+        self.dispatcher = dispatcher
+        self.secret_token = secret_token.encode()
+        self.path = path
+        self.health_check = health_check
+        self.accepted = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        if scope["path"] == "/healthz" and scope["method"] == "GET":
+            return await self._health(send)
+
+        if scope["path"] != self.path:
+            return await self._respond(send, 404, {"ok": False})
+        if scope["method"] != "POST":
+            return await self._respond(send, 405, {"ok": False})
+
+        headers = dict(scope.get("headers") or [])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b""), self.secret_token):
+            self.rejected += 1
+            logger.warning("Rejected webhook call with a bad secret token")
+            return await self._respond(send, 401, {"ok": False})
+
+        body = await self._read_body(receive)
+        if body is None:
+            return await self._respond(send, 413, {"ok": False})
+
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return await self._respond(send, 400, {"ok": False})
+        if not isinstance(update, dict) or "update_id" not in update:
+            return await self._respond(send, 400, {"ok": False})
+
+        # Never block the event loop; a full queue makes Telegram retry later
+        if not self.dispatcher.submit(update, block=False):
+            logger.warning(f"Dispatcher full, deferring update {update['update_id']}")
+            return await self._respond(send, 503, {"ok": False})
+
+        self.accepted += 1
+        await self._respond(send, 200, {"ok": True})
+
+    async def _health(self, send):
+        payload = {"ok": True, **self.dispatcher.stats()}
+        if self.health_check is not None:
+            # The check does blocking I/O; keep it off the event loop
+            database = await asyncio.to_thread(self.health_check)
+            payload["ok"] = bool(database.get("ok"))
+            payload["database"] = database
+        return await self._respond(send, 200 if payload["ok"] else 503, payload)
+
+    async def _read_body(self, receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                return None
+            if not message.get("more_body"):
+                return body
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.dispatcher.stop(timeout=10)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _respond(self, send, status, payload):
+        data = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(data)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": data})
+
+
+def set_webhook(url, secret_token=WEBHOOK_SECRET, drop_pending_updates=False):
+    """Register the webhook URL with Telegram"""
+    result = get_api().call("setWebhook", {
+        "url": url,
+        "secret_token": secret_token,
+        "allowed_updates": ["message", "callback_query"],
+        "drop_pending_updates": drop_pending_updates
+    })
+    if not result.get("ok"):
+        logger.error(f"setWebhook failed: {result.get('description')}")
+        return False
+    logger.info(f"Webhook registered at {url}")
+    return True
+
+
+def delete_webhook():
+    """Remove the webhook so long polling can be used again"""
+    result = get_api().call("deleteWebhook", {})
+    return bool(result.get("ok"))